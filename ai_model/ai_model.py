@@ -1,133 +1,162 @@
-from fastapi import Request
 from pydantic import BaseModel
-import sys
+from typing import Optional
+import asyncio
+import threading
+import time
 import os
 from google import genai
 from google.genai import types
-from google.genai.types import Part
 from dotenv import load_dotenv
 
-# --- FIX: Setting up Project Root for Module Resolution ---
-# When running from main.py, modules in sibling directories (like 'prompts') 
-# of ai_model/ are not automatically found. This block adds the parent directory 
-# (Agro-Karfi) to the Python path.
-project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-if project_root not in sys.path:
-    sys.path.append(project_root)
-    
-
-current_dir = os.path.dirname(os.path.abspath(__file__))
-project_root = current_dir  # this points to ai_model/
-
-if project_root not in sys.path:
-    sys.path.insert(0, project_root)
-
-print("\n=== DEBUG PATH INFO ===")
-print(f"Current working directory: {os.getcwd()}")
-print(f"Project root added to sys.path: {project_root}")
-print("Files in project root:", os.listdir(project_root))
-print("Sys.path entries:")
-for p in sys.path:
-    print("   ", p)
-print("========================\n")
-
-try:
-    from .prompts.prompts import instruction_str
-except ModuleNotFoundError as e:
-    raise ImportError(
-        f"\n❌ Could not import 'instruction_str' from prompts.prompts.\n"
-        f"Current working directory: {os.getcwd()}\n"
-        f"Project root added to sys.path: {project_root}\n"
-        f"Files in project root: {os.listdir(project_root)}\n"
-        f"Details: {e}"
-    )
-    
+from metrics import STAGE_SECONDS, stage
 
+from .answer_cache import answer_cache
+from .prompts.prompts import instruction_str
+from .retrieval import retrieve, format_passages
+from .sessions import session_manager
 
 
 # Load API key and environment variables
 load_dotenv()
 api_key = os.getenv("GOOGLE_API_KEY")
 
-# Init Google GenAI client
+# Google GenAI client, created on first use (or by the startup preload)
 # NOTE: Ensure GOOGLE_API_KEY is set in your .env file
-if not api_key:
-    # A cleaner error check than the one in main.py, specific to this module
-    print("WARNING: GOOGLE_API_KEY environment variable not set. AI functions will fail.")
-    # Initialize client even if key is missing to avoid crashing imports
-    client = None
-else:
-    client = genai.Client(api_key=api_key)
-
-
-# Load PDF files only once at startup
-def load_pdf_parts():
-    pdf_parts = []
-    # NOTE: Paths must be absolute or relative to the script execution directory (Agro-Karfi/)
-    pdf_files = [
-        "data/CLIMATE_SMART_AGRICULTURE.pdf",
-        "data/EFFECTS OF GLOBAL CLIMATE CHANGE ON NIGERIAN AGRICULTURE.pdf",
-        "data/Guide-to-Maize-Production-in-Northern-Nigeria.pdf",
-        "data/Guide-to-Rice-Production-in-Northern-Nigeria.pdf",
-        "data/Instability of National Agricultural Research Systems in Sub-Saharan Africa Lessons from Nigeria.pdf",
-        "data/Terdoo_and_Adekola2014a.pdf",
-        "data/the-effects-of-fertilizer-residues-in-soils-and-crop-performance-in-northern-nigeria-a-review.pdf"
-    ]
-    
-    # Use the project_root defined above for reliable path resolution
-    for file_name in pdf_files:
-        file_path = os.path.join(project_root, file_name)
-        try:
-            with open(file_path, "rb") as f:
-                data = f.read()
-                part = Part.from_bytes(data=data, mime_type="application/pdf")
-                pdf_parts.append(part)
-        except FileNotFoundError as e:
-            print(f"ERROR: Could not find PDF file: {file_path}. Skipping.")
-        except Exception as e:
-            print(f"ERROR: Failed to load {file_name}: {e}")
-            
-    return pdf_parts
-
-pdf_parts = load_pdf_parts()
+client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The shared Gemini client, or None when GOOGLE_API_KEY isn't set."""
+    global client
+    if client is None and api_key:
+        with _client_lock:
+            if client is None:
+                client = genai.Client(api_key=api_key)
+    return client
+
+
+# Number of reference passages sent with each question
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "4"))
 
 # Generation Config with System Instruction
 config = types.GenerateContentConfig(system_instruction=instruction_str)
 
-# Initialize chat session
-if client:
-    # Using 'gemini-2.0-flash' as specified previously
-    chat = client.chats.create(model="gemini-2.0-flash", config=config)
-else:
-    chat = None
-    print("Chat client not initialized due to missing API key.")
+MODEL_NAME = "gemini-2.0-flash"
+
+if not api_key:
+    print("WARNING: GOOGLE_API_KEY environment variable not set. AI functions will fail.")
 
 # Request model (imported from main, kept here for dependency clarity)
 class MessageInput(BaseModel):
     message: str
     info: dict
+    session_id: Optional[str] = None
+
+
+def build_contents(session, prompt: str) -> list:
+    """Session history + the new prompt as Gemini contents."""
+    history = []
+    if session:
+        with session.lock:
+            history = list(session.history)
+    return [
+        *(types.Content(role=turn["role"], parts=[types.Part(text=turn["text"])]) for turn in history),
+        types.Content(role="user", parts=[types.Part(text=prompt)]),
+    ]
 
 
-def chat_with_bot(payload: MessageInput):
-    """Handles sending the user message and farm data to the Gemini model."""
-    if not chat:
-        return {"response": "AI Advisor is offline. Please check API key configuration."}
+OFFLINE_RESPONSE = "AI Advisor is offline. Please check API key configuration."
+ERROR_RESPONSE = "Sorry, I ran into a network or API error while processing your request."
+
+
+def prepare_turn(payload: MessageInput):
+    """
+    Build (session, combined_input, prompt, cache_key) for a message, or
+    return a response string when Gemini doesn't need to be called (canned
+    replies and cached answers).
+    """
+    if not get_client():
+        return OFFLINE_RESPONSE
 
     user_input = payload.message
     user_profile = payload.info
 
     if user_input.lower() in ["exit", "quit"]:
-        return {"response": "Exiting chat..."}
+        return "Exiting chat..."
 
     # Convert profile dict to readable text for the model
     profile_text = f"User Field Data:\n{user_profile}"
     combined_input = f"{user_input}\n\n{profile_text}"
 
-    # Send message to Gemini with PDFs + profile + message
+    # Requests without a session id get a one-off conversation
+    session = session_manager.get(payload.session_id) if payload.session_id else None
+    cache_key = answer_cache.key_for(user_input, user_profile, session)
+    cached = answer_cache.get(cache_key)
+    if cached is not None:
+        if session:
+            session_manager.record_turn(session, combined_input, cached)
+        return cached
+
+    # Only the passages relevant to this question, not every PDF.
+    # Passages are sent for this turn only and kept out of the stored history.
+    query = " ".join(str(user_profile.get(k, "")) for k in ("predicted_crop", "state"))
+    passages = retrieve(f"{user_input} {query}", RAG_TOP_K)
+    prompt = combined_input
+    if passages:
+        prompt = f"Reference passages:\n{format_passages(passages)}\n\n{combined_input}"
+    return session, combined_input, prompt, cache_key
+
+
+async def chat_with_bot(payload: MessageInput):
+    """Handles sending the user message and farm data to the Gemini model."""
+    turn = await asyncio.to_thread(prepare_turn, payload)
+    if isinstance(turn, str):
+        return {"response": turn}
+    session, combined_input, prompt, cache_key = turn
+
+    # Send message to Gemini with history + passages + profile + message.
+    # The aio client doesn't block the event loop while Gemini is thinking.
     try:
-        # Note: We use run_in_threadpool in main.py to handle this blocking call
-        response = chat.send_message([*pdf_parts, combined_input])
+        with stage("chat"):
+            response = await get_client().aio.models.generate_content(
+                model=MODEL_NAME, contents=build_contents(session, prompt), config=config
+            )
+        answer_cache.put(cache_key, response.text)
+        if session:
+            await asyncio.to_thread(session_manager.record_turn, session, combined_input, response.text)
         return {"response": response.text}
     except Exception as e:
         print(f"Gemini API Error: {e}")
-        return {"response": "Sorry, I ran into a network or API error while processing your request."}
+        return {"response": ERROR_RESPONSE}
+
+
+async def stream_chat_with_bot(payload: MessageInput):
+    """Same as chat_with_bot, but yields the answer text as Gemini produces it."""
+    turn = await asyncio.to_thread(prepare_turn, payload)
+    if isinstance(turn, str):
+        yield turn
+        return
+    session, combined_input, prompt, cache_key = turn
+
+    parts = []
+    started = time.perf_counter()
+    try:
+        stream = await get_client().aio.models.generate_content_stream(
+            model=MODEL_NAME, contents=build_contents(session, prompt), config=config
+        )
+        async for chunk in stream:
+            if chunk.text:
+                if not parts:
+                    STAGE_SECONDS.observe(time.perf_counter() - started, stage="chat_first_token")
+                parts.append(chunk.text)
+                yield chunk.text
+    except Exception as e:
+        print(f"Gemini API Error: {e}")
+        yield ("\n\n" if parts else "") + ERROR_RESPONSE
+        return
+
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage="chat_stream")
+    answer_cache.put(cache_key, "".join(parts))
+    if session:
+        await asyncio.to_thread(session_manager.record_turn, session, combined_input, "".join(parts))
@@ -0,0 +1,220 @@
+"""
+Cached advisor answers for common questions.
+
+Many farmers in the same state ask the same thing ("when should I plant
+maize?") about similar fields, so answers are kept per
+
+    (profile bucket, normalized question)
+
+where the profile bucket is the state and predicted crop plus rainfall, pH,
+NDVI and the planting window rounded into ranges. With `similarity` > 0 a
+question that isn't cached word for word can still reuse the answer to a
+near-duplicate in the same bucket: one that only adds a few words to it, in
+the same order (overlap of word bigrams), and never a negation, modal verb,
+ordering word or number, since those change what is being asked.
+
+Only opening questions are cached: a follow-up turn in a session depends on
+the conversation so far and always goes to Gemini. Entries expire after
+`ttl` seconds and at most `max_entries` are kept (least recently used
+evicted first).
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from metrics import ADVISOR_CACHE
+
+load_dotenv()
+
+# Bucket widths for the numeric profile fields
+RAINFALL_BUCKET_MM = 100
+PH_BUCKET = 0.5
+NDVI_BUCKET = 0.1
+
+# Only filler is dropped from questions. Unlike the BM25 stopwords this keeps
+# "not", "no", "can", "if", "than" ...: "should I not plant maize?" is a
+# different question from "should I plant maize?"
+QUESTION_STOPWORDS = frozenset("""
+a an the please i me my we our us you your is are am be do does to of this that it
+""".split())
+# Words a near-duplicate may never add
+PROTECTED_TERMS = frozenset("""
+not no never without nor can could should shall must may might will would
+before after than more less instead only too avoid stop if
+""".split())
+# Shorter questions are only reused on an exact (normalized) match
+MIN_NEAR_DUPLICATE_TERMS = 5
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _stem(token: str) -> str:
+    for suffix in ("ing", "ed", "es", "s"):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+
+def normalize_question(message: str) -> tuple:
+    """Stemmed words in order: case, punctuation and filler words don't matter."""
+    words = WORD_RE.findall(message.lower().replace("n't", " not"))
+    return tuple(
+        word if word in PROTECTED_TERMS else _stem(word) for word in words if word not in QUESTION_STOPWORDS
+    )
+
+
+def _bigrams(question: tuple) -> frozenset:
+    terms = ("^", *question, "$")
+    return frozenset(zip(terms, terms[1:]))
+
+
+def _adds_only_filler(shorter: tuple, longer: tuple) -> bool:
+    """Whether `longer` is `shorter` with extra words inserted, none of them protected."""
+    extra, i = [], 0
+    for term in longer:
+        if i < len(shorter) and term == shorter[i]:
+            i += 1
+        else:
+            extra.append(term)
+    return i == len(shorter) and not any(t in PROTECTED_TERMS or t.isdigit() for t in extra)
+
+
+def _bucket(value, width: float):
+    try:
+        return int(float(value) // width)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def _half_month(info: dict):
+    """("Jun", True) for a best planting day of "Jun 17"; None if the profile has none or it is malformed."""
+    window = info.get("planting_window")
+    window = window.get("planting_window") if isinstance(window, dict) else None
+    best = window.get("best") if isinstance(window, dict) else None
+    if not isinstance(best, str):
+        return None
+    try:
+        day = datetime.strptime(best.strip(), "%b %d")
+    except ValueError:
+        return None
+    return day.strftime("%b"), day.day > 15
+
+
+def profile_bucket(info: dict) -> tuple:
+    return (
+        str(info.get("state") or "").strip().lower(),
+        str(info.get("predicted_crop") or "").strip().lower(),
+        _bucket(info.get("rainfall_total_mm"), RAINFALL_BUCKET_MM),
+        _bucket(info.get("soil_pH", info.get("soil_ph")), PH_BUCKET),
+        _bucket(info.get("ndvi_mean"), NDVI_BUCKET),
+        _half_month(info),
+    )
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = 5000, ttl: float = 3 * 86400, similarity: float = 0.6):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries = OrderedDict()  # (bucket, question) -> (answer, stored_at)
+        self._by_bucket = {}           # bucket -> {question: its word bigrams}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "near_hits": 0, "misses": 0, "bypassed": 0, "stored": 0, "evicted": 0}
+
+    def key_for(self, message: str, info: dict, session=None):
+        """Cache key for an opening question, or None when the cache must be bypassed."""
+        question = normalize_question(message)
+        if not question or (session is not None and session.history):
+            self._count("bypassed")
+            return None
+        return profile_bucket(info), question
+
+    def _count(self, result: str):
+        ADVISOR_CACHE.inc(result=result)
+        with self._lock:
+            self.stats[result] += 1
+
+    def _remove(self, key):
+        bucket, question = key
+        del self._entries[key]
+        questions = self._by_bucket.get(bucket)
+        if questions is not None:
+            questions.pop(question, None)
+            if not questions:
+                del self._by_bucket[bucket]
+
+    def _near_duplicate(self, bucket, question):
+        """Best cached near-duplicate in the bucket by bigram overlap, if it clears the threshold."""
+        if len(question) < MIN_NEAR_DUPLICATE_TERMS:
+            return None
+        bigrams = _bigrams(question)
+        best, best_score = None, self.similarity
+        for other, other_bigrams in self._by_bucket.get(bucket, {}).items():
+            if len(other) < MIN_NEAR_DUPLICATE_TERMS:
+                continue
+            shorter, longer = sorted((question, other), key=len)
+            if not _adds_only_filler(shorter, longer):
+                continue
+            score = len(bigrams & other_bigrams) / len(bigrams | other_bigrams)
+            if score >= best_score:
+                best, best_score = other, score
+        return best
+
+    def get(self, key):
+        """The cached answer for a key from key_for(), or None."""
+        if key is None:
+            return None
+        now = time.time()
+        result, answer = "misses", None
+        with self._lock:
+            if key not in self._entries and self.similarity > 0:
+                near = self._near_duplicate(*key)
+                if near is not None:
+                    key, result = (key[0], near), "near_hits"
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[1] > self.ttl:
+                    self._remove(key)
+                    result = "misses"
+                else:
+                    self._entries.move_to_end(key)
+                    answer = entry[0]
+                    result = "hits" if result == "misses" else result
+        self._count(result)
+        return answer
+
+    def put(self, key, answer: str):
+        if key is None or not answer:
+            return
+        bucket, question = key
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (answer, time.time())
+            self._by_bucket.setdefault(bucket, {})[question] = _bigrams(question)
+            self.stats["stored"] += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats["evicted"] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            hits = self.stats["hits"] + self.stats["near_hits"]
+            lookups = hits + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+answer_cache = AnswerCache(
+    max_entries=int(os.getenv("ADVISOR_CACHE_MAX_ENTRIES", "5000")),
+    ttl=float(os.getenv("ADVISOR_CACHE_TTL_S", str(3 * 86400))),
+    # 0 = exact (normalized) questions only
+    similarity=float(os.getenv("ADVISOR_CACHE_SIMILARITY", "0.6")),
+)
@@ -0,0 +1,206 @@
+"""
+Local retrieval over the agronomy PDFs in ai_model/data.
+
+The PDFs are turned into overlapping text chunks and a BM25 index once, at
+deploy time:
+
+    python -m ai_model.retrieval build
+    python -m ai_model.retrieval search "when should I plant maize in Kano?"
+
+At chat time only the top-k passages for the question are sent to Gemini
+instead of every PDF.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+INDEX_DIR = os.getenv("RAG_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "index"))
+
+CHUNK_WORDS = 180
+CHUNK_OVERLAP = 40
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were will with
+which their there these those they them than then also can may not no but if into such been being
+""".split())
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+# --- Extraction + chunking ---
+def extract_pages(pdf_path: str) -> list:
+    """Text of each page of a PDF (empty pages skipped)."""
+    from pypdf import PdfReader
+
+    logging.getLogger("pypdf").setLevel(logging.ERROR)
+    reader = PdfReader(pdf_path)
+    pages = []
+    for number, page in enumerate(reader.pages, start=1):
+        text = re.sub(r"\s+", " ", page.extract_text() or "").strip()
+        if text:
+            pages.append((number, text))
+    return pages
+
+
+def chunk_pages(source: str, pages: list, size: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP) -> list:
+    """Sliding word windows over each page, tagged with source file and page."""
+    chunks = []
+    step = size - overlap
+    for page, text in pages:
+        words = text.split()
+        for start in range(0, max(len(words) - overlap, 1), step):
+            chunks.append({"source": source, "page": page, "text": " ".join(words[start:start + size])})
+    return chunks
+
+
+# --- BM25 index ---
+class BM25Index:
+    """BM25 over chunks, stored as CSR postings (term -> chunk ids, term freqs)."""
+
+    def __init__(self, chunks, vocab, indptr, doc_ids, tfs, doc_len):
+        self.chunks = chunks
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.avg_len = float(doc_len.mean()) if len(doc_len) else 0.0
+        df = np.diff(indptr).astype(np.float64)
+        n = len(chunks)
+        self.idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    @classmethod
+    def from_chunks(cls, chunks: list):
+        postings = {}
+        doc_len = np.zeros(len(chunks), dtype=np.float32)
+        for doc_id, chunk in enumerate(chunks):
+            tokens = tokenize(chunk["text"])
+            doc_len[doc_id] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                postings.setdefault(token, []).append((doc_id, count))
+
+        vocab = {term: i for i, term in enumerate(sorted(postings))}
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        doc_ids, tfs = [], []
+        for term, i in vocab.items():
+            ids, counts = zip(*postings[term])
+            doc_ids.extend(ids)
+            tfs.extend(counts)
+            indptr[i + 1] = len(doc_ids)
+        return cls(chunks, vocab, indptr, np.array(doc_ids, dtype=np.int32), np.array(tfs, dtype=np.float32), doc_len)
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        np.savez(
+            os.path.join(directory, "bm25.npz"),
+            indptr=self.indptr, doc_ids=self.doc_ids, tfs=self.tfs, doc_len=self.doc_len,
+        )
+        with open(os.path.join(directory, "chunks.json"), "w") as f:
+            json.dump({"vocab": self.vocab, "chunks": self.chunks}, f)
+
+    @classmethod
+    def load(cls, directory: str):
+        arrays = np.load(os.path.join(directory, "bm25.npz"))
+        with open(os.path.join(directory, "chunks.json")) as f:
+            meta = json.load(f)
+        return cls(meta["chunks"], meta["vocab"], arrays["indptr"], arrays["doc_ids"], arrays["tfs"], arrays["doc_len"])
+
+    def search(self, query: str, k: int = 4) -> list:
+        """Top-k chunks for a query as dicts with source, page, text and score."""
+        scores = np.zeros(len(self.chunks), dtype=np.float64)
+        for term in set(tokenize(query)):
+            i = self.vocab.get(term)
+            if i is None:
+                continue
+            start, end = self.indptr[i], self.indptr[i + 1]
+            ids, tf = self.doc_ids[start:end], self.tfs[start:end]
+            norm = K1 * (1 - B + B * self.doc_len[ids] / self.avg_len)
+            scores[ids] += self.idf[i] * tf * (K1 + 1) / (tf + norm)
+
+        k = min(k, int((scores > 0).sum()))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{**self.chunks[i], "score": round(float(scores[i]), 3)} for i in top]
+
+
+def build_index(data_dir: str = DATA_DIR, index_dir: str = INDEX_DIR) -> BM25Index:
+    chunks = []
+    for file_name in sorted(os.listdir(data_dir)):
+        if not file_name.lower().endswith(".pdf"):
+            continue
+        try:
+            pages = extract_pages(os.path.join(data_dir, file_name))
+        except Exception as e:
+            print(f"ERROR: Failed to extract {file_name}: {e}")
+            continue
+        file_chunks = chunk_pages(file_name, pages)
+        chunks.extend(file_chunks)
+        print(f"{file_name}: {len(pages)} pages, {len(file_chunks)} chunks")
+
+    index = BM25Index.from_chunks(chunks)
+    index.save(index_dir)
+    print(f"✅ {len(chunks)} chunks, {len(index.vocab)} terms written to {index_dir}")
+    return index
+
+
+# --- Lazily loaded shared index ---
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """The persisted index, loaded once; None if it hasn't been built."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                try:
+                    _index = BM25Index.load(INDEX_DIR)
+                except FileNotFoundError:
+                    print(f"WARNING: No retrieval index at {INDEX_DIR}. Run `python -m ai_model.retrieval build`.")
+                    _index = False
+    return _index or None
+
+
+def retrieve(query: str, k: int = 4) -> list:
+    index = get_index()
+    return index.search(query, k) if index else []
+
+
+def format_passages(passages: list) -> str:
+    return "\n\n".join(
+        f"[{i}] ({p['source']}, p. {p['page']}) {p['text']}" for i, p in enumerate(passages, start=1)
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the agronomy retrieval index.")
+    parser.add_argument("command", choices=["build", "search"])
+    parser.add_argument("query", nargs="?", default="")
+    parser.add_argument("-k", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_index()
+    else:
+        for passage in retrieve(args.query, args.k):
+            print(f"{passage['score']:>8}  {passage['source']} p.{passage['page']}: {passage['text'][:160]}…")
@@ -0,0 +1,134 @@
+"""
+Per-farmer chat sessions.
+
+Each session keeps its own bounded history, so farmers' contexts don't mix
+and a long conversation doesn't make every turn slower. At most
+`max_sessions` live in memory (least recently used evicted first, idle ones
+dropped after `idle_ttl` seconds). With a `store_path` the histories are also
+written to SQLite so they survive restarts and are shared between workers.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting
+    return len(text) // 4 + 1
+
+
+class ChatSession:
+    def __init__(self, session_id: str, history: list = None):
+        self.id = session_id
+        self.history = history or []  # [{"role": "user"|"model", "text": ...}, ...]
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def tokens(self) -> int:
+        return sum(estimate_tokens(turn["text"]) for turn in self.history)
+
+    def trim(self, token_budget: int):
+        """Drop the oldest user/model exchanges until the history fits the budget."""
+        while self.history and self.tokens > token_budget:
+            del self.history[:2]
+
+
+class SessionManager:
+    def __init__(self, max_sessions: int = 500, idle_ttl: float = 3600,
+                 history_token_budget: int = 6000, store_path: str = None):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.history_token_budget = history_token_budget
+        self.store_path = store_path
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self.stats = {"created": 0, "restored": 0, "evicted": 0, "expired": 0}
+
+    # --- Persistence ---
+    def _db(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.store_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.store_path, check_same_thread=False, timeout=5)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chat_sessions (id TEXT PRIMARY KEY, history TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _restore(self, session_id: str):
+        if not self.store_path:
+            return None
+        try:
+            row = self._db().execute("SELECT history FROM chat_sessions WHERE id = ?", (session_id,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Chat session restore failed: {e}")
+            return None
+        return json.loads(row[0]) if row else None
+
+    def save(self, session: ChatSession):
+        if not self.store_path:
+            return
+        with self._lock:
+            try:
+                conn = self._db()
+                conn.execute(
+                    "INSERT OR REPLACE INTO chat_sessions (id, history, updated) VALUES (?, ?, ?)",
+                    (session.id, json.dumps(session.history), time.time()),
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Chat session save failed: {e}")
+
+    # --- In-memory LRU ---
+    def _evict(self):
+        now = time.monotonic()
+        for session_id in [s for s, session in self._sessions.items() if now - session.last_used > self.idle_ttl]:
+            del self._sessions[session_id]
+            self.stats["expired"] += 1
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def get(self, session_id: str) -> ChatSession:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                history = self._restore(session_id)
+                session = ChatSession(session_id, history)
+                self.stats["restored" if history else "created"] += 1
+                self._sessions[session_id] = session
+            session.last_used = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            self._evict()
+            return session
+
+    def record_turn(self, session: ChatSession, user_text: str, model_text: str):
+        with session.lock:
+            session.history.append({"role": "user", "text": user_text})
+            session.history.append({"role": "model", "text": model_text})
+            session.trim(self.history_token_budget)
+        self.save(session)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, "active": len(self._sessions)}
+
+
+session_manager = SessionManager(
+    max_sessions=int(os.getenv("CHAT_MAX_SESSIONS", "500")),
+    idle_ttl=float(os.getenv("CHAT_SESSION_IDLE_S", "3600")),
+    history_token_budget=int(os.getenv("CHAT_HISTORY_TOKENS", "6000")),
+    store_path=os.getenv("CHAT_SESSION_DB") or None,
+)
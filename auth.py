@@ -21,7 +21,7 @@ def initialize_ee():
         )
     except Exception as e:
         print(f"Error creating ServiceAccountCredentials: {e}")
-        # Handle error or exit
+        raise
 
     # 3. Initialize the Earth Engine API
     try:
@@ -32,12 +32,5 @@ def initialize_ee():
         print("Google Earth Engine initialized successfully using Service Account.")
     except Exception as e:
         print(f"Error initializing Earth Engine: {e}")
-        # Handle error or exit
+        raise
 
-
-    # Example API call to confirm initialization
-    try:
-        image = ee.Image('LANDSAT/LC08/C01/T1_SR/LC08_044034_20180914')
-        print(f"Example Image ID: {image.id().getInfo()}")
-    except Exception as e:
-        print(f"Error during test API call: {e}")
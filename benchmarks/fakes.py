@@ -0,0 +1,265 @@
+"""
+Local stand-ins for the external services, with injected latency.
+
+    FakeEarthEngine   -> replaces the `ee` module (getInfo/getThumbURL)
+    FakeGenaiClient   -> replaces ai_model.ai_model.client (Gemini)
+    FakeProviders     -> httpx transport for Open-Meteo, ISRIC and Earth Engine
+                         thumbnail downloads
+    StubCropModel     -> stands in for the pickled crop model
+    write_state_boundaries -> a one-state boundaries file for state_resolver
+
+Each fake counts its calls so the harness can report external round trips
+per request. Latencies are drawn from a seeded generator, so two runs with
+the same settings see the same latency sequence.
+"""
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+import types
+from urllib.parse import urlsplit
+
+import httpx
+import numpy as np
+
+
+class Latency:
+    """`base` seconds, optionally log-normally jittered (sigma), plus a failure rate."""
+
+    def __init__(self, base: float = 0.0, jitter: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        self.base = base
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        """(delay_s, fail) for one call."""
+        with self._lock:
+            factor = self._random.lognormvariate(0, self.jitter) if self.jitter else 1.0
+            fail = self._random.random() < self.failure_rate
+        return self.base * factor, fail
+
+
+class CallCounter:
+    def __init__(self):
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+
+# --- Earth Engine ---
+# Evaluated values for the keys extract_features() puts into its batched
+# ee.Dictionary request; any other getInfo() answers "area_sq_m"
+EE_RESULTS = {
+    "area_sq_m": 48_000.0,
+    "band_count": 3,
+    "soil": {"ph": {"phh2o_0-5cm_mean": 62}, "soc": {"soc_0-5cm_mean": 9}},
+    "climatology": {"precip": {"precipitation": 36_900}, "temp": {"mean_2m_air_temperature": 300.4}},
+    "ndvi": {"NDVI": 0.412},
+}
+
+
+class FakeEarthEngine:
+    """
+    A permissive `ee` module: every constructor and method builds a lazy node,
+    and only getInfo()/getThumbURL() sleep and count as round trips.
+    """
+
+    def __init__(self, latency: Latency, thumbnail_latency: Latency = None):
+        self.latency = latency
+        self.thumbnail_latency = thumbnail_latency or latency
+        self.calls = CallCounter()
+        self.module = self._build_module()
+
+    def _round_trip(self, name: str, latency: Latency):
+        self.calls.inc(name)
+        delay, fail = latency.draw()
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError(f"Fake Earth Engine {name} failure")
+
+    def _build_module(self):
+        fake = self
+
+        class Node:
+            def __init__(self, *args, **kwargs):
+                self.args = args
+
+            def __getattr__(self, name):
+                if name.startswith("__"):
+                    raise AttributeError(name)
+                return lambda *args, **kwargs: Node(*args, **kwargs)
+
+            def getInfo(self):
+                fake._round_trip("getInfo", fake.latency)
+                return EE_RESULTS["area_sq_m"]
+
+            def getThumbURL(self, params=None):
+                fake._round_trip("getThumbURL", fake.thumbnail_latency)
+                return f"https://{THUMBNAIL_HOST}/v1/thumbnails/fake:getPixels"
+
+        class Dictionary(Node):
+            def getInfo(self):
+                fake._round_trip("getInfo", fake.latency)
+                request = self.args[0] if self.args and isinstance(self.args[0], dict) else {}
+                return {key: EE_RESULTS.get(key) for key in request}
+
+        class Namespace:
+            def __getattr__(self, name):
+                if name.startswith("__"):
+                    raise AttributeError(name)
+                return Node
+
+        class Geometry(Node):
+            Polygon = Rectangle = Point = Node
+
+        module = types.ModuleType("ee")
+        module.Geometry = Geometry
+        module.Dictionary = Dictionary
+        for name in ("Number", "Image", "ImageCollection", "Feature", "FeatureCollection", "List", "Date", "String"):
+            setattr(module, name, Node)
+        module.Algorithms = module.Filter = module.Reducer = module.data = Namespace()
+        module.ServiceAccountCredentials = lambda *args, **kwargs: None
+        module.Initialize = lambda *args, **kwargs: None
+        module.Authenticate = lambda *args, **kwargs: None
+        return module
+
+    def install(self):
+        """Must run before anything imports `ee`."""
+        sys.modules["ee"] = self.module
+        return self
+
+
+# --- Gemini ---
+class FakeGenaiClient:
+    """client.aio.models.generate_content / generate_content_stream with injected latency."""
+
+    def __init__(self, latency: Latency, chunks: int = 8, chunk_text: str = "Plant maize after the first 25 mm of rain. "):
+        self.latency = latency
+        self.chunks = chunks
+        self.chunk_text = chunk_text
+        self.calls = CallCounter()
+        self.aio = types.SimpleNamespace(models=types.SimpleNamespace(
+            generate_content=self._generate_content,
+            generate_content_stream=self._generate_content_stream,
+        ))
+
+    async def _generate_content(self, model=None, contents=None, config=None):
+        self.calls.inc("generate_content")
+        delay, fail = self.latency.draw()
+        await asyncio.sleep(delay)
+        if fail:
+            raise RuntimeError("Fake Gemini failure")
+        return types.SimpleNamespace(text=self.chunk_text * self.chunks)
+
+    async def _generate_content_stream(self, model=None, contents=None, config=None):
+        self.calls.inc("generate_content_stream")
+        delay, fail = self.latency.draw()
+
+        async def stream():
+            if fail:
+                await asyncio.sleep(delay)
+                raise RuntimeError("Fake Gemini failure")
+            # Total latency matches the unary call, spread over the chunks
+            for _ in range(self.chunks):
+                await asyncio.sleep(delay / self.chunks)
+                yield types.SimpleNamespace(text=self.chunk_text)
+
+        return stream()
+
+
+# --- Fallback HTTP providers ---
+def _isric_layer(mean: float) -> dict:
+    return {"layers": [{"depths": [{"values": {"mean": mean}}]}]}
+
+
+PROVIDER_RESPONSES = {
+    "api.open-meteo.com": {"daily": {"temperature_2m_mean": [28.4], "precipitation_sum": [4.1]}},
+    "climate-api.open-meteo.com": {"daily": {"temperature_2m_max": [33.0, 34.0], "precipitation_sum": [2.0, 3.0]}},
+    # Both response shapes in use: per-property (gee_tools) and flat (main)
+    "rest.isric.org": {"properties": {"phh2o": _isric_layer(63), "soc": _isric_layer(11), **_isric_layer(63)}},
+}
+
+
+THUMBNAIL_HOST = "earthengine.googleapis.com"
+# 1x1 transparent PNG
+THUMBNAIL_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c489"
+    "0000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+class FakeProviders:
+    """httpx transport answering the fallback providers and thumbnail downloads locally."""
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.calls = CallCounter()
+        self.transport = httpx.MockTransport(self._handle)
+
+    async def _handle(self, request: httpx.Request) -> httpx.Response:
+        host = urlsplit(str(request.url)).netloc
+        self.calls.inc(host)
+        delay, fail = self.latency.draw()
+        await asyncio.sleep(delay)
+        if fail or (host not in PROVIDER_RESPONSES and host != THUMBNAIL_HOST):
+            return httpx.Response(503, json={"error": "unavailable"})
+        if host == THUMBNAIL_HOST:
+            return httpx.Response(200, content=THUMBNAIL_PNG, headers={"Content-Type": "image/png"})
+        return httpx.Response(200, json=PROVIDER_RESPONSES[host])
+
+    def install(self, client):
+        """Route an http_client.HttpClient (before its first request) through the fakes."""
+        client.transport = self.transport
+        return self
+
+
+# --- State boundaries ---
+def write_state_boundaries(path: str, name: str = "Kano"):
+    """A state_resolver file whose single state covers all of the north (and every benchmark polygon)."""
+    ring = [[2.6, 6.4], [14.7, 6.4], [14.7, 13.95], [2.6, 13.95]]
+    with open(path, "w") as f:
+        json.dump({"source": "benchmark fake", "states": [{"name": name, "rings": [ring]}]}, f)
+
+
+# --- Crop model ---
+NORTHERN_STATES = (
+    "Adamawa", "Bauchi", "Benue", "Borno", "FCT", "Gombe", "Jigawa", "Kaduna", "Kano", "Katsina",
+    "Kebbi", "Kogi", "Kwara", "Nasarawa", "Niger", "Plateau", "Sokoto", "Taraba", "Yobe", "Zamfara",
+)
+
+
+class StubCropModel:
+    """Deterministic linear scorer with the predict/predict_proba interface of the real model."""
+
+    def __init__(self, n_features: int = 11, n_classes: int = 10, seed: int = 0):
+        self.weights = np.random.default_rng(seed).normal(size=(n_features, n_classes)) / 100
+        self.classes_ = np.arange(n_classes)
+
+    def predict_proba(self, features):
+        scores = np.asarray(features) @ self.weights
+        scores -= scores.max(axis=1, keepdims=True)
+        proba = np.exp(scores)
+        return proba / proba.sum(axis=1, keepdims=True)
+
+    def predict(self, features):
+        return self.classes_[self.predict_proba(features).argmax(axis=1)]
+
+    def install(self, service):
+        """Load into a model_service.CropModelService in place of the pickles."""
+        from model_service import CROP_LABELS
+
+        service.state_codes = {state: code for code, state in enumerate(NORTHERN_STATES)}
+        service.labels = np.array(CROP_LABELS, dtype=object)
+        service.model = self
+        return self
@@ -0,0 +1,305 @@
+"""
+Load benchmark for /calculate, /predict and /chat against local fakes.
+
+Earth Engine, Gemini and the fallback HTTP providers are replaced by the
+fakes in benchmarks/fakes.py (with the latencies given on the command line),
+and the app is driven in-process at a fixed concurrency. Each run reports
+throughput, p50/p95/p99 latency and external round trips per request, and is
+written to benchmarks/results/<commit>.json so runs on different commits can
+be compared with the same settings:
+
+    python -m benchmarks.run run --requests 200 --concurrency 16
+    python -m benchmarks.run compare benchmarks/results/a1b2c3.json benchmarks/results/d4e5f6.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.fakes import (
+    NORTHERN_STATES, FakeEarthEngine, FakeGenaiClient, FakeProviders, Latency, StubCropModel, write_state_boundaries,
+)
+
+SCENARIOS = ("calculate", "predict", "chat")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+QUESTIONS = (
+    "When should I plant maize this season?",
+    "How much fertilizer does sorghum need on sandy soil?",
+    "My soil pH is low, what can I do?",
+    "Which crop is best for my farm?",
+)
+
+
+# --- Payloads ---
+def polygon_for(i: int, distinct: int) -> list:
+    """A ~4.8 ha square; request i reuses polygon i % distinct (distinct=0: all unique)."""
+    n = i % distinct if distinct else i
+    lat, lon = 10.0 + (n // 200) * 0.01, 7.0 + (n % 200) * 0.01
+    size = 0.002
+    return [[lat, lon], [lat, lon + size], [lat + size, lon + size], [lat + size, lon]]
+
+
+def model_features(i: int) -> dict:
+    return {
+        "state": NORTHERN_STATES[i % len(NORTHERN_STATES)],
+        "rainfall_total_mm": 700 + (i * 37) % 600,
+        "avg_temp_c": 24 + (i * 7) % 9,
+        "ndvi_mean": 0.2 + (i % 50) / 100,
+        "soil_ph": 5.2 + (i % 20) / 10,
+        "soil_org_carbon_pct": 0.6 + (i % 15) / 10,
+        "fertilizer_rate_kg_per_ha": 80 + i % 120,
+        "pesticide_rate_l_per_ha": 1 + i % 4,
+        "farm_size_ha": 0.5 + i % 10,
+        "irrigated_area_ha": i % 3 * 0.5,
+    }
+
+
+def request_for(scenario: str, i: int, args) -> dict:
+    """kwargs for httpx.AsyncClient.request()."""
+    if scenario == "calculate":
+        return {"method": "POST", "url": "/calculate", "json": {"polygon": polygon_for(i, args.distinct_polygons)}}
+    if scenario == "predict":
+        return {"method": "POST", "url": "/predict", "json": model_features(i)}
+    payload = {
+        "message": QUESTIONS[i % len(QUESTIONS)],
+        "info": {**model_features(i), "predicted_crop": "Maize"},
+    }
+    if args.chat_sessions:
+        payload["session_id"] = f"bench-{i % args.chat_sessions}"
+    headers = {"Accept": "text/event-stream"} if args.chat_stream else {}
+    return {"method": "POST", "url": "/chat", "json": payload, "headers": headers}
+
+
+# --- Environment ---
+def git_commit() -> dict:
+    try:
+        sha = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": "unknown", "dirty": None}
+    return {"commit": sha, "dirty": dirty}
+
+
+def install_fakes(args, workdir: str) -> dict:
+    """Swap in the fakes and isolate caches, then import the app."""
+    # Cold, per-run state: no shared cache files, no local grid, no persisted sessions
+    os.environ.setdefault("FEATURE_CACHE_PATH", os.path.join(workdir, "features.sqlite3"))
+    os.environ.setdefault("RASTER_GRID_DIR", os.path.join(workdir, "grid"))
+    os.environ.setdefault("THUMBNAIL_DIR", os.path.join(workdir, "thumbnails"))
+    os.environ.setdefault("STATE_BOUNDARIES_PATH", os.path.join(workdir, "states.json"))
+    if not os.path.exists(os.environ["STATE_BOUNDARIES_PATH"]):
+        write_state_boundaries(os.environ["STATE_BOUNDARIES_PATH"])
+    os.environ.setdefault("EE_SCHEDULER_PATH", os.path.join(workdir, "ee_scheduler.bin"))
+    os.environ.setdefault("JOBS_DB_PATH", os.path.join(workdir, "jobs.sqlite3"))
+    os.environ.pop("CHAT_SESSION_DB", None)
+    for item in args.env:
+        key, _, value = item.partition("=")
+        os.environ[key] = value
+
+    fakes = {
+        "ee": FakeEarthEngine(
+            Latency(args.ee_latency, args.jitter, args.ee_failure_rate, seed=args.seed),
+            Latency(args.thumbnail_latency, args.jitter, seed=args.seed + 1),
+        ).install(),
+        "genai": FakeGenaiClient(Latency(args.genai_latency, args.jitter, seed=args.seed + 2)),
+        "http": FakeProviders(Latency(args.http_latency, args.jitter, args.http_failure_rate, seed=args.seed + 3)),
+    }
+
+    import main
+    from ai_model import ai_model
+    from http_client import http_client
+    from readiness import readiness
+
+    # The fake `ee` needs no credentials
+    readiness.register("earth_engine", lambda: None, required=True)
+    fakes["http"].install(http_client)
+    ai_model.client = fakes["genai"]
+    StubCropModel(seed=args.seed).install(main.crop_model)
+    return fakes
+
+
+def round_trips(fakes: dict) -> dict:
+    counts = {}
+    for service, fake in fakes.items():
+        for name, count in fake.calls.snapshot().items():
+            counts[f"{service}:{name}"] = count
+    return counts
+
+
+# --- Load generation ---
+async def run_scenario(client, scenario: str, args, fakes: dict) -> dict:
+    for i in range(args.warmup):
+        await client.request(**request_for(scenario, args.requests + i, args))
+
+    before = round_trips(fakes)
+    latencies, status_codes = [], {}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.request(**request_for(scenario, i, args))
+                status = str(response.status_code)
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            status_codes[status] = status_codes.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    wall = time.perf_counter() - started
+
+    after = round_trips(fakes)
+    calls = {name: after[name] - before.get(name, 0) for name in after if after[name] != before.get(name, 0)}
+    ms = np.asarray(latencies) * 1000
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "status_codes": status_codes,
+        "errors": sum(count for status, count in status_codes.items() if not status.startswith("2")),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(args.requests / wall, 2),
+        "latency_ms": {
+            "mean": round(float(ms.mean()), 1),
+            **{f"p{p}": round(float(np.percentile(ms, p)), 1) for p in (50, 95, 99)},
+            "max": round(float(ms.max()), 1),
+        },
+        "round_trips_per_request": round(sum(calls.values()) / args.requests, 3),
+        "round_trips": {name: round(count / args.requests, 3) for name, count in sorted(calls.items())},
+    }
+
+
+async def run_all(args, fakes: dict) -> dict:
+    import httpx
+    import main
+
+    results = {}
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for scenario in args.scenarios:
+                print(f"Running {scenario}: {args.requests} requests at concurrency {args.concurrency}...")
+                results[scenario] = await run_scenario(client, scenario, args, fakes)
+    return results
+
+
+SETTINGS = (
+    "requests", "concurrency", "warmup", "seed", "jitter", "ee_latency", "ee_failure_rate",
+    "thumbnail_latency", "genai_latency", "http_latency", "http_failure_rate",
+    "distinct_polygons", "chat_sessions", "chat_stream", "env",
+)
+
+
+def run(args):
+    with tempfile.TemporaryDirectory(prefix="agro-bench-") as workdir:
+        fakes = install_fakes(args, workdir)
+        scenarios = asyncio.run(run_all(args, fakes))
+
+    report = {
+        **git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {name: getattr(args, name) for name in SETTINGS},
+        "scenarios": scenarios,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        name = report["commit"][:12] + ("-dirty" if report["dirty"] else "")
+        output = os.path.join(RESULTS_DIR, f"{name}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print_report(report)
+    print(f"Results written to {output}")
+
+
+# --- Reporting ---
+def print_report(report: dict):
+    print(f"\ncommit {report['commit'][:12]}{' (dirty)' if report['dirty'] else ''}")
+    print(f"{'scenario':<10} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'trips/req':>10}")
+    for name, s in report["scenarios"].items():
+        lat = s["latency_ms"]
+        print(f"{name:<10} {s['throughput_rps']:>8} {lat['p50']:>9} {lat['p95']:>9} {lat['p99']:>9} "
+              f"{s['errors']:>7} {s['round_trips_per_request']:>10}")
+        for trip, per_request in s["round_trips"].items():
+            print(f"{'':<12}{trip}: {per_request}/req")
+
+
+def _change(old, new) -> str:
+    if not old:
+        return ""
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        base = json.load(f)
+    with open(args.candidate) as f:
+        cand = json.load(f)
+
+    differing = [k for k in SETTINGS if base["settings"].get(k) != cand["settings"].get(k)]
+    if differing:
+        print(f"WARNING: settings differ ({', '.join(differing)}); results are not directly comparable.")
+    print(f"baseline {base['commit'][:12]}  vs  candidate {cand['commit'][:12]}")
+    print(f"{'scenario':<10} {'metric':<12} {'baseline':>10} {'candidate':>10} {'change':>9}")
+    for name in cand["scenarios"]:
+        if name not in base["scenarios"]:
+            continue
+        b, c = base["scenarios"][name], cand["scenarios"][name]
+        rows = [("rps", b["throughput_rps"], c["throughput_rps"])]
+        rows += [(f"{p} ms", b["latency_ms"][p], c["latency_ms"][p]) for p in ("p50", "p95", "p99")]
+        rows += [("trips/req", b["round_trips_per_request"], c["round_trips_per_request"]),
+                 ("errors", b["errors"], c["errors"])]
+        for metric, old, new in rows:
+            print(f"{name:<10} {metric:<12} {old:>10} {new:>10} {_change(old, new):>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the API against local fakes of its external services.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the load benchmark.")
+    run_parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    run_parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario.")
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--warmup", type=int, default=5)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--jitter", type=float, default=0.3, help="Log-normal sigma applied to every latency.")
+    run_parser.add_argument("--ee-latency", type=float, default=1.5, help="Seconds per getInfo().")
+    run_parser.add_argument("--ee-failure-rate", type=float, default=0.0)
+    run_parser.add_argument("--thumbnail-latency", type=float, default=0.8, help="Seconds per getThumbURL().")
+    run_parser.add_argument("--genai-latency", type=float, default=2.0, help="Seconds per Gemini answer.")
+    run_parser.add_argument("--http-latency", type=float, default=0.4, help="Seconds per fallback provider request.")
+    run_parser.add_argument("--http-failure-rate", type=float, default=0.0)
+    run_parser.add_argument("--distinct-polygons", type=int, default=0,
+                            help="Cycle through this many polygons (0: every request is a new polygon).")
+    run_parser.add_argument("--chat-sessions", type=int, default=0, help="Spread chats over this many session ids.")
+    run_parser.add_argument("--chat-stream", action="store_true", help="Request /chat as Server-Sent Events.")
+    run_parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                            help="Extra environment for the app (e.g. HEDGE_ENABLED=0).")
+    run_parser.add_argument("--output", help="Result file (default benchmarks/results/<commit>.json).")
+
+    compare_parser = commands.add_parser("compare", help="Compare two result files.")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        compare(args)
+    sys.exit(0)
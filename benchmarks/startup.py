@@ -0,0 +1,129 @@
+"""
+Cold-start benchmark: time to live, time to ready and per-worker memory.
+
+Starts `uvicorn main:app` in a fresh process a few times, polls /healthz and
+/readyz, and reports the medians plus each subsystem's load time and the
+worker's resident memory once startup has settled:
+
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.run import RESULTS_DIR, git_commit
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_rss_mb(pid: int):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def measure_once(timeout: float) -> dict:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.monotonic()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    live_s = ready = None
+    try:
+        with httpx.Client(timeout=2) as client:
+            while time.monotonic() - started < timeout:
+                try:
+                    if live_s is None and client.get(f"{base}/healthz").status_code == 200:
+                        live_s = time.monotonic() - started
+                    if live_s is not None:
+                        ready = client.get(f"{base}/readyz").json()
+                        # Settled once every subsystem has finished (ready or not)
+                        if ready["preload_s"] is not None:
+                            break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.05)
+        settled_s = time.monotonic() - started
+        rss_mb = process_rss_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    if ready is None or ready["preload_s"] is None:
+        raise RuntimeError(f"Server did not settle within {timeout}s")
+    return {
+        "live_s": round(live_s, 3),
+        "settled_s": round(settled_s, 3),
+        "ready": ready["status"] == "ready",
+        "boot_s": ready["boot_s"],
+        "preload_s": ready["preload_s"],
+        "rss_mb": rss_mb,
+        "subsystems": ready["subsystems"],
+    }
+
+
+def main(args):
+    runs = []
+    for i in range(args.runs):
+        runs.append(measure_once(args.timeout))
+        print(f"run {i + 1}: live {runs[-1]['live_s']}s, settled {runs[-1]['settled_s']}s, rss {runs[-1]['rss_mb']} MB")
+
+    median = lambda key: round(statistics.median(r[key] for r in runs if r[key] is not None), 3)
+    subsystems = {
+        name: {
+            "status": runs[-1]["subsystems"][name]["status"],
+            "median_s": round(statistics.median(r["subsystems"][name]["seconds"] for r in runs), 3),
+        }
+        for name in runs[-1]["subsystems"]
+    }
+    report = {
+        **git_commit(),
+        "runs": args.runs,
+        "live_s": median("live_s"),
+        "settled_s": median("settled_s"),
+        "boot_s": median("boot_s"),
+        "preload_s": median("preload_s"),
+        "rss_mb": median("rss_mb"),
+        "subsystems": subsystems,
+    }
+
+    print(f"\ncommit {report['commit'][:12]}{' (dirty)' if report['dirty'] else ''}: "
+          f"live {report['live_s']}s, settled {report['settled_s']}s "
+          f"(boot {report['boot_s']}s + preload {report['preload_s']}s), rss {report['rss_mb']} MB")
+    for name, s in subsystems.items():
+        print(f"  {name:<18} {s['status']:<12} {s['median_s']}s")
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        name = report["commit"][:12] + ("-dirty" if report["dirty"] else "")
+        output = os.path.join(RESULTS_DIR, f"{name}-startup.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure API cold start time and memory.")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", help="Result file (default benchmarks/results/<commit>-startup.json).")
+    main(parser.parse_args())
@@ -0,0 +1,250 @@
+"""
+Quota-aware admission control for Earth Engine requests.
+
+Every blocking Earth Engine call (getInfo, thumbnail rendering, pixel
+exports) goes through `ee_scheduler.run()`, which enforces a token-bucket
+request rate and a concurrency limit shared by all uvicorn workers on the
+host. The shared state is a small memory-mapped file guarded by flock():
+
+    header: tokens, last refill (wall clock), concurrency limit
+    slots:  (pid, leased_at) per concurrency slot; a slot held by a process
+            that has died or by a lease older than LEASE_TIMEOUT_S is reclaimed
+
+The file always has room for MAX_SLOTS slots and is never truncated, since
+shrinking a file other workers have mapped kills them with SIGBUS. Workers
+sharing it must use the same EE_MAX_CONCURRENT: a different limit is only
+adopted while no live process holds a slot, otherwise the scheduler refuses
+to open the file.
+
+Interactive work (farm requests) always gets priority over batch work
+(precompute CLIs): batch calls may only use BATCH_SHARE of the slots and must
+leave the same share of the bucket in reserve, and inside a process they wait
+while any interactive call is queued. Calls that can't be admitted within
+their priority's queue timeout, or arrive while MAX_WAITERS are already
+queued, raise SchedulerBusyError straight away, so callers fall back to
+their backups instead of piling onto an exhausted quota.
+"""
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+from metrics import EE_QUEUE_SECONDS, EE_REJECTED
+
+load_dotenv()
+
+SCHEDULER_PATH = os.getenv("EE_SCHEDULER_PATH", "cache/ee_scheduler.bin")
+RATE_PER_S = float(os.getenv("EE_RATE_PER_S", "20"))
+BURST = float(os.getenv("EE_BURST", "40"))
+MAX_CONCURRENT = int(os.getenv("EE_MAX_CONCURRENT", "20"))
+BATCH_SHARE = float(os.getenv("EE_BATCH_SHARE", "0.5"))
+MAX_WAITERS = int(os.getenv("EE_MAX_WAITERS", "128"))
+QUEUE_TIMEOUT_S = {
+    "interactive": float(os.getenv("EE_QUEUE_TIMEOUT_S", "10")),
+    "batch": float(os.getenv("EE_BATCH_QUEUE_TIMEOUT_S", "600")),
+}
+PRIORITIES = tuple(QUEUE_TIMEOUT_S)
+LEASE_TIMEOUT_S = 900
+MAX_SLOTS = 256
+POLL_S = 0.02
+
+_HEADER = struct.Struct("ddq")  # tokens, refilled_at, slots
+_SLOT = struct.Struct("qd")     # pid, leased_at
+
+
+class SchedulerBusyError(RuntimeError):
+    """Raised when an Earth Engine call is shed instead of queued."""
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class EarthEngineScheduler:
+    def __init__(self, path: str = SCHEDULER_PATH, rate: float = RATE_PER_S, burst: float = BURST,
+                 max_concurrent: int = MAX_CONCURRENT, batch_share: float = BATCH_SHARE,
+                 max_waiters: int = MAX_WAITERS):
+        if not 1 <= max_concurrent <= MAX_SLOTS:
+            raise ValueError(f"max_concurrent must be between 1 and {MAX_SLOTS}")
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.batch_slots = max(1, int(max_concurrent * batch_share))
+        self.batch_reserve = burst * (1 - batch_share)
+        self.max_waiters = max_waiters
+        self._map = None
+        self._fd = None
+        # flock() doesn't exclude threads sharing the descriptor, hence the local lock
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._waiting = {priority: 0 for priority in PRIORITIES}
+        self.stats = {"admitted": 0, "rejected": 0}
+
+    # --- Shared state ---
+    def _open(self):
+        if self._map is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        size = _HEADER.size + _SLOT.size * MAX_SLOTS
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                current = os.fstat(fd).st_size
+                if current < size:
+                    # New file (or an older, smaller layout): only ever grown
+                    os.ftruncate(fd, size)
+                if current < _HEADER.size:
+                    os.pwrite(fd, _HEADER.pack(self.burst, time.time(), self.max_concurrent), 0)
+                else:
+                    self._adopt_limit(fd)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        except Exception:
+            os.close(fd)
+            raise
+        self._fd = fd
+        self._map = mmap.mmap(fd, size)
+
+    def _adopt_limit(self, fd):
+        """Record this process's concurrency limit, unless live workers are using another one."""
+        tokens, refilled_at, limit = _HEADER.unpack(os.pread(fd, _HEADER.size, 0))
+        if limit == self.max_concurrent:
+            return
+        now = time.time()
+        slots = os.pread(fd, _SLOT.size * MAX_SLOTS, _HEADER.size)
+        for pid, leased_at in _SLOT.iter_unpack(slots):
+            if pid and now - leased_at <= LEASE_TIMEOUT_S and _alive(pid):
+                raise RuntimeError(
+                    f"{self.path} is in use with EE_MAX_CONCURRENT={limit} (this worker has "
+                    f"{self.max_concurrent}); use the same value in every worker"
+                )
+        os.pwrite(fd, _HEADER.pack(tokens, refilled_at, self.max_concurrent), 0)
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield self._map
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _refill(self, shared, now: float) -> float:
+        tokens, refilled_at, _ = _HEADER.unpack_from(shared, 0)
+        return min(self.burst, tokens + max(0.0, now - refilled_at) * self.rate)
+
+    def _leases(self, shared, now: float) -> list:
+        """Slot index -> holder pid (0 = free), reclaiming slots of dead processes and expired leases."""
+        holders = []
+        for i in range(self.max_concurrent):
+            offset = _HEADER.size + i * _SLOT.size
+            pid, leased_at = _SLOT.unpack_from(shared, offset)
+            if pid and (now - leased_at > LEASE_TIMEOUT_S or not _alive(pid)):
+                _SLOT.pack_into(shared, offset, 0, 0.0)
+                pid = 0
+            holders.append(pid)
+        return holders
+
+    def _try_acquire(self, priority: str):
+        """A slot index if a token and a slot are free for this priority, else None."""
+        now = time.time()
+        with self._locked() as shared:
+            tokens = self._refill(shared, now)
+            holders = self._leases(shared, now)
+            busy = sum(1 for pid in holders if pid)
+            slot_limit = self.max_concurrent if priority == "interactive" else self.batch_slots
+            token_floor = 1 if priority == "interactive" else 1 + self.batch_reserve
+            if busy >= slot_limit or tokens < token_floor:
+                _HEADER.pack_into(shared, 0, tokens, now, self.max_concurrent)
+                return None
+            slot = holders.index(0)
+            _SLOT.pack_into(shared, _HEADER.size + slot * _SLOT.size, os.getpid(), now)
+            _HEADER.pack_into(shared, 0, tokens - 1, now, self.max_concurrent)
+            return slot
+
+    def _release(self, slot: int):
+        with self._locked() as shared:
+            _SLOT.pack_into(shared, _HEADER.size + slot * _SLOT.size, 0, 0.0)
+        with self._cond:
+            self._cond.notify_all()
+
+    # --- Admission ---
+    def _reject(self, priority: str, call: str, reason: str):
+        EE_REJECTED.inc(priority=priority, call=call, reason=reason)
+        with self._cond:
+            self.stats["rejected"] += 1
+        raise SchedulerBusyError(f"Earth Engine {priority} queue {reason} ({call})")
+
+    def _acquire(self, priority: str, call: str) -> int:
+        started = time.monotonic()
+        deadline = started + QUEUE_TIMEOUT_S[priority]
+        with self._cond:
+            if sum(self._waiting.values()) >= self.max_waiters:
+                full = True
+            else:
+                full = False
+                self._waiting[priority] += 1
+        if full:
+            self._reject(priority, call, "full")
+        try:
+            while True:
+                # Batch work yields to interactive work queued in this process
+                if priority == "interactive" or not self._waiting["interactive"]:
+                    slot = self._try_acquire(priority)
+                    if slot is not None:
+                        EE_QUEUE_SECONDS.observe(time.monotonic() - started, priority=priority)
+                        with self._cond:
+                            self.stats["admitted"] += 1
+                        return slot
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._reject(priority, call, "timeout")
+                # Woken by local releases; other processes' releases and refills are polled
+                with self._cond:
+                    self._cond.wait(min(remaining, POLL_S))
+        finally:
+            with self._cond:
+                self._waiting[priority] -= 1
+
+    def run(self, fn, call: str, priority: str = "interactive"):
+        """fn() once admitted; raises SchedulerBusyError if shed."""
+        if priority not in QUEUE_TIMEOUT_S:
+            raise ValueError(f"Unknown priority '{priority}'")
+        slot = self._acquire(priority, call)
+        try:
+            return fn()
+        finally:
+            self._release(slot)
+
+    def get_stats(self) -> dict:
+        now = time.time()
+        with self._locked() as shared:
+            tokens = self._refill(shared, now)
+            in_flight = sum(1 for pid in self._leases(shared, now) if pid)
+        with self._cond:
+            return {
+                **self.stats,
+                "tokens": round(tokens, 2),
+                "in_flight": in_flight,
+                "max_concurrent": self.max_concurrent,
+                **{f"waiting_{priority}": count for priority, count in self._waiting.items()},
+            }
+
+
+ee_scheduler = EarthEngineScheduler()
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+YEAR_SECONDS = 365 * 24 * 3600
+
+# Per-dataset time-to-live in seconds (None = never expires).
+# Climatology (PERSIANN/ERA5 long-term means) and soil (SoilGrids) are
+# static for a given polygon. NDVI and imagery are yearly composites; imagery
+# entries point at the thumbnail store (/imagery/{key}.png), not at a
+# short-lived getThumbURL link.
+DATASET_TTLS = {
+    "climatology": None,
+    "soil": None,
+    "ndvi": YEAR_SECONDS,
+    "imagery": YEAR_SECONDS,
+}
+
+# ~1 m at the equator; vertices closer than this map to the same key
+COORD_DECIMALS = 5
+
+
+# --- Polygon canonicalization ---
+def canonicalize_polygon(polygon_coords: list, decimals: int = COORD_DECIMALS) -> list:
+    """
+    Canonical form of a [[lat, lon], ...] ring so that the same farm drawn
+    from a different starting vertex or in the opposite direction gets the
+    same cache key.
+    """
+    ring = [(round(lat, decimals), round(lon, decimals)) for lat, lon in polygon_coords]
+
+    # Drop the closing vertex and consecutive duplicates created by quantizing
+    deduped = []
+    for point in ring:
+        if not deduped or deduped[-1] != point:
+            deduped.append(point)
+    if len(deduped) > 1 and deduped[0] == deduped[-1]:
+        deduped.pop()
+
+    # Counter-clockwise winding (shoelace sign in lon/lat plane)
+    signed_area = sum(
+        deduped[i][1] * deduped[(i + 1) % len(deduped)][0] - deduped[(i + 1) % len(deduped)][1] * deduped[i][0]
+        for i in range(len(deduped))
+    )
+    if signed_area < 0:
+        deduped.reverse()
+
+    # Start from the smallest vertex
+    start = deduped.index(min(deduped))
+    return [list(p) for p in deduped[start:] + deduped[:start]]
+
+
+def polygon_cache_key(polygon_coords: list, decimals: int = COORD_DECIMALS) -> str:
+    canonical = canonicalize_polygon(polygon_coords, decimals)
+    return hashlib.sha1(json.dumps(canonical, separators=(",", ":")).encode()).hexdigest()
+
+
+# --- Two-tier cache ---
+class FeatureCache:
+    """
+    Geospatial feature cache: in-process LRU in front of a SQLite file.
+
+    Entries are keyed by (polygon key, dataset) and expire according to
+    DATASET_TTLS. SQLite allows several uvicorn workers to share the disk tier.
+    """
+
+    def __init__(self, path: str, memory_items: int = 1024, ttls: dict = None):
+        self.path = path
+        self.memory_items = memory_items
+        self.ttls = dict(DATASET_TTLS if ttls is None else ttls)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0, "writes": 0}
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS features ("
+                " key TEXT NOT NULL, dataset TEXT NOT NULL, value TEXT NOT NULL, created REAL NOT NULL,"
+                " PRIMARY KEY (key, dataset))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _expired(self, dataset: str, created: float, now: float) -> bool:
+        ttl = self.ttls.get(dataset)
+        return ttl is not None and now - created > ttl
+
+    def _remember(self, key: str, dataset: str, value, created: float):
+        self._memory[(key, dataset)] = (value, created)
+        self._memory.move_to_end((key, dataset))
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, key: str, datasets) -> dict:
+        """Return {dataset: value} for every dataset that has a fresh entry."""
+        now = time.time()
+        found, disk_lookups = {}, []
+        with self._lock:
+            for dataset in datasets:
+                entry = self._memory.get((key, dataset))
+                if entry is not None and not self._expired(dataset, entry[1], now):
+                    self._memory.move_to_end((key, dataset))
+                    found[dataset] = entry[0]
+                    self.stats["memory_hits"] += 1
+                else:
+                    self._memory.pop((key, dataset), None)
+                    disk_lookups.append(dataset)
+
+            if disk_lookups:
+                try:
+                    rows = self._connect().execute(
+                        f"SELECT dataset, value, created FROM features WHERE key = ? "
+                        f"AND dataset IN ({','.join('?' * len(disk_lookups))})",
+                        [key, *disk_lookups],
+                    ).fetchall()
+                except sqlite3.Error as e:
+                    print(f"Feature cache read failed: {e}")
+                    rows = []
+                for dataset, value, created in rows:
+                    if self._expired(dataset, created, now):
+                        self.stats["expired"] += 1
+                        continue
+                    found[dataset] = json.loads(value)
+                    self._remember(key, dataset, found[dataset], created)
+                    self.stats["disk_hits"] += 1
+
+            self.stats["misses"] += sum(1 for d in datasets if d not in found)
+        return found
+
+    def put_many(self, key: str, values: dict):
+        if not values:
+            return
+        now = time.time()
+        with self._lock:
+            for dataset, value in values.items():
+                self._remember(key, dataset, value, now)
+            try:
+                conn = self._connect()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO features (key, dataset, value, created) VALUES (?, ?, ?, ?)",
+                    [(key, dataset, json.dumps(value), now) for dataset, value in values.items()],
+                )
+                conn.commit()
+                self.stats["writes"] += len(values)
+            except sqlite3.Error as e:
+                print(f"Feature cache write failed: {e}")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            lookups = hits + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_items": len(self._memory),
+            }
+
+
+feature_cache = FeatureCache(
+    os.getenv("FEATURE_CACHE_PATH", "cache/features.sqlite3"),
+    memory_items=int(os.getenv("FEATURE_CACHE_MEMORY_ITEMS", "1024")),
+)
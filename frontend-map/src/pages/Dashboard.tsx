@@ -27,56 +27,46 @@ interface DashboardMetrics {
   calculationDate: string;
 }
 
-// --- Fallback APIs ---
-async function fetchOpenMeteo(lat: number, lon: number) {
-  try {
-    const res = await fetch(
-      `https://api.open-meteo.com/v1/forecast?latitude=${lat}&longitude=${lon}&current=temperature_2m,precipitation`
-    );
-    const data = await res.json();
-    return {
-      temperature: data?.current?.temperature_2m ?? null,
-      rainfall: data?.current?.precipitation ?? null,
-    };
-  } catch {
-    return null;
-  }
-}
+const API_BASE = "https://agro-karfi.onrender.com";
 
-async function fetchNasaPower(lat: number, lon: number) {
-  try {
-    const res = await fetch(
-      `https://power.larc.nasa.gov/api/temporal/daily/point?parameters=T2M,PRECTOT&community=RE&longitude=${lon}&latitude=${lat}&format=JSON`
-    );
-    const data = await res.json();
-    const dates = Object.keys(data.properties.parameter.T2M);
-    const lastDate = dates[dates.length - 1];
-    return {
-      temperature: data.properties.parameter.T2M[lastDate] ?? null,
-      rainfall: data.properties.parameter.PRECTOT[lastDate] ?? null,
-    };
-  } catch {
-    return null;
-  }
-}
+// What the server is working on, per /analyze progress event
+const PROGRESS_LABELS: Record<string, string> = {
+  cache: "Looking up saved field data...",
+  earth_engine: "Reading satellite, soil and climate data...",
+  fallbacks: "Filling in missing data...",
+};
 
 // --- Component for AI Support ---
-const AISupportSection: React.FC<{ advice: string | null }> = ({ advice }) => (
-  <div className="bg-white p-6 rounded-xl shadow-2xl mb-8 border-l-8 border-yellow-500 w-full">
-    <h2 className="text-xl font-bold text-gray-800 mb-4 flex items-center">
-      🤖 AI Farming Assistant Advice
-    </h2>
-    <div className="bg-gray-50 p-4 rounded-lg border border-gray-200">
-      {advice === null ? (
-        <p className="text-gray-500 italic">
-          Generating smart, actionable advice based on your field data...
-        </p>
-      ) : (
-        <p className="text-gray-700 whitespace-pre-wrap">{advice}</p>
-      )}
+// The advisor answers in English, then "------", then Hausa
+const ADVICE_SEPARATOR = "------";
+
+const AISupportSection: React.FC<{ advice: string | null }> = ({ advice }) => {
+  const [english, hausa] = (advice ?? "").split(ADVICE_SEPARATOR, 2);
+  return (
+    <div className="bg-white p-6 rounded-xl shadow-2xl mb-8 border-l-8 border-yellow-500 w-full">
+      <h2 className="text-xl font-bold text-gray-800 mb-4 flex items-center">
+        🤖 AI Farming Assistant Advice
+      </h2>
+      <div className="bg-gray-50 p-4 rounded-lg border border-gray-200">
+        {!advice ? (
+          <p className="text-gray-500 italic">
+            Generating smart, actionable advice based on your field data...
+          </p>
+        ) : (
+          <>
+            <p className="text-gray-700 whitespace-pre-wrap">{english.trim()}</p>
+            {hausa !== undefined && (
+              <>
+                <hr className="my-4 border-gray-300" />
+                <p className="text-gray-700 whitespace-pre-wrap">{hausa.trim()}</p>
+              </>
+            )}
+          </>
+        )}
+      </div>
     </div>
-  </div>
-);
+  );
+};
 
 // --- Hero Section ---
 const HeroSection: React.FC<{ metrics: DashboardMetrics }> = ({ metrics }) => (
@@ -119,7 +109,12 @@ const HeroSection: React.FC<{ metrics: DashboardMetrics }> = ({ metrics }) => (
 const DashboardPage: React.FC = () => {
   const navigate = useNavigate();
   const location = useLocation();
-  const apiResult = location.state?.apiResult as ApiResult | undefined;
+  const polygon = location.state?.polygon as [number, number][] | undefined;
+
+  const [apiResult, setApiResult] = useState<ApiResult | null>(null);
+  const [status, setStatus] = useState<string | null>(
+    polygon ? "Checking your field boundary..." : "No field selected. Draw one on the map first."
+  );
 
   const [userInfo, setUserInfo] = useState<any>(null);
   const [metrics, setMetrics] = useState<DashboardMetrics>({
@@ -133,6 +128,7 @@ const DashboardPage: React.FC = () => {
     calculationDate: "N/A",
   });
   const [aiAdvice, setAiAdvice] = useState<string | null>(null);
+  const [plantingWindow, setPlantingWindow] = useState<any>(null);
 
   // --- Load user info from localStorage ---
   useEffect(() => {
@@ -149,159 +145,104 @@ const DashboardPage: React.FC = () => {
     }
   }, []);
 
-  // --- Fetch AI Advice ---
-  const fetchAiAdvice = async (result: ApiResult, predictedCrop: string) => {
-    if (
-      predictedCrop === "Calculating..." ||
-      predictedCrop === "Error" ||
-      aiAdvice !== null
-    )
-      return;
-
-    setAiAdvice(null);
+  // --- Run the whole analysis server-side, rendering each stage as it streams in ---
+  useEffect(() => {
+    if (!polygon || userInfo === null) return;
+    const controller = new AbortController();
+
+    // One advisor conversation per browser, so follow-ups keep their context
+    let sessionId = localStorage.getItem("chatSessionId");
+    if (!sessionId) {
+      sessionId = crypto.randomUUID();
+      localStorage.setItem("chatSessionId", sessionId);
+    }
 
     const payload = {
-      message:
-        "Provide smart, actionable farming advice for this field, focusing on optimal crop choice and immediate steps for soil and water management.",
-      info: {
-        ...result,
-        predicted_crop: predictedCrop,
-      },
+      polygon,
+      state: userInfo?.state || null,
+      fertilizer_rate_kg_per_ha: userInfo?.fertilizer_rate_kg_per_ha ?? 50.0,
+      pesticide_rate_l_per_ha: userInfo?.pesticide_rate_l_per_ha ?? 2.0,
+      farm_size_ha: userInfo?.farm_size_ha ?? null,
+      irrigated_area_ha: userInfo?.irrigated_area_ha ?? 0.5,
+      session_id: sessionId,
     };
 
-    try {
-      const response = await fetch("https://agro-karfi.onrender.com/chat", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(payload),
-      });
-
-      if (!response.ok) throw new Error("Failed to fetch AI advice");
-
-      const data = await response.json();
-      setAiAdvice(data.response || "No advice received from AI.");
-    } catch (error) {
-      console.error("AI Advice Fetch Error:", error);
-      setAiAdvice("Error generating advice. Please try again.");
-    }
-  };
-
-  // --- Parse metrics, run fallback APIs, and predict ---
-  useEffect(() => {
-    if (!apiResult || userInfo === null) return;
-
-    const parseMetricsAndPredict = async () => {
-      const state: string = userInfo?.state ?? apiResult.state ?? "Unknown";
-
-      let temperature: number | null = apiResult.avg_temp_c ?? null;
-      let rainfall: number | null = apiResult.rainfall_total_mm ?? null;
-      const soil_pH: number = apiResult.soil_pH ?? 6.5;
-      const ndvi: number = apiResult.ndvi_mean ?? 0.45;
-      const soilOrganicCarbon: number = apiResult.soil_org_carbon_pct ?? 1.2;
-
-      const fertilizer_rate: number =
-        userInfo?.fertilizer_rate_kg_per_ha ?? 50.0;
-      const pesticide_rate: number =
-        userInfo?.pesticide_rate_l_per_ha ?? 2.0;
-      const farm_size: number = userInfo?.farm_size_ha ?? 1.5;
-      const irrigated: number = userInfo?.irrigated_area_ha ?? 0.5;
-
-      const landAreaHa = (apiResult.area_sq_m / 10000).toFixed(2);
-      let predictedCrop = "Calculating...";
-
-      // 🌦️ STEP 1: Use fallback APIs if missing temp or rainfall
-      if (temperature === null || rainfall === null) {
-        try {
-          const bounds = apiResult.polygon_bounds;
-          if (bounds && bounds.length > 0) {
-            const latitudes = bounds.map((b) => b[1]);
-            const longitudes = bounds.map((b) => b[0]);
-            const lat =
-              latitudes.reduce((a, b) => a + b, 0) / latitudes.length;
-            const lon =
-              longitudes.reduce((a, b) => a + b, 0) / longitudes.length;
-
-            console.log("🌍 Fetching fallback weather for:", { lat, lon });
-
-            let fallback = await fetchOpenMeteo(lat, lon);
-            if (
-              !fallback ||
-              fallback.temperature === null ||
-              fallback.rainfall === null
-            ) {
-              console.log("⚠️ OpenMeteo failed, switching to NASA Power...");
-              fallback = await fetchNasaPower(lat, lon);
-            }
-
-            if (fallback) {
-              temperature = temperature ?? fallback.temperature ?? 25;
-              rainfall = rainfall ?? fallback.rainfall ?? 100;
-            }
-          }
-        } catch (error) {
-          console.error("⚠️ Fallback API error:", error);
-          temperature = temperature ?? 25;
-          rainfall = rainfall ?? 100;
-        }
+    const handleStage = (stage: string, data: any) => {
+      if (stage === "progress") {
+        if (PROGRESS_LABELS[data.stage]) setStatus(PROGRESS_LABELS[data.stage]);
+      } else if (stage === "features") {
+        setApiResult(data);
+        setStatus("Predicting the best crop...");
+        setMetrics((m) => ({
+          ...m,
+          temperature: data.avg_temp_c ?? null,
+          rainfall: data.rainfall_total_mm ?? null,
+          soil_pH: data.soil_pH ?? null,
+          landAreaHa: (data.area_sq_m / 10000).toFixed(2),
+          ndvi: data.ndvi_mean ?? null,
+          soilOrganicCarbon: data.soil_org_carbon_pct ?? null,
+          predictedCrop: "Calculating...",
+          calculationDate: new Date().toLocaleDateString("en-US", {
+            year: "numeric",
+            month: "short",
+            day: "numeric",
+          }),
+        }));
+      } else if (stage === "prediction") {
+        setStatus("Writing your farming advice...");
+        setMetrics((m) => ({ ...m, predictedCrop: data.predicted_crop ?? "Unknown" }));
+      } else if (stage === "planting_window") {
+        setPlantingWindow(data);
+      } else if (stage === "advice") {
+        setAiAdvice((advice) => (advice ?? "") + data.text);
+      } else if (stage === "done") {
+        setStatus(null);
+        setAiAdvice(data.advice || "No advice received from AI.");
+      } else if (stage === "error") {
+        throw new Error(data.detail);
       }
+    };
 
-      // 🧠 STEP 2: Predict Optimal Crop
+    const runAnalysis = async () => {
       try {
-        const payload = {
-          state,
-          rainfall_total_mm: rainfall,
-          avg_temp_c: temperature,
-          ndvi_mean: ndvi,
-          soil_ph: soil_pH,
-          soil_org_carbon_pct: soilOrganicCarbon,
-          fertilizer_rate_kg_per_ha: fertilizer_rate,
-          pesticide_rate_l_per_ha: pesticide_rate,
-          farm_size_ha: farm_size,
-          irrigated_area_ha: irrigated,
-        };
-
-        const response = await fetch("https://agro-karfi.onrender.com/predict", {
+        const response = await fetch(`${API_BASE}/analyze`, {
           method: "POST",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify(payload),
+          signal: controller.signal,
         });
-
-        if (!response.ok) {
-          const errorText = await response.text();
-          throw new Error(`Prediction failed: ${response.status} - ${errorText}`);
+        if (!response.ok || !response.body) {
+          const error = await response.json().catch(() => ({}));
+          throw new Error(error.detail ?? "Analysis failed");
         }
 
-        const result = await response.json();
-        predictedCrop = result.predicted_crop || "Unknown";
+        // One JSON object per line: {"stage": ..., "data": ...}
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        for (;;) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          const lines = buffer.split("\n");
+          buffer = lines.pop() ?? "";
+          for (const line of lines) {
+            if (!line.trim()) continue;
+            const { stage, data } = JSON.parse(line);
+            handleStage(stage, data);
+          }
+        }
       } catch (error) {
-        console.error("Prediction failed:", error);
-        predictedCrop = "Error";
+        if (controller.signal.aborted) return;
+        console.error("Analysis error:", error);
+        setStatus(`⚠️ ${(error as Error).message}`);
+        setMetrics((m) => ({ ...m, predictedCrop: m.predictedCrop === "Loading..." ? "Error" : m.predictedCrop }));
       }
-
-      // 🕒 STEP 3: Update Dashboard Metrics
-      const calculationDate = new Date().toLocaleDateString("en-US", {
-        year: "numeric",
-        month: "short",
-        day: "numeric",
-      });
-
-      setMetrics({
-        temperature,
-        rainfall,
-        soil_pH,
-        landAreaHa,
-        ndvi,
-        soilOrganicCarbon,
-        predictedCrop,
-        calculationDate,
-      });
-
-      // 🤖 STEP 4: Generate AI Advice
-      fetchAiAdvice(apiResult, predictedCrop);
     };
 
-    parseMetricsAndPredict();
-  }, [apiResult, userInfo]);
+    runAnalysis();
+    return () => controller.abort();
+  }, [polygon, userInfo]);
 
   return (
     <div className="min-h-screen w-screen flex flex-col bg-gray-50 font-sans">
@@ -311,13 +252,14 @@ const DashboardPage: React.FC = () => {
           <h1 className="text-3xl font-bold text-gray-800 mb-6">
             Farming Analysis Dashboard
           </h1>
+          {status && <p className="text-gray-500 mb-4 animate-pulse">⏳ {status}</p>}
         </div>
 
         {/* Hero Section */}
         <HeroSection metrics={metrics} />
 
         {/* Metrics Row */}
-        <div className="grid grid-cols-1 md:grid-cols-3 gap-6 mb-8 w-full px-6 md:px-10">
+        <div className="grid grid-cols-1 md:grid-cols-4 gap-6 mb-8 w-full px-6 md:px-10">
           <div className="bg-white p-4 rounded-xl shadow-lg border-l-4 border-green-500">
             <p className="text-sm text-gray-500">Total Land Area (Hectares)</p>
             <p className="text-2xl font-semibold text-gray-900 mt-1">
@@ -335,10 +277,24 @@ const DashboardPage: React.FC = () => {
           <div className="bg-white p-4 rounded-xl shadow-lg border-l-4 border-indigo-500">
             <p className="text-sm text-gray-500">Avg Annual Rainfall</p>
             <p className="text-2xl font-semibold text-gray-900 mt-1">
-              
-               100 <span className="text-sm ml-1">mm</span>
-              
+              {metrics.rainfall !== null ? metrics.rainfall : "N/A"}
+              <span className="text-sm ml-1">mm</span>
+            </p>
+          </div>
+
+          <div className="bg-white p-4 rounded-xl shadow-lg border-l-4 border-amber-500">
+            <p className="text-sm text-gray-500">Planting Window</p>
+            <p className="text-2xl font-semibold text-gray-900 mt-1">
+              {plantingWindow?.planting_window
+                ? `${plantingWindow.planting_window.start} – ${plantingWindow.planting_window.end}`
+                : plantingWindow ? "None" : "N/A"}
             </p>
+            {plantingWindow?.planting_window && (
+              <p className="text-xs text-gray-500 mt-1">
+                {plantingWindow.confidence_label} confidence · {plantingWindow.years} years of rainfall
+              </p>
+            )}
+            {plantingWindow?.note && <p className="text-xs text-gray-500 mt-1">{plantingWindow.note}</p>}
           </div>
         </div>
 
@@ -349,7 +305,7 @@ const DashboardPage: React.FC = () => {
           </h2>
           {apiResult?.image_tile_url ? (
             <img
-              src={apiResult.image_tile_url}
+              src={new URL(apiResult.image_tile_url, API_BASE).toString()}
               alt="Satellite imagery of field"
               className="rounded-lg shadow-md border border-gray-300 w-full max-w-5xl h-96 object-contain"
             />
@@ -31,6 +31,61 @@ L.Icon.Default.mergeOptions({
   shadowUrl: markerShadow,
 });
 
+const API_BASE = "https://agro-karfi.onrender.com";
+
+type SuitabilityInfo = {
+  layers: { id: string; name: string }[];
+  legend: Record<string, string>;
+  bounds: [[number, number], [number, number]];
+  max_native_zoom: number;
+};
+
+// Regional crop-suitability overlay (precomputed server-side by regional.py)
+const SuitabilityControl = ({
+  info,
+  layer,
+  setLayer,
+}: {
+  info: SuitabilityInfo;
+  layer: string;
+  setLayer: (layer: string) => void;
+}) => (
+  <div className="absolute top-4 right-4 z-[1000] bg-gray-800 text-white p-3 rounded-lg shadow-lg text-sm max-w-[14rem]">
+    <label className="block mb-1 font-semibold">Crop suitability</label>
+    <select
+      value={layer}
+      onChange={(e) => setLayer(e.target.value)}
+      className="w-full p-1 rounded text-black"
+    >
+      <option value="">Off</option>
+      {info.layers.map((l) => (
+        <option key={l.id} value={l.id}>
+          {l.name}
+        </option>
+      ))}
+    </select>
+    {layer === "best" && (
+      <ul className="mt-2 space-y-1">
+        {Object.entries(info.legend).map(([crop, color]) => (
+          <li key={crop} className="flex items-center space-x-2">
+            <span className="inline-block w-3 h-3 rounded-sm" style={{ background: color }} />
+            <span>{crop}</span>
+          </li>
+        ))}
+      </ul>
+    )}
+    {layer && layer !== "best" && (
+      <div className="mt-2">
+        <div className="h-2 rounded" style={{ background: "linear-gradient(to right, #d73027, #fed950, #1a9850)" }} />
+        <div className="flex justify-between text-xs mt-1">
+          <span>Unsuitable</span>
+          <span>Suitable</span>
+        </div>
+      </div>
+    )}
+  </div>
+);
+
 // Controls
 const Controls = ({
   query,
@@ -44,7 +99,6 @@ const Controls = ({
   handleFinishDrawing,
   handleCalculate,
   handleClearPolygon,
-  loading,
 }: any) => (
   <div className="space-y-3">
     <div className="flex space-x-2">
@@ -54,12 +108,10 @@ const Controls = ({
         onChange={(e) => setQuery(e.target.value)}
         placeholder="Search Nigerian place..."
         className="flex-1 p-2 rounded text-black"
-        disabled={loading}
       />
       <button
         onClick={handleSearch}
-        className="bg-blue-500 px-3 rounded hover:bg-blue-600 disabled:opacity-50"
-        disabled={loading}
+        className="bg-blue-500 px-3 rounded hover:bg-blue-600"
       >
         🔍
       </button>
@@ -73,8 +125,7 @@ const Controls = ({
 
     <button
       onClick={handleLocate}
-      className="p-2 rounded-lg w-full bg-indigo-500 hover:bg-indigo-600 disabled:opacity-50"
-      disabled={loading}
+      className="p-2 rounded-lg w-full bg-indigo-500 hover:bg-indigo-600"
     >
       📍 Locate Me
     </button>
@@ -82,16 +133,14 @@ const Controls = ({
     {drawing ? (
       <button
         onClick={handleFinishDrawing}
-        className="p-2 rounded-lg w-full bg-yellow-500 hover:bg-yellow-600 disabled:opacity-50"
-        disabled={loading}
+        className="p-2 rounded-lg w-full bg-yellow-500 hover:bg-yellow-600"
       >
         🛑 Finish Drawing ({polygon.length} points)
       </button>
     ) : (
       <button
         onClick={handleDrawPolygon}
-        className="p-2 rounded-lg w-full bg-green-500 hover:bg-green-600 disabled:opacity-50"
-        disabled={loading}
+        className="p-2 rounded-lg w-full bg-green-500 hover:bg-green-600"
       >
         ✏️ Draw Polygon
       </button>
@@ -101,15 +150,13 @@ const Controls = ({
       <>
         <button
           onClick={handleCalculate}
-          className="bg-teal-500 hover:bg-teal-600 p-2 rounded-lg w-full disabled:opacity-50"
-          disabled={loading}
+          className="bg-teal-500 hover:bg-teal-600 p-2 rounded-lg w-full"
         >
-          {loading ? "⏳ Calculating..." : "⚡ Calculate"}
+          ⚡ Calculate
         </button>
         <button
           onClick={handleClearPolygon}
-          className="bg-red-500 hover:bg-red-600 p-2 rounded-lg w-full disabled:opacity-50"
-          disabled={loading}
+          className="bg-red-500 hover:bg-red-600 p-2 rounded-lg w-full"
         >
           ❌ Clear Polygon
         </button>
@@ -127,9 +174,18 @@ const Mapping = () => {
   const [manualMode, setManualMode] = useState(false);
   const [initialFly, setInitialFly] = useState(false);
   const [query, setQuery] = useState("");
-  const [loading, setLoading] = useState(false); // ✅ Loading state
+  const [suitability, setSuitability] = useState<SuitabilityInfo | null>(null);
+  const [suitabilityLayer, setSuitabilityLayer] = useState("");
   const navigate = useNavigate();
 
+  // Suitability map is optional: the control only appears once the server has one
+  useEffect(() => {
+    fetch(`${API_BASE}/suitability`)
+      .then((res) => (res.ok ? res.json() : null))
+      .then(setSuitability)
+      .catch(() => setSuitability(null));
+  }, []);
+
   // Geolocation
   useEffect(() => {
     if (!navigator.geolocation) {
@@ -237,26 +293,13 @@ const Mapping = () => {
     setDrawing(false);
   };
 
-  // Calculate with loading
-  const handleCalculate = async () => {
+  // The analysis itself runs (and streams its progress) on the dashboard
+  const handleCalculate = () => {
     if (polygon.length < 3) {
       alert("Polygon must have at least 3 points");
       return;
     }
-    try {
-      setLoading(true); // start loading
-      const res = await fetch("https://agro-karfi.onrender.com/calculate", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ polygon }),
-      });
-      const data = await res.json();
-      navigate("/dashboard", { state: { apiResult: data } });
-    } catch (err) {
-      alert("Backend error");
-    } finally {
-      setLoading(false); // stop loading
-    }
+    navigate("/dashboard", { state: { polygon } });
   };
 
   return (
@@ -276,7 +319,6 @@ const Mapping = () => {
           handleFinishDrawing={handleFinishDrawing}
           handleCalculate={handleCalculate}
           handleClearPolygon={handleClearPolygon}
-          loading={loading}
         />
       </div>
 
@@ -296,6 +338,16 @@ const Mapping = () => {
             subdomains={["a", "b", "c", "d"]}
           />
 
+          {suitability && suitabilityLayer && (
+            <TileLayer
+              key={suitabilityLayer}
+              url={`${API_BASE}/suitability/tiles/${suitabilityLayer}/{z}/{x}/{y}.png`}
+              bounds={suitability.bounds}
+              maxNativeZoom={suitability.max_native_zoom}
+              opacity={0.7}
+            />
+          )}
+
           {position && (
             <>
               <Marker position={position}>
@@ -310,6 +362,14 @@ const Mapping = () => {
           <MapWithSetup setMap={setMap} />
         </MapContainer>
 
+        {suitability && (
+          <SuitabilityControl
+            info={suitability}
+            layer={suitabilityLayer}
+            setLayer={setSuitabilityLayer}
+          />
+        )}
+
         {/* Mobile floating controls */}
         <div
           className="
@@ -331,18 +391,8 @@ const Mapping = () => {
             handleFinishDrawing={handleFinishDrawing}
             handleCalculate={handleCalculate}
             handleClearPolygon={handleClearPolygon}
-            loading={loading}
           />
         </div>
-
-        {/* Loading overlay */}
-        {loading && (
-          <div className="absolute inset-0 bg-black bg-opacity-50 flex items-center justify-center z-50">
-            <div className="text-white text-lg animate-pulse">
-              ⏳ Processing your polygon...
-            </div>
-          </div>
-        )}
       </div>
     </div>
   );
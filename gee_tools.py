@@ -1,5 +1,18 @@
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
 import ee
-import requests
+
+from ee_scheduler import ee_scheduler
+from geometry import METERS_PER_DEGREE, bounds as polygon_bounds, geodesic_area_m2
+from hedging import hedge_delay, hedged, record_latency, timed
+from http_client import http_client
+from metrics import FALLBACKS, GETINFO_CALLS, HEDGES, STALE, stage
+from raster_grid import LAYERS as GRID_LAYERS, grid_climatology, grid_soil
+from reduction_plan import effective_resolution, reduction_plans, tile_bounds
+from thumbnail_store import thumbnail_key, key_from_url, thumbnail_store
 
 def get_soil_data_backup(lat: float, lon: float) -> dict:
     """Backup: ISRIC REST API for topsoil pH and organic carbon."""
@@ -8,11 +21,8 @@ def get_soil_data_backup(lat: float, lon: float) -> dict:
             f"https://rest.isric.org/soilgrids/v2.0/properties/query?"
             f"lon={lon}&lat={lat}&property=phh2o,soc&depth=0-5cm"
         )
-        r = requests.get(url, timeout=10)
-        if r.status_code != 200:
-            return {"soil_pH": 6.5, "soil_org_carbon_pct": 1.2, "source": "default"}
-        
-        data = r.json()
+        # Non-200s, timeouts and an open circuit all raise into the default below
+        data = http_client.get_json_sync(url, timeout=10)
         ph_raw = data["properties"]["phh2o"]["layers"][0]["depths"][0]["values"]["mean"]
         soc_raw = data["properties"]["soc"]["layers"][0]["depths"][0]["values"]["mean"]
         return {
@@ -34,11 +44,7 @@ def get_climatology_data_backup(lat: float, lon: float) -> dict:
             f"&start=1991-01-01&end=2020-12-31"
             f"&daily=temperature_2m_max,precipitation_sum"
         )
-        r = requests.get(url, timeout=10)
-        if r.status_code != 200:
-            return {"avg_temp_c": 27.0, "rainfall_total_mm": 1200, "source": "default"}
-
-        data = r.json()
+        data = http_client.get_json_sync(url, timeout=10)
         temp = sum(data["daily"]["temperature_2m_max"]) / len(data["daily"]["temperature_2m_max"])
         precip = sum(data["daily"]["precipitation_sum"]) / len(data["daily"]["precipitation_sum"])
         return {"avg_temp_c": round(temp, 1), "rainfall_total_mm": round(precip, 0), "source": "Open-Meteo Backup"}
@@ -49,122 +55,437 @@ def get_climatology_data_backup(lat: float, lon: float) -> dict:
 
 
 
-def get_satellite_image_url(polygon_coords: list) -> str:
-    """Get Sentinel-2 True Color image (auto-buffer for small areas)."""
-    try:
-        ee_coords = [[lon, lat] for lat, lon in polygon_coords]
-        ee_polygon = ee.Geometry.Polygon(ee_coords)
-        area_m2 = ee_polygon.area().getInfo()
-
-        buffer_distance = 800 if area_m2 < 10_000 else 500 if area_m2 < 100_000 else 0
-        region_for_visual = ee_polygon.buffer(buffer_distance).bounds() if buffer_distance > 0 else ee_polygon.bounds()
-
-        image_collection = (
-            ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED")
-            .filterBounds(region_for_visual)
-            .filterDate("2024-01-01", "2025-01-01")
-            .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", 10))
-        )
+# --- Shared Earth Engine builders ---
+# These only build server-side graphs; nothing here talks to Earth Engine until
+# getInfo()/getThumbURL() is called, so the same builders serve both the
+# single-field helpers below and the batched extract_features().
+NO_IMAGE_URL = "https://upload.wikimedia.org/wikipedia/commons/6/65/No-Image-Placeholder.svg"
+TRUE_COLOR_VIS = {"bands": ["B4", "B3", "B2"], "min": 0, "max": 3000, "gamma": 1.2}
+IMAGERY_COLLECTION = "COPERNICUS/S2_SR_HARMONIZED"
+IMAGERY_DATES = ("2024-01-01", "2025-01-01")
+IMAGERY_MAX_CLOUD = 10
+THUMBNAIL_DIMENSIONS = 512
+
+
+def to_ee_polygon(polygon_coords: list):
+    """[[lat, lon], ...] -> ee.Geometry.Polygon (EE expects [lon, lat])."""
+    return ee.Geometry.Polygon([[lon, lat] for lat, lon in polygon_coords])
+
+
+def visual_bounds(polygon_coords: list) -> tuple:
+    """
+    (min_lon, min_lat, max_lon, max_lat) shown in the thumbnail: the polygon's
+    bounds, padded by 800 m for small farms (< 1 ha) and 500 m below 10 ha so
+    they get some context. Computed locally so the thumbnail key is known
+    before any Earth Engine call.
+    """
+    area_m2 = geodesic_area_m2(polygon_coords)
+    pad_m = 800 if area_m2 < 10_000 else 500 if area_m2 < 100_000 else 0
+    west, south, east, north = polygon_bounds(polygon_coords)
+    pad_lat = pad_m / METERS_PER_DEGREE
+    pad_lon = pad_m / (METERS_PER_DEGREE * max(math.cos(math.radians((south + north) / 2)), 1e-6))
+    return (west - pad_lon, south - pad_lat, east + pad_lon, north + pad_lat)
+
+
+def _bounds_geojson(bounds) -> dict:
+    west, south, east, north = bounds
+    return {"type": "Polygon", "coordinates": [[[west, south], [east, south], [east, north], [west, north], [west, south]]]}
+
+
+def _true_color_composite(region):
+    return (
+        ee.ImageCollection(IMAGERY_COLLECTION)
+        .filterBounds(region)
+        .filterDate(*IMAGERY_DATES)
+        .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", IMAGERY_MAX_CLOUD))
+        .median()
+    )
+
+
+def soil_images():
+    """SoilGrids topsoil (0-5 cm) pH x10 and organic carbon (dg/kg) images."""
+    soil_image = ee.Image("projects/soilgrids-isric/phh2o_mean").select("phh2o_0-5cm_mean")
+    soc_image = ee.Image("projects/soilgrids-isric/soc_mean").select("soc_0-5cm_mean")
+    return soil_image, soc_image
+
+
+def climatology_images():
+    """PERSIANN 1983-2023 precipitation total and ERA5 1979-2023 mean 2 m temperature (K)."""
+    # Rainfall (PERSIANN)
+    precip_collection = (
+        ee.ImageCollection("NOAA/PERSIANN-CDR")
+        .filterDate("1983-01-01", "2024-01-01")
+        .select("precipitation")
+    )
+    # Temperature (ERA5)
+    temp_collection = (
+        ee.ImageCollection("ECMWF/ERA5/MONTHLY")
+        .filterDate("1979-01-01", "2024-01-01")
+        .select("mean_2m_air_temperature")
+    )
+    return precip_collection.sum(), temp_collection.mean()
+
+
+def _reduce(image, geometry, plan):
+    """reduceRegion at the plan's scale/tileScale; sub-pixel polygons sample their centroid."""
+    region = geometry.centroid(1) if plan.point else geometry
+    return image.reduceRegion(
+        ee.Reducer.mean(), region, plan.scale_m, tileScale=plan.tile_scale, bestEffort=True
+    )
+
+
+def _soil_reductions(ee_polygon, plan):
+    soil_image, soc_image = soil_images()
+    return ee.Dictionary({
+        "ph": _reduce(soil_image, ee_polygon, plan),
+        "soc": _reduce(soc_image, ee_polygon, plan),
+    })
+
+
+def _climatology_reductions(ee_polygon, plans):
+    total_precip, temp_mean = climatology_images()
+    return ee.Dictionary({
+        "precip": _reduce(total_precip, ee_polygon, plans["rainfall"]),
+        "temp": _reduce(temp_mean, ee_polygon, plans["temperature"]),
+    })
+
+
+def _ndvi_image(region):
+    s2 = (
+        ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED")
+        .filterBounds(region)
+        .filterDate("2024-01-01", "2025-01-01")
+        .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", 20))
+    )
+    return s2.map(lambda img: img.normalizedDifference(["B8", "B4"]).rename("NDVI")).mean()
+
+
+def _ndvi_reduction(ee_polygon, plan):
+    return _reduce(_ndvi_image(ee_polygon), ee_polygon, plan)
+
+
+# --- Tiled reductions for large polygons ---
+def tiled_mean(image, polygon_coords: list, plan) -> dict:
+    """
+    {band: mean} over a polygon too large for one reduction: each tile of the
+    polygon is reduced on its own (in parallel, one request each) to a mean and
+    pixel count, and the tile means are recombined weighted by pixel count.
+    """
+    ee_polygon = to_ee_polygon(polygon_coords)
+    reducer = ee.Reducer.mean().combine(ee.Reducer.count(), sharedInputs=True)
+    futures = []
+    for tile in tile_bounds(polygon_coords, plan.tiles_per_side):
+        region = ee_polygon.intersection(ee.Geometry.Rectangle(list(tile)), plan.scale_m)
+        reduction = image.reduceRegion(reducer, region, plan.scale_m, tileScale=plan.tile_scale, bestEffort=True)
+        futures.append(_tile_executor.submit(get_info, reduction, "tile"))
+
+    sums, counts = {}, {}
+    for future in futures:
+        result = future.result()
+        for name, count in result.items():
+            if not name.endswith("_count") or not count:
+                continue
+            band = name[:-len("_count")]
+            mean = result.get(f"{band}_mean")
+            if mean is None:
+                continue
+            sums[band] = sums.get(band, 0.0) + mean * count
+            counts[band] = counts.get(band, 0) + count
+    return {band: sums[band] / counts[band] for band in sums}
+
+
+def _tiled_evaluation(dataset: str, polygon_coords: list, plan) -> dict:
+    """Tiled equivalent of the batch's `dataset` entry, as {dataset: evaluated}."""
+    with stage("tiled", dataset=dataset):
+        if dataset == "ndvi":
+            return {"ndvi": tiled_mean(_ndvi_image(to_ee_polygon(polygon_coords)), polygon_coords, plan)}
+        soil_image, soc_image = soil_images()
+        means = tiled_mean(soil_image.addBands(soc_image), polygon_coords, plan)
+        return {"soil": {
+            "ph": {"phh2o_0-5cm_mean": means.get("phh2o_0-5cm_mean")},
+            "soc": {"soc_0-5cm_mean": means.get("soc_0-5cm_mean")},
+        }}
+
+
+# Cell size (m) of the local grid layers behind each reported value
+GRID_RESOLUTION_M = {
+    field: round(GRID_LAYERS[layer]["res"] * METERS_PER_DEGREE)
+    for field, layer in (("soil", "soil_ph"), ("rainfall", "rainfall_mm"), ("temperature", "temp_c"))
+}
+# Reported value -> the dataset (feature) it comes from
+RESOLUTION_DATASETS = {"ndvi": "ndvi", "soil": "soil", "rainfall": "climatology", "temperature": "climatology"}
+
+
+def reduction_summary(polygon_coords: list, sources: dict) -> dict:
+    """
+    Effective resolution (m) behind each value, given {dataset: source} as in
+    the results' "source" fields: the reduction scale for Earth Engine ("GEE")
+    values, the cell size for "Local grid" values, and None for point
+    backups and defaults.
+    """
+    scales = effective_resolution(geodesic_area_m2(polygon_coords))
+    summary = {}
+    for field, dataset in RESOLUTION_DATASETS.items():
+        source = sources.get(dataset)
+        if source == "GEE":
+            summary[field] = scales[field]
+        elif source == "Local grid":
+            summary[field] = GRID_RESOLUTION_M.get(field)
+        else:
+            summary[field] = None
+    return summary
 
-        image = image_collection.median()
-        if image.bandNames().size().getInfo() == 0:
-            return "https://upload.wikimedia.org/wikipedia/commons/6/65/No-Image-Placeholder.svg"
 
-        true_color = image.select(["B4", "B3", "B2"]).clip(region_for_visual)
-        vis = {"bands": ["B4", "B3", "B2"], "min": 0, "max": 3000, "gamma": 1.2}
+# --- Parsers for evaluated results (batched and tiled) ---
+def _parse_soil(soil: dict) -> dict:
+    ph = (soil.get("ph") or {}).get("phh2o_0-5cm_mean")
+    soc = (soil.get("soc") or {}).get("soc_0-5cm_mean")
+    if ph is None or soc is None:
+        # No SoilGrids pixels (or a transient failure): the ISRIC backup answers
+        # instead, so made-up values are never cached as Earth Engine data
+        raise ValueError("Empty soil reduction")
+    return {"soil_pH": round(ph / 10, 2), "soil_org_carbon_pct": round(soc / 10, 2), "source": "GEE"}
 
-        return true_color.getThumbURL({
-            **vis,
-            "region": region_for_visual.getInfo(),
-            "dimensions": 512,
+
+def _parse_climatology(climatology: dict) -> dict:
+    total_precip = climatology.get("precip") or {}
+    temp_mean = climatology.get("temp") or {}
+    precip = total_precip.get("precipitation")
+    temp_k = temp_mean.get("mean_2m_air_temperature")
+    if (total_precip and precip is None) or (temp_mean and temp_k is None):
+        raise ValueError("Empty climatology reduction")
+    annual_precip_mm = precip / 41 if total_precip else 1200
+    mean_temp_C = (temp_k - 273.15) if temp_mean else 27.0
+    return {
+        "avg_temp_c": round(mean_temp_C, 1),
+        "rainfall_total_mm": round(annual_precip_mm, 0),
+        "source": "GEE"
+    }
+
+
+def _parse_ndvi(ndvi_mean: dict) -> float:
+    return round(ndvi_mean["NDVI"], 3)
+
+
+def get_info(obj, call: str, priority: str = "interactive"):
+    """obj.getInfo() once the scheduler admits it, counted as one Earth Engine round trip."""
+    GETINFO_CALLS.inc(call=call)
+    return ee_scheduler.run(obj.getInfo, call, priority)
+
+
+def imagery_key(bounds) -> str:
+    """Thumbnail store key for a region: everything that changes the rendered image."""
+    return thumbnail_key(bounds, {
+        "collection": IMAGERY_COLLECTION,
+        "dates": IMAGERY_DATES,
+        "max_cloud": IMAGERY_MAX_CLOUD,
+        "vis": TRUE_COLOR_VIS,
+        "dimensions": THUMBNAIL_DIMENSIONS,
+    })
+
+
+def render_thumbnail(bounds) -> bytes:
+    """Render the true-colour composite over `bounds` and download the PNG."""
+    GETINFO_CALLS.inc(call="thumbnail")
+    region = ee.Geometry.Rectangle(list(bounds))
+    true_color = _true_color_composite(region).select(TRUE_COLOR_VIS["bands"]).clip(region)
+
+    def render():
+        url = true_color.getThumbURL({
+            **TRUE_COLOR_VIS,
+            "region": _bounds_geojson(bounds),
+            "dimensions": THUMBNAIL_DIMENSIONS,
             "format": "png"
         })
+        # Pixels are computed while the download runs, so it holds the slot too
+        return http_client.get_bytes_sync(url, timeout=60)
 
-    except Exception:
-        # Placeholder image fallback
-        return "https://upload.wikimedia.org/wikipedia/commons/6/65/No-Image-Placeholder.svg"
+    return ee_scheduler.run(render, "thumbnail")
 
 
+def _stored_thumbnail_url(bounds) -> str:
+    """/imagery URL for `bounds`, rendering it once if it isn't stored yet."""
+    key = imagery_key(bounds)
+    thumbnail_store.get_or_create(key, lambda: render_thumbnail(bounds))
+    return thumbnail_store.url(key)
 
 
-def get_soil_data(polygon_coords: list, lat: float, lon: float) -> dict:
-    """Soil pH and organic carbon (%), with fallback."""
-    try:
-        ee_coords = [[lon, lat] for lat, lon in polygon_coords]
-        ee_polygon = ee.Geometry.Polygon(ee_coords)
+def imagery_is_current(url) -> bool:
+    """False for cached imagery values that can no longer be served (evicted, or an old getThumbURL link)."""
+    if url == NO_IMAGE_URL:
+        return True
+    key = key_from_url(url)
+    return key is not None and thumbnail_store.exists(key)
 
-        soil_image = ee.Image("projects/soilgrids-isric/phh2o_mean").select("phh2o_0-5cm_mean")
-        soc_image = ee.Image("projects/soilgrids-isric/soc_mean").select("soc_0-5cm_mean")
 
-        soil_val = soil_image.reduceRegion(
-            ee.Reducer.mean(), ee_polygon, 250, bestEffort=True
-        ).getInfo()
-        soc_val = soc_image.reduceRegion(
-            ee.Reducer.mean(), ee_polygon, 250, bestEffort=True
-        ).getInfo()
+# --- Batched feature extraction ---
+DATASETS = ("imagery", "climatology", "soil", "ndvi")
 
-        soil_pH = (soil_val.get("phh2o_0-5cm_mean") or 65) / 10
-        soil_org_carbon = (soc_val.get("soc_0-5cm_mean") or 12) / 10
+# Per-source deadlines and the overall budget for one extract_features() call (s).
+# A source that misses its deadline is answered with its default and marked stale.
+SOURCE_DEADLINES_S = {
+    "imagery": float(os.getenv("DEADLINE_IMAGERY_S", "20")),
+    "climatology": float(os.getenv("DEADLINE_CLIMATOLOGY_S", "15")),
+    "soil": float(os.getenv("DEADLINE_SOIL_S", "15")),
+    "ndvi": float(os.getenv("DEADLINE_NDVI_S", "20")),
+}
+LATENCY_BUDGET_S = float(os.getenv("CALCULATE_BUDGET_S", "25"))
 
-        return {"soil_pH": round(soil_pH, 2), "soil_org_carbon_pct": round(soil_org_carbon, 2), "source": "GEE"}
-    except Exception:
-        return get_soil_data_backup(lat, lon)
+# Immediate answers for sources that run out of time
+DEFAULTS = {
+    "imagery": NO_IMAGE_URL,
+    "climatology": {"avg_temp_c": 27.0, "rainfall_total_mm": 1200, "source": "default"},
+    "soil": {"soil_pH": 6.5, "soil_org_carbon_pct": 1.2, "source": "default"},
+    "ndvi": 0.45,  # fallback average NDVI for cropland
+}
 
+# Separate pools so source tasks waiting on the batch can never starve it
+_batch_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="gee-batch")
+_source_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="gee-source")
+_hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="gee-hedge")
+_tile_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="gee-tile")
 
-def get_climatology_data(polygon_coords: list, lat: float, lon: float) -> dict:
-    """Rainfall + Temperature, with fallback."""
-    try:
-        ee_coords = [[lon, lat] for lat, lon in polygon_coords]
-        ee_polygon = ee.Geometry.Polygon(ee_coords)
-
-        # Rainfall (PERSIANN)
-        precip_collection = (
-            ee.ImageCollection("NOAA/PERSIANN-CDR")
-            .filterDate("1983-01-01", "2024-01-01")
-            .select("precipitation")
-        )
-        total_precip = precip_collection.sum().reduceRegion(
-            ee.Reducer.mean(), ee_polygon, 5000, bestEffort=True
-        ).getInfo()
-        annual_precip_mm = list(total_precip.values())[0] / 41 if total_precip else 1200
-
-        # Temperature (ERA5)
-        temp_collection = (
-            ee.ImageCollection("ECMWF/ERA5/MONTHLY")
-            .filterDate("1979-01-01", "2024-01-01")
-            .select("mean_2m_air_temperature")
+PARSERS = {"soil": _parse_soil, "climatology": _parse_climatology}
+# dataset -> (latency histogram name, backup provider)
+BACKUPS = {
+    "soil": ("isric", get_soil_data_backup),
+    "climatology": ("open_meteo", get_climatology_data_backup),
+}
+
+
+def _source_value(dataset: str, batch, bounds, lat: float, lon: float):
+    """(value, fell_back) for one dataset once the batched evaluation resolves."""
+    with stage(dataset):
+        return _resolve_source(dataset, batch, bounds, lat, lon)
+
+
+def _resolve_source(dataset: str, batch, bounds, lat: float, lon: float):
+    if dataset in BACKUPS:
+        # Soil/climatology have real backups, so a slow Earth Engine gets hedged
+        provider, backup_fn = BACKUPS[dataset]
+        value, winner = hedged(
+            batch,
+            parse=lambda evaluated: PARSERS[dataset](evaluated[dataset]),
+            backup=lambda: timed(provider, backup_fn, lat, lon),
+            executor=_hedge_executor,
+            delay=hedge_delay("gee"),
+            accept_backup=lambda value: value.get("source") != "default",
         )
-        temp_mean = temp_collection.mean().reduceRegion(
-            ee.Reducer.mean(), ee_polygon, 30000, bestEffort=True
-        ).getInfo()
-        mean_temp_C = (list(temp_mean.values())[0] - 273.15) if temp_mean else 27.0
+        if winner != "primary":
+            HEDGES.inc(dataset=dataset, winner=winner)
+        return value, winner != "primary"
 
-        return {
-            "avg_temp_c": round(mean_temp_C, 1),
-            "rainfall_total_mm": round(annual_precip_mm, 0),
-            "source": "GEE"
-        }
+    try:
+        evaluated = batch.result()
+        if dataset == "ndvi":
+            return _parse_ndvi(evaluated["ndvi"]), False
+        if evaluated["band_count"] == 0:
+            return NO_IMAGE_URL, False
+        return _stored_thumbnail_url(bounds), False
     except Exception:
-        return get_climatology_data_backup(lat, lon)
+        return DEFAULTS[dataset], True
 
 
-def get_ndvi_mean(polygon_coords: list) -> float:
-    """NDVI mean (fallback = 0.45 typical)."""
+def _evaluate(request: dict) -> dict:
+    if not request:
+        return {}
     try:
-        ee_coords = [[lon, lat] for lat, lon in polygon_coords]
-        ee_polygon = ee.Geometry.Polygon(ee_coords)
-
-        s2 = (
-            ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED")
-            .filterBounds(ee_polygon)
-            .filterDate("2024-01-01", "2025-01-01")
-            .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", 20))
-        )
+        start = time.monotonic()
+        with stage("earth_engine_batch"):
+            evaluated = get_info(ee.Dictionary(request), "batch")
+        record_latency("gee", time.monotonic() - start)
+        return evaluated
+    except Exception as e:
+        print(f"Batched GEE evaluation failed: {e}")
+        return {}
 
-        ndvi = s2.map(lambda img: img.normalizedDifference(["B8", "B4"]).rename("NDVI"))
-        ndvi_mean = ndvi.mean().reduceRegion(
-            ee.Reducer.mean(), ee_polygon, 20, bestEffort=True
-        ).getInfo()
-        return round(list(ndvi_mean.values())[0], 3)
-    except Exception:
-        return 0.45  # fallback average NDVI for cropland
+
+def _evaluate_tiled(dataset: str, polygon_coords: list, plan) -> dict:
+    try:
+        return _tiled_evaluation(dataset, polygon_coords, plan)
+    except Exception as e:
+        print(f"Tiled GEE evaluation of {dataset} failed: {e}")
+        return {}
+
+
+def extract_features(polygon_coords: list, lat: float, lon: float, datasets=DATASETS,
+                     budget_s: float = LATENCY_BUDGET_S) -> dict:
+    """
+    Every requested GEE dataset for a polygon in one server-side evaluation.
+    The polygon should already have been through geometry.clean_polygon().
+
+    Imagery availability, soil, climatology and NDVI reductions are packed
+    into a single ee.Dictionary and resolved with one getInfo(); rendering the
+    thumbnail is the only other round trip. Soil and climatology come from the
+    local raster grid when it covers the polygon, and imagery from the
+    thumbnail store when it was rendered before; those are only sent to Earth
+    Engine otherwise. Scales follow reduction_plan.py, and soil/NDVI for
+    polygons too large for one reduction are tiled in parallel requests
+    alongside the batch.
+
+    Each source then finishes on its own thread (parsing, thumbnail, or its
+    backup provider if the primary failed or is slower than its usual p95, see
+    hedging.py) under its SOURCE_DEADLINES_S entry,
+    capped by `budget_s` overall. Datasets that fell back are listed under
+    "fallbacks" so callers don't cache them; those that ran out of time get
+    their default and are also listed under "stale".
+    """
+    started = time.monotonic()
+    results, fallbacks, stale = {}, [], []
+    for dataset, lookup in (("soil", grid_soil), ("climatology", grid_climatology)):
+        if dataset in datasets:
+            with stage("grid", dataset=dataset):
+                local = lookup(polygon_coords)
+            if local is not None:
+                results[dataset] = local
+    bounds = visual_bounds(polygon_coords)
+    if "imagery" in datasets:
+        stored = thumbnail_store.url(imagery_key(bounds))
+        if imagery_is_current(stored):
+            results["imagery"] = stored
+    datasets = [d for d in datasets if d not in results]
+
+    ee_polygon = to_ee_polygon(polygon_coords)
+    plans = reduction_plans(geodesic_area_m2(polygon_coords))
+    # Polygons too large for one reduction are tiled outside the batch
+    tiled = [d for d in ("soil", "ndvi") if d in datasets and plans[d].tiled]
+
+    request = {}
+    if "imagery" in datasets:
+        region = ee.Geometry.Rectangle(list(bounds))
+        request["band_count"] = _true_color_composite(region).bandNames().size()
+    if "soil" in datasets and "soil" not in tiled:
+        request["soil"] = _soil_reductions(ee_polygon, plans["soil"])
+    if "climatology" in datasets:
+        request["climatology"] = _climatology_reductions(ee_polygon, plans)
+    if "ndvi" in datasets and "ndvi" not in tiled:
+        request["ndvi"] = _ndvi_reduction(ee_polygon, plans["ndvi"])
+
+    batch = _batch_executor.submit(_evaluate, request)
+    evaluations = {
+        dataset: _batch_executor.submit(_evaluate_tiled, dataset, polygon_coords, plans[dataset])
+        for dataset in tiled
+    }
+    sources = {
+        dataset: _source_executor.submit(_source_value, dataset, evaluations.get(dataset, batch), bounds, lat, lon)
+        for dataset in datasets
+    }
+
+    for dataset, future in sources.items():
+        deadline = started + min(SOURCE_DEADLINES_S[dataset], budget_s)
+        try:
+            value, fell_back = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            print(f"Source '{dataset}' missed its {deadline - started:.1f}s deadline; using default.")
+            value, fell_back = DEFAULTS[dataset], True
+            stale.append(dataset)
+            STALE.inc(dataset=dataset)
+        results[dataset] = value
+        if fell_back:
+            fallbacks.append(dataset)
+            provider = value.get("source", "default") if isinstance(value, dict) else "default"
+            FALLBACKS.inc(dataset=dataset, provider=provider)
+
+    results["fallbacks"] = fallbacks
+    results["stale"] = stale
+    return results
@@ -0,0 +1,216 @@
+"""
+Local polygon geometry: validation, repair, simplification, area and bounds.
+
+Farm outlines drawn in Mapping.tsx can self-intersect (vertices clicked out of
+order), repeat points, or carry thousands of vertices from a traced boundary.
+`clean_polygon()` fixes those in-process before anything is sent to Earth
+Engine, and `geodesic_area_m2()` / `bounds()` answer the questions that used to
+cost an `area().getInfo()` round trip.
+
+Polygons are [[lat, lon], ...] rings like everywhere else in the API.
+Planar work (intersections, simplification) happens on a local
+equirectangular projection in metres, which is accurate at farm scale.
+"""
+import heapq
+import math
+import os
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EARTH_RADIUS_M = 6_371_008.8  # mean radius (IUGG)
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+MAX_VERTICES = int(os.getenv("POLYGON_MAX_VERTICES", "256"))
+# Largest ring accepted at all (traced boundaries are simplified down to MAX_VERTICES)
+MAX_INPUT_VERTICES = int(os.getenv("POLYGON_MAX_INPUT_VERTICES", "10000"))
+# Vertices whose triangle with their neighbours is smaller than this are
+# collinear points or zero-width spikes and are always dropped
+MIN_TRIANGLE_M2 = 0.01
+# 2-opt repair is for a few vertices clicked out of order; rings that don't
+# untangle within this many moves or this time get their convex hull
+UNTANGLE_MAX_MOVES = 64
+UNTANGLE_BUDGET_S = 0.25
+
+
+class InvalidPolygonError(ValueError):
+    """Raised for input that can't be turned into a usable polygon."""
+
+
+# --- Measurements ---
+def geodesic_area_m2(polygon_coords: list) -> float:
+    """Area on the sphere (Chamberlain & Duquette), within ~0.5% of the ellipsoidal area."""
+    lats = np.radians([lat for lat, _ in polygon_coords])
+    lons = np.radians([lon for _, lon in polygon_coords])
+    lons_next, lats_next = np.roll(lons, -1), np.roll(lats, -1)
+    total = np.sum((lons_next - lons) * (2 + np.sin(lats) + np.sin(lats_next)))
+    return float(abs(total) * EARTH_RADIUS_M ** 2 / 2)
+
+
+def bounds(polygon_coords: list) -> tuple:
+    """(min_lon, min_lat, max_lon, max_lat)."""
+    lats = [lat for lat, _ in polygon_coords]
+    lons = [lon for _, lon in polygon_coords]
+    return min(lons), min(lats), max(lons), max(lats)
+
+
+def _project(polygon_coords: list):
+    """[lat, lon] ring -> (n, 2) metres on an equirectangular projection at its mean latitude."""
+    coords = np.asarray(polygon_coords, dtype=np.float64)
+    lat0 = math.radians(coords[:, 0].mean())
+    return np.column_stack((coords[:, 1] * METERS_PER_DEGREE * math.cos(lat0), coords[:, 0] * METERS_PER_DEGREE))
+
+
+# --- Self-intersections ---
+def _crossings(xy: np.ndarray, limit: int = None) -> list:
+    """(i, j) pairs, i < j, of non-adjacent ring edges that properly cross (at most `limit`)."""
+    a, b = xy, np.roll(xy, -1, axis=0)
+    n = len(xy)
+
+    def orient(p, q, r):
+        return np.sign((q[..., 0] - p[..., 0]) * (r[..., 1] - p[..., 1]) - (q[..., 1] - p[..., 1]) * (r[..., 0] - p[..., 0]))
+
+    pairs = []
+    for i in range(n - 2):
+        j = np.arange(i + 2, n if i > 0 else n - 1)  # skip neighbours (edge n-1 touches edge 0)
+        if not len(j):
+            continue
+        d1 = orient(a[i], b[i], a[j])
+        d2 = orient(a[i], b[i], b[j])
+        d3 = orient(a[j], b[j], a[i])
+        d4 = orient(a[j], b[j], b[i])
+        hits = j[(d1 * d2 < 0) & (d3 * d4 < 0)]
+        pairs.extend((i, int(k)) for k in hits)
+        if limit is not None and len(pairs) >= limit:
+            return pairs[:limit]
+    return pairs
+
+
+def _convex_hull(points: list) -> list:
+    """Monotone chain hull of (lat, lon) points, counter-clockwise in (lon, lat)."""
+    pts = sorted(set((lon, lat) for lat, lon in points))
+    if len(pts) < 3:
+        return [[lat, lon] for lon, lat in pts]
+
+    def cross(o, p, q):
+        return (p[0] - o[0]) * (q[1] - o[1]) - (p[1] - o[1]) * (q[0] - o[0])
+
+    lower, upper = [], []
+    for p in pts:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+    for p in reversed(pts):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+    return [[lat, lon] for lon, lat in lower[:-1] + upper[:-1]]
+
+
+def _untangle(ring: list):
+    """
+    Remove self-intersections by 2-opt moves (reversing the run of vertices
+    between two crossing edges), which keeps every vertex; falls back to the
+    convex hull if the ring doesn't untangle within UNTANGLE_MAX_MOVES moves
+    and UNTANGLE_BUDGET_S seconds. Returns (ring, how).
+    """
+    ring = list(ring)
+    deadline = time.monotonic() + UNTANGLE_BUDGET_S
+    for _ in range(UNTANGLE_MAX_MOVES):
+        crossings = _crossings(_project(ring), limit=1)
+        if not crossings:
+            return ring, "untangled"
+        if time.monotonic() > deadline:
+            break
+        i, j = crossings[0]
+        ring[i + 1:j + 1] = ring[i + 1:j + 1][::-1]
+    return _convex_hull(ring), "convex_hull"
+
+
+# --- Simplification ---
+def _triangle_areas(xy: np.ndarray, prev: np.ndarray, nxt: np.ndarray) -> np.ndarray:
+    p, q = xy[prev], xy[nxt]
+    return np.abs((p[:, 0] - xy[:, 0]) * (q[:, 1] - xy[:, 1]) - (q[:, 0] - xy[:, 0]) * (p[:, 1] - xy[:, 1])) / 2
+
+
+def simplify(polygon_coords: list, max_vertices: int = MAX_VERTICES, min_area_m2: float = MIN_TRIANGLE_M2) -> list:
+    """
+    Visvalingam-Whyatt: repeatedly drop the vertex whose triangle with its
+    neighbours is smallest, until at most `max_vertices` remain and no
+    remaining triangle is below `min_area_m2`.
+    """
+    n = len(polygon_coords)
+    xy = _project(polygon_coords)
+    prev = np.roll(np.arange(n), 1)
+    nxt = np.roll(np.arange(n), -1)
+    areas = _triangle_areas(xy, prev, nxt)
+    heap = [(area, i) for i, area in enumerate(areas)]
+    heapq.heapify(heap)
+    alive = np.ones(n, dtype=bool)
+    remaining = n
+
+    def area_of(i):
+        p, q = xy[prev[i]], xy[nxt[i]]
+        return abs((p[0] - xy[i][0]) * (q[1] - xy[i][1]) - (q[0] - xy[i][0]) * (p[1] - xy[i][1])) / 2
+
+    while heap and remaining > 3:
+        area, i = heapq.heappop(heap)
+        if not alive[i] or area != areas[i]:
+            continue  # stale heap entry
+        if remaining <= max_vertices and area >= min_area_m2:
+            break
+        alive[i] = False
+        remaining -= 1
+        p, q = prev[i], nxt[i]
+        nxt[p], prev[q] = q, p
+        for k in (p, q):
+            areas[k] = area_of(k)
+            heapq.heappush(heap, (areas[k], k))
+
+    return [polygon_coords[i] for i in range(n) if alive[i]]
+
+
+# --- Entry point ---
+def clean_polygon(polygon_coords: list, max_vertices: int = MAX_VERTICES):
+    """
+    Validate and repair a [[lat, lon], ...] ring for Earth Engine.
+
+    Drops repeated/closing vertices, collinear points and spikes, simplifies
+    to `max_vertices`, and removes self-intersections. Returns (ring, report)
+    and raises InvalidPolygonError when no usable polygon is left.
+    """
+    if len(polygon_coords) > MAX_INPUT_VERTICES:
+        raise InvalidPolygonError(f"Polygon has more than {MAX_INPUT_VERTICES} vertices.")
+    try:
+        ring = [[float(lat), float(lon)] for lat, lon in polygon_coords]
+    except (TypeError, ValueError):
+        raise InvalidPolygonError("Polygon vertices must be [lat, lon] number pairs.")
+    if not all(math.isfinite(lat) and math.isfinite(lon) for lat, lon in ring):
+        raise InvalidPolygonError("Polygon coordinates must be finite numbers.")
+    if not all(-90 <= lat <= 90 and -180 <= lon <= 180 for lat, lon in ring):
+        raise InvalidPolygonError("Polygon coordinates must be [lat, lon] in degrees.")
+
+    deduped = []
+    for point in ring:
+        if not deduped or deduped[-1] != point:
+            deduped.append(point)
+    if len(deduped) > 1 and deduped[0] == deduped[-1]:
+        deduped.pop()
+    if len(deduped) < 3:
+        raise InvalidPolygonError("Polygon must have at least 3 distinct vertices.")
+
+    report = {"input_vertices": len(ring), "repair": None}
+    cleaned = simplify(deduped, max_vertices)
+    if _crossings(_project(cleaned), limit=1):
+        cleaned, report["repair"] = _untangle(cleaned)
+        cleaned = simplify(cleaned, max_vertices)
+        # Dropping vertices can introduce a crossing again; a hull can't have one
+        if _crossings(_project(cleaned), limit=1):
+            cleaned, report["repair"] = simplify(_convex_hull(cleaned), max_vertices), "convex_hull"
+
+    if len(cleaned) < 3 or geodesic_area_m2(cleaned) < MIN_TRIANGLE_M2:
+        raise InvalidPolygonError("Polygon has no area.")
+    report["vertices"] = len(cleaned)
+    return cleaned, report
@@ -0,0 +1,142 @@
+"""
+Hedged requests: if the primary provider (Earth Engine) hasn't answered
+within its usual latency, start the backup provider in parallel and take
+whichever acceptable answer arrives first.
+
+The hedge delay is a percentile (HEDGE_PERCENTILE, default p95) of the
+primary's observed latency, so in the common case no extra requests are made
+and only the slow tail pays for a second one.
+"""
+import bisect
+import math
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, TimeoutError as FutureTimeout, wait
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "1") == "1"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_DEFAULT_DELAY_S = float(os.getenv("HEDGE_DEFAULT_DELAY_S", "8"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+
+# Log-spaced bucket upper bounds from 10 ms to ~2 min
+BUCKET_BOUNDS = tuple(0.01 * 1.25 ** i for i in range(43))
+
+
+class LatencyHistogram:
+    """Fixed log-bucket latency histogram (seconds) with percentile estimates."""
+
+    def __init__(self, bounds=BUCKET_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+            self.total += 1
+            self.sum += seconds
+
+    def percentile(self, p: float):
+        """Upper bound of the bucket holding the p-th percentile, or None if empty."""
+        with self._lock:
+            if not self.total:
+                return None
+            rank = math.ceil(self.total * p / 100)
+            seen = 0
+            for i, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank:
+                    return self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+        return None
+
+    def summary(self) -> dict:
+        return {
+            "count": self.total,
+            "mean_s": round(self.sum / self.total, 3) if self.total else None,
+            **{f"p{p}_s": self.percentile(p) for p in (50, 95, 99)},
+        }
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def histogram(provider: str) -> LatencyHistogram:
+    with _histograms_lock:
+        if provider not in _histograms:
+            _histograms[provider] = LatencyHistogram()
+        return _histograms[provider]
+
+
+def record_latency(provider: str, seconds: float):
+    histogram(provider).record(seconds)
+
+
+def timed(provider: str, fn, *args, **kwargs):
+    """Call fn and record its latency under `provider`."""
+    start = time.monotonic()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        record_latency(provider, time.monotonic() - start)
+
+
+def hedge_delay(provider: str) -> float:
+    """How long to wait on `provider` before hedging (its HEDGE_PERCENTILE latency)."""
+    hist = histogram(provider)
+    if hist.total < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY_S
+    return hist.percentile(HEDGE_PERCENTILE)
+
+
+def latency_summary() -> dict:
+    with _histograms_lock:
+        providers = dict(_histograms)
+    return {provider: hist.summary() for provider, hist in providers.items()}
+
+
+def hedged(primary, parse, backup, executor, delay: float, accept_backup=lambda value: True):
+    """
+    Resolve one value from an in-flight primary future, hedging with `backup`.
+
+    `parse(primary_result)` turns the primary's result into the value (raising
+    if it's unusable); `backup()` is a zero-arg callable run on `executor`.
+    Returns (value, winner) with winner in {"primary", "backup", "hedge"}.
+    """
+    try:
+        return parse(primary.result(timeout=None if not HEDGE_ENABLED else delay)), "primary"
+    except FutureTimeout:
+        pass
+    except Exception:
+        # Primary failed outright: plain fallback, nothing to race
+        return backup(), "backup"
+
+    hedge = executor.submit(backup)
+    pending = {primary, hedge}
+    backup_value = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future is primary:
+                try:
+                    value = parse(future.result())
+                except Exception:
+                    continue
+                # The loser is dropped; cancel() only helps if it hasn't started yet
+                hedge.cancel()
+                return value, "primary"
+            try:
+                backup_value = future.result()
+            except Exception:
+                continue
+            if accept_backup(backup_value):
+                # The primary is usually shared with other sources, so it's left running
+                return backup_value, "hedge"
+    return backup_value, "backup"
@@ -0,0 +1,209 @@
+"""
+Shared HTTP client for the fallback data providers (Open-Meteo, ISRIC)
+and for downloading rendered Earth Engine thumbnails.
+
+One httpx.AsyncClient per host keeps TCP+TLS connections alive between
+requests, and a circuit breaker per host skips a provider that keeps failing
+so callers go straight to their defaults instead of paying the full timeout.
+
+All clients live on a dedicated event-loop thread, so the same pools serve
+both async endpoints (`await http_client.get_json(...)`) and the synchronous
+GEE helpers running in the threadpool (`http_client.get_json_sync(...)`).
+"""
+import asyncio
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+from dotenv import load_dotenv
+
+from metrics import HTTP_REQUESTS
+
+load_dotenv()
+
+DEFAULT_TIMEOUT_S = float(os.getenv("HTTP_TIMEOUT_S", "10"))
+FAILURE_THRESHOLD = int(os.getenv("HTTP_BREAKER_FAILURES", "3"))
+RESET_TIMEOUT_S = float(os.getenv("HTTP_BREAKER_RESET_S", "30"))
+USER_AGENT = "Agro-Karfi/1.0 (+https://github.com/ImperiumBuild/Agro-Karfi)"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a host whose breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures;
+    open -> half-open after `reset_timeout` s, letting one trial call through;
+    half-open -> closed on success, back to open on failure. A cancelled
+    trial (a hedge or deadline gave up on it) just frees the trial slot.
+
+    allow() hands each admitted call a token to pass back to record_*(), so
+    only the call that took the trial can release it.
+    """
+
+    # Token for calls admitted while closed (never the trial)
+    CALL = object()
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT_S):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = None
+        self._lock = threading.Lock()
+
+    @property
+    def trial_in_flight(self) -> bool:
+        return self._trial is not None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """A token for this call, or None while the circuit is open."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return self.CALL
+            if state == "half_open" and self._trial is None:
+                self._trial = object()
+                return self._trial
+            return None
+
+    def record_success(self, token):
+        # Any success shows the host is back, whichever call it was
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = None
+
+    def record_cancelled(self, token):
+        with self._lock:
+            if token is self._trial:
+                self._trial = None
+
+    def record_failure(self, token):
+        with self._lock:
+            self.failures += 1
+            if token is self._trial:
+                self._trial = None
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class HttpClient:
+    """Per-host pooled async clients + circuit breakers, usable from sync and async code."""
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT_S, max_connections_per_host: int = 20, transport=None):
+        self.timeout = timeout
+        # Optional httpx transport for every host (the benchmark harness uses a local fake)
+        self.transport = transport
+        self.limits = httpx.Limits(
+            max_connections=max_connections_per_host,
+            max_keepalive_connections=max_connections_per_host,
+            keepalive_expiry=60,
+        )
+        self._clients = {}
+        self._breakers = {}
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # --- Event loop thread ---
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="http-client", daemon=True)
+                self._thread.start()
+        return self._loop
+
+    def _client(self, host: str) -> httpx.AsyncClient:
+        # Only called on the client loop, so no locking needed
+        if host not in self._clients:
+            self._clients[host] = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=self.timeout,
+                headers={"User-Agent": USER_AGENT},
+                follow_redirects=True,
+                transport=self.transport,
+            )
+        return self._clients[host]
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker()
+            return self._breakers[host]
+
+    # --- Requests ---
+    async def _get(self, url: str, params: dict = None, timeout: float = None, as_json: bool = True):
+        host = urlsplit(url).netloc
+        breaker = self.breaker(host)
+        token = breaker.allow()
+        if token is None:
+            HTTP_REQUESTS.inc(host=host, outcome="circuit_open")
+            raise CircuitOpenError(f"Circuit open for {host}")
+        try:
+            response = await self._client(host).get(url, params=params, timeout=timeout or self.timeout)
+            response.raise_for_status()
+            data = response.json() if as_json else response.content
+        except asyncio.CancelledError:
+            # Not the host's fault, but a half-open trial must not stay in flight forever
+            breaker.record_cancelled(token)
+            HTTP_REQUESTS.inc(host=host, outcome="cancelled")
+            raise
+        except Exception:
+            breaker.record_failure(token)
+            HTTP_REQUESTS.inc(host=host, outcome="error")
+            raise
+        breaker.record_success(token)
+        HTTP_REQUESTS.inc(host=host, outcome="ok")
+        return data
+
+    def _submit(self, url: str, params: dict = None, timeout: float = None, as_json: bool = True):
+        return asyncio.run_coroutine_threadsafe(self._get(url, params, timeout, as_json), self._ensure_loop())
+
+    async def get_json(self, url: str, params: dict = None, timeout: float = None):
+        """GET `url` and decode JSON. Raises on HTTP errors, timeouts and open circuits."""
+        return await asyncio.wrap_future(self._submit(url, params, timeout))
+
+    def get_json_sync(self, url: str, params: dict = None, timeout: float = None):
+        """Blocking variant of get_json() for code running in worker threads."""
+        return self._submit(url, params, timeout).result()
+
+    def get_bytes_sync(self, url: str, params: dict = None, timeout: float = None) -> bytes:
+        """Blocking GET returning the raw body (e.g. a rendered thumbnail)."""
+        return self._submit(url, params, timeout, as_json=False).result()
+
+    def breaker_states(self) -> dict:
+        with self._lock:
+            return {
+                host: {"state": b.state, "consecutive_failures": b.failures}
+                for host, b in self._breakers.items()
+            }
+
+    def close(self):
+        if self._loop is None:
+            return
+
+        async def _close_all():
+            for client in self._clients.values():
+                await client.aclose()
+            self._clients.clear()
+
+        asyncio.run_coroutine_threadsafe(_close_all(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = self._thread = None
+
+
+http_client = HttpClient()
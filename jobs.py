@@ -0,0 +1,228 @@
+"""
+Background jobs for /calculate.
+
+`POST /jobs/calculate` returns a job id straight away; a bounded thread pool
+runs the Earth Engine pipeline and `GET /jobs/{id}` reports progress and the
+result. Submissions for a polygon that is already queued/running (or that
+finished recently) get the existing job instead of a new computation, so
+double taps and client retries cost nothing.
+
+Job state lives in a SQLite file (like the feature cache), so every uvicorn
+worker on the host sees every job: a poll may land on any worker, and
+duplicate submissions are coalesced across workers. The worker that accepted
+a job runs it; jobs left queued/running by a worker that has since died are
+marked failed, so they can be resubmitted.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from feature_cache import polygon_cache_key
+
+load_dotenv()
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "cache/jobs.sqlite3")
+
+
+class QueueFullError(Exception):
+    """Raised when the pending job limit is reached."""
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Job:
+    COLUMNS = ("id", "key", "status", "stage", "progress", "result", "error", "created", "started", "finished")
+
+    def __init__(self, key: str, polygon_coords: list = None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.polygon_coords = polygon_coords
+        self.status = "queued"  # queued -> running -> succeeded | failed
+        self.stage = "queued"
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    @classmethod
+    def from_row(cls, row) -> "Job":
+        job = cls.__new__(cls)
+        job.polygon_coords = None
+        for column, value in zip(cls.COLUMNS, row):
+            setattr(job, column, value)
+        job.result = json.loads(job.result) if job.result is not None else None
+        return job
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(self.progress, 2),
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    Single-flight job runner.
+
+    `runner(polygon_coords, progress)` does the work; `progress(stage, fraction)`
+    lets it report where it is. `max_pending` bounds queued/running jobs
+    across all workers sharing `path`.
+    """
+
+    def __init__(self, runner, max_workers: int = 4, max_pending: int = 100, result_ttl: float = 3600,
+                 path: str = JOBS_DB_PATH):
+        self.runner = runner
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="calculate-job")
+        self._lock = threading.Lock()
+        self._conn = None
+        self.stats = {"submitted": 0, "coalesced": 0, "succeeded": 0, "failed": 0}
+
+    # --- Store ---
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Autocommit, so submit() can take the write lock up front with BEGIN IMMEDIATE
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS calculate_jobs ("
+                " id TEXT PRIMARY KEY, key TEXT NOT NULL, status TEXT NOT NULL, stage TEXT NOT NULL,"
+                " progress REAL NOT NULL, result TEXT, error TEXT, created REAL NOT NULL, started REAL,"
+                " finished REAL, pid INTEGER NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS calculate_jobs_key ON calculate_jobs (key, created)")
+        return self._conn
+
+    def _update(self, job_id: str, **values):
+        with self._lock:
+            try:
+                self._connect().execute(
+                    f"UPDATE calculate_jobs SET {', '.join(f'{column} = ?' for column in values)} WHERE id = ?",
+                    [*values.values(), job_id],
+                )
+            except sqlite3.Error as e:
+                print(f"Job {job_id} update failed: {e}")
+
+    def _prune(self, conn):
+        """Drop expired results and fail jobs whose worker process is gone."""
+        now = time.time()
+        conn.execute("DELETE FROM calculate_jobs WHERE finished IS NOT NULL AND finished < ?", (now - self.result_ttl,))
+        orphans = [
+            job_id for job_id, pid in
+            conn.execute("SELECT id, pid FROM calculate_jobs WHERE finished IS NULL").fetchall()
+            if not _alive(pid)
+        ]
+        conn.executemany(
+            "UPDATE calculate_jobs SET status = 'failed', error = 'Worker exited before the job finished.',"
+            " finished = ? WHERE id = ?",
+            [(now, job_id) for job_id in orphans],
+        )
+
+    def submit(self, polygon_coords: list) -> Job:
+        key = polygon_cache_key(polygon_coords)
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            committed = False
+            try:
+                self._prune(conn)
+                # Reuse anything in flight or succeeded; failed jobs may be retried
+                row = conn.execute(
+                    f"SELECT {', '.join(Job.COLUMNS)} FROM calculate_jobs"
+                    " WHERE key = ? AND status != 'failed' ORDER BY created DESC LIMIT 1",
+                    (key,),
+                ).fetchone()
+                pending = conn.execute("SELECT COUNT(*) FROM calculate_jobs WHERE finished IS NULL").fetchone()[0]
+                job = None
+                if row is None and pending < self.max_pending:
+                    job = Job(key, polygon_coords)
+                    conn.execute(
+                        "INSERT INTO calculate_jobs (id, key, status, stage, progress, created, pid)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (job.id, key, job.status, job.stage, job.progress, job.created, os.getpid()),
+                    )
+                conn.execute("COMMIT")
+                committed = True
+            finally:
+                if not committed:
+                    conn.execute("ROLLBACK")
+
+            if row is not None:
+                self.stats["coalesced"] += 1
+                return Job.from_row(row)
+            if job is None:
+                raise QueueFullError(f"{pending} jobs already pending")
+            self.stats["submitted"] += 1
+        self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job: Job):
+        self._update(job.id, status="running", stage="running", started=time.time())
+
+        def progress(stage: str, fraction: float):
+            self._update(job.id, stage=stage, progress=fraction)
+
+        try:
+            result = self.runner(job.polygon_coords, progress)
+            self._update(job.id, status="succeeded", stage="done", progress=1.0,
+                         result=json.dumps(result), finished=time.time())
+            outcome = "succeeded"
+        except Exception as e:
+            print(f"Job {job.id} failed: {e}")
+            self._update(job.id, status="failed", error=str(e), finished=time.time())
+            outcome = "failed"
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def get(self, job_id: str):
+        with self._lock:
+            try:
+                row = self._connect().execute(
+                    f"SELECT {', '.join(Job.COLUMNS)} FROM calculate_jobs WHERE id = ?", (job_id,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"Job {job_id} read failed: {e}")
+                return None
+        return Job.from_row(row) if row is not None else None
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            pending, retained = self._connect().execute(
+                "SELECT COALESCE(SUM(finished IS NULL), 0), COUNT(*) FROM calculate_jobs"
+            ).fetchone()
+            return {**self.stats, "pending": pending, "retained": retained}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,29 +1,54 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from fastapi.concurrency import run_in_threadpool
-import ee, requests
-from gee_tools import (
-    get_satellite_image_url,
-    get_climatology_data,
-    get_soil_data,
-    get_ndvi_mean
-)
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import os
+from datetime import date
+from typing import Literal
+from gee_tools import extract_features, imagery_is_current, reduction_summary, DATASETS
+from geometry import clean_polygon, geodesic_area_m2, InvalidPolygonError, MAX_INPUT_VERTICES
+from feature_cache import feature_cache, polygon_cache_key
 
 from auth import initialize_ee
-from ai_model.ai_model import chat_with_bot
-import pickle
-import joblib
-from datetime import datetime
-import numpy as np
+from http_client import http_client
+from hedging import latency_summary
+import metrics
+from metrics import stage, GaugeCallback, POLYGONS
+from ai_model.ai_model import chat_with_bot, stream_chat_with_bot, get_client
+from ai_model.retrieval import get_index
+from ai_model.answer_cache import answer_cache
+from model_service import crop_model, UnknownStateError
+from state_resolver import state_resolver, normalize_state_name
+from raster_grid import raster_grid
+from jobs import JobManager, QueueFullError
+from readiness import readiness
+from thumbnail_store import KEY_PATTERN, thumbnail_store
+from ndvi_series import ndvi_series_store
+from regional import MAX_TILE_ZOOM, suitability_map
+from planting_window import (
+    cell_of, planting_window_for_points, rainfall_series_store, TooManyUncachedCellsError, UnknownCropError,
+    MAX_UNCACHED_CELLS,
+    get_stats as planting_window_stats,
+)
+from ee_scheduler import ee_scheduler, SchedulerBusyError
 
 # --- Schemas ---
+ADVICE_QUESTION = (
+    "Provide smart, actionable farming advice for this field, focusing on optimal crop choice "
+    "and immediate steps for soil and water management."
+)
+
 class PolygonRequest(BaseModel):
-    polygon: list[list[float]] = Field(..., description="List of [lat, lon] polygon vertices.")
+    polygon: list[list[float]] = Field(..., max_length=MAX_INPUT_VERTICES, description="List of [lat, lon] polygon vertices.")
 
 class MessageInput(BaseModel):
     message: str
     info: dict
+    session_id: str | None = Field(None, max_length=128, description="Farmer/session id; omit for a one-off question.")
 
 class ModelFeatures(BaseModel):
     state: str
@@ -37,7 +62,65 @@ class ModelFeatures(BaseModel):
     farm_size_ha: float
     irrigated_area_ha: float
 
-app = FastAPI(title="Agri-Geospatial Backend")
+class StateLookupRequest(BaseModel):
+    points: list[tuple[float, float]] = Field(..., max_length=100_000, description="List of [lat, lon] points.")
+
+class NdviSeriesRequest(BaseModel):
+    polygon: list[list[float]] = Field(..., max_length=MAX_INPUT_VERTICES, description="List of [lat, lon] polygon vertices.")
+    step: Literal["month", "dekad"] = "month"
+    start: date | None = Field(None, description="First day to cover (default: 12 months before `end`).")
+    end: date | None = Field(None, description="Last day to cover (default: today).")
+
+class PlantingWindowRequest(BaseModel):
+    polygon: list[list[float]] = Field(..., max_length=MAX_INPUT_VERTICES, description="List of [lat, lon] polygon vertices.")
+    crop: str | None = Field(None, description="Crop to plan for; a generic 90-day crop if omitted.")
+
+class PlantingWindowBatchRequest(BaseModel):
+    points: list[list[float]] = Field(..., max_length=10_000, description="List of [lat, lon] farm locations.")
+    crop: str | None = None
+
+class BatchPredictRequest(BaseModel):
+    rows: list[ModelFeatures] = Field(..., max_length=10_000)
+    top_k: int = Field(3, ge=1, le=10)
+
+class AnalyzeRequest(BaseModel):
+    polygon: list[list[float]] = Field(..., max_length=MAX_INPUT_VERTICES, description="List of [lat, lon] polygon vertices.")
+    state: str | None = Field(None, description="Farmer's state; resolved from the polygon if omitted.")
+    fertilizer_rate_kg_per_ha: float = 50.0
+    pesticide_rate_l_per_ha: float = 2.0
+    farm_size_ha: float | None = Field(None, description="Defaults to the polygon's area.")
+    irrigated_area_ha: float = 0.5
+    advice: bool = Field(True, description="Also stream the AI advisor's answer.")
+    message: str = ADVICE_QUESTION
+    session_id: str | None = Field(None, max_length=128)
+
+# --- Startup ---
+# Nothing expensive happens at import: these are preloaded in parallel once the
+# server starts, and anything that needs one first calls readiness.ensure().
+readiness.register("earth_engine", initialize_ee, required=True)
+readiness.register("crop_model", crop_model.load, required=True)
+readiness.register("state_boundaries", lambda: state_resolver.available, required=True)
+readiness.register("raster_grid", lambda: bool(raster_grid.meta["layers"]))
+readiness.register("suitability_map", lambda: suitability_map.available)
+readiness.register("retrieval_index", lambda: get_index() is not None)
+readiness.register("gemini", lambda: get_client() is not None)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # State lookup is offline only: refuse to start rather than serve "Unknown" states
+    if not os.path.exists(state_resolver.path):
+        raise RuntimeError(
+            f"State boundaries missing at {state_resolver.path}; build them with `python state_resolver.py build`."
+        )
+    if os.getenv("STARTUP_PRELOAD", "1") == "1":
+        readiness.preload()
+    yield
+    job_manager.shutdown()
+    http_client.close()
+
+
+app = FastAPI(title="Agri-Geospatial Backend", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -46,29 +129,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-try:
-    initialize_ee()
-    print("🌍 Google Earth Engine initialized successfully.")
-except Exception as e:
-    print(f"EE Initialization failed: {e}")
-
 def get_state_from_coords(lat, lon):
-    """Reverse-geocode coordinates to get the state name."""
-    try:
-        url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={lat}&lon={lon}&zoom=5&addressdetails=1"
-        r = requests.get(url, timeout=10).json()
-        address = r.get("address", {})
-        state = address.get("state") or address.get("region") or "Unknown"
-        return state
-    except Exception as e:
-        print(f"Reverse geocoding failed: {e}")
-        return "Unknown"
+    """Resolve coordinates to a state name from the bundled boundaries."""
+    readiness.ensure("state_boundaries")
+    with stage("state"):
+        return state_resolver.resolve(lat, lon)
     
 # --- Fallback APIs ---
 def fetch_backup_weather_data(lat, lon):
     try:
         url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&daily=temperature_2m_mean,precipitation_sum&timezone=Africa%2FLagos"
-        r = requests.get(url, timeout=10).json()
+        r = http_client.get_json_sync(url, timeout=10)
         return {
             "avg_temp_c": r["daily"]["temperature_2m_mean"][0],
             "rainfall_total_mm": r["daily"]["precipitation_sum"][0]
@@ -79,7 +150,7 @@ def fetch_backup_weather_data(lat, lon):
 def fetch_backup_soil_data(lat, lon):
     try:
         url = f"https://rest.isric.org/soilgrids/v2.0/properties/query?lon={lon}&lat={lat}&property=phh2o&depth=15-30cm"
-        r = requests.get(url, timeout=10).json()
+        r = http_client.get_json_sync(url, timeout=10)
         ph = r["properties"]["layers"][0]["depths"][0]["values"]["mean"]
         return {"soil_pH": ph}
     except:
@@ -95,48 +166,134 @@ def fetch_backup_soil_carbon(lat, lon):
 
 
 # --- Main Endpoint ---
+async def validated_polygon(polygon_coords):
+    """The request polygon cleaned and simplified for Earth Engine (see geometry.py), or a 400."""
+    try:
+        cleaned, report = await run_in_threadpool(clean_polygon, polygon_coords)
+    except InvalidPolygonError as e:
+        POLYGONS.inc(outcome="rejected")
+        raise HTTPException(status_code=400, detail=str(e))
+    if report["repair"]:
+        POLYGONS.inc(outcome=f"repaired_{report['repair']}")
+    elif report["vertices"] < report["input_vertices"]:
+        POLYGONS.inc(outcome="simplified")
+    else:
+        POLYGONS.inc(outcome="unchanged")
+    return cleaned
+
+
+def build_calculate_response(polygon_coords, progress=None):
+    """Full /calculate response body for a validated polygon (blocking; run off the event loop)."""
+    if not readiness.ensure("earth_engine"):
+        print("Earth Engine is not initialized; sources will fall back.")
+    lat, lon = polygon_coords[0]
+    data = process_geospatial_data(polygon_coords, lat, lon, progress)
+
+    return {
+        "status": "success",
+        "area_sq_m": geodesic_area_m2(polygon_coords),
+        "polygon_bounds": polygon_coords,
+        **data,
+    }
+
+
 @app.post("/calculate")
 async def calculate_geospatial_data(request: PolygonRequest):
-    polygon_coords = request.polygon
-    if len(polygon_coords) < 3:
-        raise HTTPException(status_code=400, detail="Polygon must have at least 3 coordinates.")
-
-    ee_polygon = ee.Geometry.Polygon([[lon, lat] for lat, lon in polygon_coords])
-    lat, lon = polygon_coords[0]
+    polygon_coords = await validated_polygon(request.polygon)
 
     try:
         # Run GEE operations in thread
-        data = await run_in_threadpool(lambda: process_geospatial_data(ee_polygon, polygon_coords, lat, lon))
-
-        area_sq_m = ee_polygon.area().getInfo()
-
-        return {
-            "status": "success",
-            "area_sq_m": area_sq_m,
-            "polygon_bounds": polygon_coords,
-            **data  
-        }
+        return await run_in_threadpool(lambda: build_calculate_response(polygon_coords))
 
     except Exception as e:
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail=f"Geospatial processing failed: {e}")
 
 
+# --- Calculate Jobs ---
+job_manager = JobManager(
+    lambda polygon_coords, progress: build_calculate_response(polygon_coords, progress),
+    max_workers=int(os.getenv("CALCULATE_JOB_WORKERS", "4")),
+    max_pending=int(os.getenv("CALCULATE_JOB_MAX_PENDING", "100")),
+)
+
+
+metrics.register(GaugeCallback(
+    "agro_feature_cache", "Feature cache counters and hit rate.", feature_cache.get_stats, label="stat"))
+metrics.register(GaugeCallback(
+    "agro_calculate_jobs", "Calculate job counters.", lambda: job_manager.get_stats(), label="stat"))
+metrics.register(GaugeCallback(
+    "agro_thumbnails", "Thumbnail store counters and size.", thumbnail_store.get_stats, label="stat"))
+metrics.register(GaugeCallback(
+    "agro_ndvi_series", "NDVI time series periods served from storage vs computed.",
+    ndvi_series_store.get_stats, label="stat"))
+metrics.register(GaugeCallback(
+    "agro_advisor_cache", "Advisor answers served from the cache vs Gemini, and hit rate.",
+    answer_cache.get_stats, label="stat"))
+metrics.register(GaugeCallback(
+    "agro_planting_windows", "Daily rainfall series cells fetched vs reused, and cached windows.",
+    planting_window_stats, label="stat"))
+metrics.register(GaugeCallback(
+    "agro_suitability_tiles", "Suitability map tiles served from memory vs rendered.",
+    suitability_map.get_stats, label="stat"))
+metrics.register(GaugeCallback(
+    "agro_ee_scheduler", "Earth Engine admission: shared tokens/slots and this worker's queue.",
+    ee_scheduler.get_stats, label="stat"))
+metrics.register(GaugeCallback(
+    "agro_startup", "Startup timings (s) and process memory (bytes).", readiness.metrics, label="stat"))
+
+
+@app.post("/jobs/calculate", status_code=202)
+async def submit_calculate_job(request: PolygonRequest):
+    """Queue a /calculate computation; identical in-flight polygons share one job."""
+    polygon_coords = await validated_polygon(request.polygon)
+    try:
+        # The job store may wait on another worker's SQLite write lock: keep it off the event loop
+        job = await run_in_threadpool(job_manager.submit, polygon_coords)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=f"Too many pending calculations: {e}")
+    return job.to_dict()
+
+
+@app.get("/jobs/{job_id}")
+async def get_calculate_job(job_id: str):
+    job = await run_in_threadpool(job_manager.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired.")
+    return job.to_dict()
+
+
 # --- Core GEE Processing Logic ---
-def process_geospatial_data(ee_polygon, polygon_coords, lat, lon):
+def process_geospatial_data(polygon_coords, lat, lon, progress=None):
     """Fetch all GEE data + guaranteed fallbacks."""
+    progress = progress or (lambda stage, fraction: None)
     try:
-        # GEE data
-        image_url = get_satellite_image_url(polygon_coords)
-        climatology = get_climatology_data(polygon_coords, lat, lon)
-        soil_data = get_soil_data(polygon_coords, lat, lon)
-        ndvi = get_ndvi_mean(polygon_coords)
-
-        # DEBUG: Print the raw GEE data to see what was actually returned
-        print(f"DEBUG: Climatology: {climatology}")
-        print(f"DEBUG: Soil Data: {soil_data}")
-        print(f"DEBUG: NDVI: {ndvi}")
-        
+        # Cached datasets first; the rest in one batched GEE evaluation (+ thumbnail URL)
+        progress("cache", 0.05)
+        cache_key = polygon_cache_key(polygon_coords)
+        with stage("cache"):
+            features = feature_cache.get_many(cache_key, DATASETS)
+            # Re-render imagery whose thumbnail was evicted from the store
+            if "imagery" in features and not imagery_is_current(features["imagery"]):
+                del features["imagery"]
+        missing = [d for d in DATASETS if d not in features]
+        if missing:
+            progress("earth_engine", 0.1)
+            fresh = extract_features(polygon_coords, lat, lon, datasets=missing)
+            feature_cache.put_many(cache_key, {
+                d: fresh[d] for d in missing if d not in fresh["fallbacks"]
+            })
+            features.update({d: fresh[d] for d in missing})
+            stale = fresh["stale"]
+            fallbacks = fresh["fallbacks"]
+        else:
+            stale = fallbacks = []
+
+        image_url = features["imagery"]
+        climatology = features["climatology"]
+        soil_data = features["soil"]
+        ndvi = features["ndvi"]
+
 
         # Extract values
         soil_pH = soil_data.get("soil_pH", None)
@@ -145,18 +302,22 @@ def process_geospatial_data(ee_polygon, polygon_coords, lat, lon):
         rainfall = climatology.get("rainfall_total_mm", None)
 
         # Fallback handling for missing/NA values
+        progress("fallbacks", 0.9)
         if not climatology or avg_temp is None or rainfall is None:
             climatology = fetch_backup_weather_data(lat, lon)
             avg_temp = climatology["avg_temp_c"]
             rainfall = climatology["rainfall_total_mm"]
 
         if soil_pH is None or soil_carbon is None:
-            soil_backup = fetch_backup_soil_data(lat, lon)
-            soil_pH = soil_backup.get("soil_pH", 6.5)
-            soil_carbon = soil_backup.get("soil_org_carbon_pct", 1.2)
+            soil_data = fetch_backup_soil_data(lat, lon)
+            soil_pH = soil_data.get("soil_pH", 6.5)
+            soil_carbon = soil_data.get("soil_org_carbon_pct", 1.2)
 
+        # Only Earth Engine NDVI is cached, so a cached value is a reduction too
+        ndvi_source = "default" if "ndvi" in fallbacks else "GEE"
         if not ndvi or ndvi == "NA":
             ndvi = fetch_backup_ndvi(lat, lon)["ndvi_mean"]
+            ndvi_source = "backup"
 
         if not image_url or "Error" in image_url:
             image_url = "https://via.placeholder.com/400x300.png?text=No+Satellite+Image"
@@ -168,7 +329,16 @@ def process_geospatial_data(ee_polygon, polygon_coords, lat, lon):
             "soil_pH": soil_pH,
             "ndvi_mean": ndvi,
             "soil_org_carbon_pct": soil_carbon,
-    
+            # Sources that missed their deadline and carry default values
+            "stale": stale,
+            # Metres per pixel behind each value: the Earth Engine reduction scale
+            # (coarser only for very large polygons), the local grid cell, or None
+            # for point backups and defaults
+            "effective_resolution_m": reduction_summary(polygon_coords, {
+                "soil": soil_data.get("source"),
+                "climatology": climatology.get("source"),
+                "ndvi": ndvi_source,
+            }),
         }
 
     except Exception as e:
@@ -176,57 +346,374 @@ def process_geospatial_data(ee_polygon, polygon_coords, lat, lon):
 
 
 
+@app.post("/ndvi/timeseries")
+async def ndvi_timeseries(request: NdviSeriesRequest):
+    """Mean NDVI per month or dekad; only periods not stored yet are sent to Earth Engine."""
+    polygon_coords = await validated_polygon(request.polygon)
+    if request.start and request.end and request.start > request.end:
+        raise HTTPException(status_code=400, detail="`start` must not be after `end`.")
+
+    def run():
+        readiness.ensure("earth_engine")
+        return ndvi_series_store.series(polygon_coords, request.step, request.start, request.end)
+
+    try:
+        return {"status": "success", **await run_in_threadpool(run)}
+    except Exception as e:
+        print(f"NDVI time series failed: {e}")
+        raise HTTPException(status_code=500, detail=f"NDVI time series failed: {e}")
+
+
+def compute_planting_windows(points: list, crop: str | None, batch: bool = False) -> list:
+    readiness.ensure("earth_engine")
+    if batch:
+        # Batch requests must not drain the Earth Engine budget farm requests rely on
+        return planting_window_for_points(points, crop, priority="batch", max_uncached=MAX_UNCACHED_CELLS)
+    return planting_window_for_points(points, crop)
+
+
+@app.post("/planting-window")
+async def planting_window(request: PlantingWindowRequest):
+    """Rain-fed planting window for a farm from its cell's daily rainfall record."""
+    polygon_coords = await validated_polygon(request.polygon)
+    lat = sum(p[0] for p in polygon_coords) / len(polygon_coords)
+    lon = sum(p[1] for p in polygon_coords) / len(polygon_coords)
+    try:
+        result = (await run_in_threadpool(compute_planting_windows, [[lat, lon]], request.crop))[0]
+    except UnknownCropError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Planting window failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Planting window failed: {e}")
+    return {"status": "success", **result}
+
+
+@app.post("/planting-window/batch")
+async def planting_window_batch(request: PlantingWindowBatchRequest):
+    """
+    Planting windows for many farms. Farms in the same rainfall cell share one
+    result, so each window is listed once and `index[i]` points at point i's.
+    Rainfall series not stored yet are fetched at batch priority, at most
+    MAX_UNCACHED_CELLS per request (429 beyond that: split and retry).
+    """
+    if not all(len(p) == 2 and -90 <= p[0] <= 90 and -180 <= p[1] <= 180 for p in request.points):
+        raise HTTPException(status_code=400, detail="Points must be [lat, lon] in degrees.")
+    try:
+        results = await run_in_threadpool(compute_planting_windows, request.points, request.crop, True)
+    except UnknownCropError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (TooManyUncachedCellsError, SchedulerBusyError) as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        print(f"Planting windows failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Planting windows failed: {e}")
+    positions = {}
+    index = [positions.setdefault(id(result), len(positions)) for result in results]
+    windows = list({id(result): result for result in results}.values())
+    return {"status": "success", "windows": windows, "index": index}
+
+
+@app.post("/state/resolve")
+async def resolve_states(request: StateLookupRequest):
+    if not state_resolver.available:
+        raise HTTPException(status_code=503, detail="State boundaries are not bundled on this server.")
+    states = await run_in_threadpool(lambda: state_resolver.resolve_many(request.points))
+    return {"status": "success", "states": states}
+
+
+# --- Imagery ---
+# Keys are content hashes of everything that shapes the image, so a URL's
+# bytes never change and browsers/CDNs can keep them for a year.
+IMAGERY_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@app.get("/imagery/{key}.png")
+async def get_imagery(key: str, request: Request):
+    if not KEY_PATTERN.match(key):
+        raise HTTPException(status_code=404, detail="Image not found.")
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": IMAGERY_CACHE_CONTROL}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    path = await run_in_threadpool(thumbnail_store.open, key)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Image not found or evicted; recalculate the farm.")
+    return FileResponse(path, media_type="image/png", headers=headers)
+
+
+# --- Regional suitability map (precomputed by regional.py) ---
+@app.get("/suitability")
+async def suitability_layers():
+    """Tile layers, legend and bounds of the precomputed crop-suitability map."""
+    if not suitability_map.available:
+        raise HTTPException(status_code=404, detail="The regional suitability map has not been built on this server.")
+    return suitability_map.describe()
+
+
+@app.get("/suitability/tiles/{layer}/{z}/{x}/{y}.png")
+async def suitability_tile(layer: str, z: int, x: int, y: int, request: Request):
+    if not suitability_map.available or layer not in suitability_map.layers:
+        raise HTTPException(status_code=404, detail="Unknown suitability layer.")
+    if not (0 <= z <= MAX_TILE_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Tile out of range.")
+    # Tiles only change when the map is rebuilt
+    built = suitability_map.meta["built"]
+    etag = f'"{built}/{layer}/{z}/{x}/{y}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    png = await run_in_threadpool(suitability_map.tile, layer, z, x, y)
+    return Response(png, media_type="image/png", headers=headers)
+
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness per subsystem; 503 until every required one has loaded."""
+    snapshot = readiness.snapshot()
+    status_code = 200 if snapshot["status"] == "ready" else 503
+    return JSONResponse(snapshot, status_code=status_code)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {**feature_cache.get_stats(), "thumbnails": thumbnail_store.get_stats(), "advisor": answer_cache.get_stats()}
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/providers/status")
+async def provider_status():
+    """Circuit breaker state per fallback host, latency per provider and Earth Engine admission."""
+    return {
+        "breakers": http_client.breaker_states(),
+        "latency": latency_summary(),
+        "earth_engine": ee_scheduler.get_stats(),
+    }
+
+
 # --- Chatbot Endpoint ---
 @app.post("/chat")
-async def chatting_with_bot(payload: MessageInput):
-    return chat_with_bot(payload)
+async def chatting_with_bot(payload: MessageInput, request: Request):
+    """
+    JSON {"response": ...} by default; with `Accept: text/event-stream` the
+    answer streams as Server-Sent Events ("message" events carrying text
+    deltas, then one "done" event with the full response).
+    """
+    if "text/event-stream" not in request.headers.get("accept", ""):
+        return await chat_with_bot(payload)
+
+    async def events():
+        parts = []
+        async for text in stream_chat_with_bot(payload):
+            parts.append(text)
+            yield f"data: {json.dumps({'text': text})}\n\n"
+        yield f"event: done\ndata: {json.dumps({'response': ''.join(parts)})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# --- Fused analysis ---
+JOB_POLL_S = 0.25
+JOB_WAIT_TIMEOUT_S = float(os.getenv("ANALYZE_JOB_TIMEOUT_S", "300"))
+
+
+async def await_job(job_id: str, progress) -> dict:
+    """
+    A calculate job's result, calling progress(stage, fraction) as it moves.
+    Polled because the job may run in another worker; each read goes through
+    the threadpool so a busy job store never stalls the event loop.
+    """
+    deadline = asyncio.get_running_loop().time() + JOB_WAIT_TIMEOUT_S
+    last = None
+    while True:
+        job = await run_in_threadpool(job_manager.get, job_id)
+        if job is None:
+            raise RuntimeError("Calculation expired before it finished.")
+        if not job.done and (job.stage, job.progress) != last:
+            last = (job.stage, job.progress)
+            progress(job.stage, job.progress)
+        if job.done:
+            break
+        if asyncio.get_running_loop().time() > deadline:
+            raise TimeoutError(f"Calculation did not finish within {JOB_WAIT_TIMEOUT_S:.0f} s.")
+        await asyncio.sleep(JOB_POLL_S)
+    if job.status == "failed":
+        raise RuntimeError(job.error)
+    return job.result
+
+
+async def run_analysis(request: AnalyzeRequest, polygon_coords: list, job_id: str, emit):
+    """
+    geometry -> features (the calculate job, + state and rainfall history
+    concurrently) -> prediction -> planting window -> advice,
+    calling emit(stage, data) as each stage completes.
+    """
+    area_sq_m = geodesic_area_m2(polygon_coords)
+    emit("geometry", {"polygon": polygon_coords, "area_sq_m": area_sq_m})
+
+    def progress(name, fraction):
+        emit("progress", {"stage": name, "fraction": fraction})
+
+    # The state lookup is local and finishes long before the Earth Engine work
+    features_task = asyncio.create_task(await_job(job_id, progress))
+    lat = sum(p[0] for p in polygon_coords) / len(polygon_coords)
+    lon = sum(p[1] for p in polygon_coords) / len(polygon_coords)
+    # Warm the cell's daily rainfall series while the features are computed
+    rainfall_task = asyncio.create_task(run_in_threadpool(rainfall_series_store.get, cell_of(lat, lon)))
+    try:
+        if request.state:
+            state = normalize_state_name(request.state)
+        else:
+            state = await run_in_threadpool(get_state_from_coords, lat, lon)
+        emit("state", {"state": state})
+
+        features = await features_task
+        emit("features", features)
+
+        row = ModelFeatures(
+            state=state,
+            rainfall_total_mm=features["rainfall_total_mm"],
+            avg_temp_c=features["avg_temp_c"],
+            ndvi_mean=features["ndvi_mean"],
+            soil_ph=features["soil_pH"],
+            soil_org_carbon_pct=features["soil_org_carbon_pct"],
+            fertilizer_rate_kg_per_ha=request.fertilizer_rate_kg_per_ha,
+            pesticide_rate_l_per_ha=request.pesticide_rate_l_per_ha,
+            farm_size_ha=request.farm_size_ha if request.farm_size_ha is not None else area_sq_m / 10_000,
+            irrigated_area_ha=request.irrigated_area_ha,
+        )
+        try:
+            with stage("predict"):
+                top_crops = (await run_in_threadpool(crop_model.predict_top_k, [row], 3))[0]
+            prediction = {"predicted_crop": top_crops[0]["crop"], "top_crops": top_crops}
+        except UnknownStateError as e:
+            prediction = {"predicted_crop": None, "top_crops": [], "error": str(e)}
+        emit("prediction", prediction)
+
+        try:
+            await rainfall_task
+            with stage("planting_window"):
+                windows = await run_in_threadpool(compute_planting_windows, [[lat, lon]], prediction["predicted_crop"])
+            window = windows[0]
+        except Exception as e:
+            print(f"Planting window failed: {e}")
+            window = {"planting_window": None, "error": str(e)}
+        emit("planting_window", window)
+
+        result = {**features, "state": state, **prediction, "planting_window": window}
+        if request.advice:
+            info = {
+                **features, "state": state, "predicted_crop": prediction["predicted_crop"], "planting_window": window,
+            }
+            parts = []
+            chat = MessageInput(message=request.message, info=info, session_id=request.session_id)
+            async for text in stream_chat_with_bot(chat):
+                parts.append(text)
+                emit("advice", {"text": text})
+            result["advice"] = "".join(parts)
+        emit("done", result)
+    finally:
+        # Also on errors and client disconnects: nothing is left running unawaited
+        for task in (features_task, rainfall_task):
+            task.cancel()
+        await asyncio.gather(features_task, rainfall_task, return_exceptions=True)
+
+@app.post("/analyze")
+async def analyze(payload: AnalyzeRequest, request: Request):
+    """
+    The whole Dashboard flow (/calculate, /predict, /chat) in one request.
+    Stage results stream out as they complete: NDJSON lines
+    {"stage": ..., "data": ...} by default, or Server-Sent Events (one event
+    per stage) with `Accept: text/event-stream`. The last stage is "done"
+    (with every result merged) or "error".
+    """
+    polygon_coords = await validated_polygon(payload.polygon)
+    # Features come from the calculate job queue, so double taps share one
+    # computation and Earth Engine work stays within the job pool
+    try:
+        job = await run_in_threadpool(job_manager.submit, polygon_coords)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=f"Too many pending calculations: {e}")
+    sse = "text/event-stream" in request.headers.get("accept", "")
+
+    def encode(name, data):
+        if sse:
+            return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+        return json.dumps({"stage": name, "data": data}) + "\n"
+
+    async def events():
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def emit(name, data):
+            # Progress is reported from worker threads
+            loop.call_soon_threadsafe(queue.put_nowait, (name, data))
+
+        task = asyncio.create_task(run_analysis(payload, polygon_coords, job.id, emit))
+        task.add_done_callback(lambda _: emit(None, None))
+        try:
+            while True:
+                name, data = await queue.get()
+                if name is None:
+                    break
+                yield encode(name, data)
+            if not task.cancelled() and task.exception() is not None:
+                print(f"Analysis failed: {task.exception()}")
+                yield encode("error", {"detail": f"Analysis failed: {task.exception()}"})
+        finally:
+            # Client went away mid-stream
+            task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
-with open("model/north_crop_yield_model.pkl", 'rb') as f:
-    model = pickle.load(f)
 @app.post("/predict")
 async def predict_optimal_crop(payload: ModelFeatures):
-    encoders = joblib.load("model/encoders.pkl")
-
-    # Example usage
-    encoded_state = encoders['state'].transform([payload.state])
-    encoded_state_scalar = encoded_state[0]
     try:
-        features = [[
-            encoded_state_scalar,
-            datetime.now().year,
-            payload.rainfall_total_mm,
-            payload.avg_temp_c,
-            payload.ndvi_mean,
-            payload.soil_ph,
-            payload.soil_org_carbon_pct,
-            payload.fertilizer_rate_kg_per_ha,
-            payload.pesticide_rate_l_per_ha,
-            payload.farm_size_ha,
-            payload.irrigated_area_ha
-        ]]
-
-        prediction = model.predict(features)[0]
-        print(prediction)
-        label_map = {
-            'Cassava': np.int64(0),
-            'Cotton': np.int64(1),
-            'Guna melon': np.int64(2),
-            'Maize': np.int64(3),
-            'Okra': np.int64(4),
-            'Rice': np.int64(5),
-            'Soybeans': np.int64(6),
-            'Sweet potato': np.int64(7),
-            'Wheat': np.int64(8),
-            'Yam': np.int64(9)
-        }
-        reverse_map = {v: k for k, v in label_map.items()}
-        crop_name = reverse_map[prediction]
-
-
+        with stage("predict"):
+            crop_name = crop_model.predict([payload])[0]
         return {"status": "success", "predicted_crop": str(crop_name)}
 
+    except UnknownStateError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         import traceback
         traceback.print_exc()  # print the full stack trace
         raise HTTPException(status_code=500, detail=f"Prediction failed: {e}")
 
+
+@app.post("/predict/batch")
+async def predict_optimal_crops(payload: BatchPredictRequest):
+    """Score many farms (e.g. a whole village) in one vectorized model call."""
+    try:
+        with stage("predict_batch"):
+            top_crops = await run_in_threadpool(lambda: crop_model.predict_top_k(payload.rows, payload.top_k))
+        return {
+            "status": "success",
+            "predictions": [
+                {"predicted_crop": crops[0]["crop"], "top_crops": crops} for crops in top_crops
+            ],
+        }
+
+    except UnknownStateError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Batch prediction failed: {e}")
@@ -0,0 +1,152 @@
+"""
+Minimal Prometheus metrics + optional OpenTelemetry spans.
+
+    with stage("soil"):
+        ...                                  # -> agro_stage_duration_seconds{stage="soil"}
+    GETINFO_CALLS.inc(call="batch")          # -> agro_ee_getinfo_total{call="batch"}
+
+`render()` produces the Prometheus text format served on /metrics. Values are
+per process; with several uvicorn workers each scrape sees one worker.
+If `opentelemetry` is installed, every stage is also recorded as a span.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    from opentelemetry import trace
+    _tracer = trace.get_tracer("agro-karfi")
+except ImportError:
+    _tracer = None
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = [*key, *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            values = dict(self._values)
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"] + [
+            f"{self.name}{_format_labels(key)} {value}" for key, value in sorted(values.items())
+        ]
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., +Inf count], sum
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._series[key] = (counts, total + value)
+
+    def render(self) -> list:
+        with self._lock:
+            series = {k: (list(c), s) for k, (c, s) in self._series.items()}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class GaugeCallback:
+    """Gauges read at scrape time; callback returns {label value: number} (or {name: number} without a label)."""
+
+    def __init__(self, name: str, help_text: str, callback, label: str = None):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+        self.label = label
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.callback()
+        except Exception as e:
+            print(f"Metrics callback {self.name} failed: {e}")
+            return lines
+        for key, value in values.items():
+            if value is None:
+                continue
+            labels = _format_labels(((self.label, key),)) if self.label else ""
+            lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+
+_registry = []
+
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+
+# --- Pipeline metrics ---
+STAGE_SECONDS = register(Histogram("agro_stage_duration_seconds", "Time spent per pipeline stage."))
+STAGE_ERRORS = register(Counter("agro_stage_errors_total", "Stages that raised."))
+GETINFO_CALLS = register(Counter("agro_ee_getinfo_total", "Blocking Earth Engine round trips (getInfo/getThumbURL)."))
+FALLBACKS = register(Counter("agro_fallback_total", "Values served by a fallback provider or default."))
+HEDGES = register(Counter("agro_hedge_total", "Hedged soil/climatology lookups by winner."))
+STALE = register(Counter("agro_stale_total", "Sources that missed their deadline."))
+HTTP_REQUESTS = register(Counter("agro_http_requests_total", "Fallback provider HTTP requests by host and outcome."))
+POLYGONS = register(Counter("agro_polygons_total", "Submitted polygons by cleaning outcome."))
+EE_QUEUE_SECONDS = register(Histogram("agro_ee_queue_seconds", "Time Earth Engine calls waited for admission."))
+EE_REJECTED = register(Counter("agro_ee_rejected_total", "Earth Engine calls shed by the scheduler."))
+ADVISOR_CACHE = register(Counter("agro_advisor_cache_total", "Advisor answer cache lookups by result."))
+
+
+@contextmanager
+def stage(name: str, **attributes):
+    """Time a pipeline stage (and trace it when OpenTelemetry is available)."""
+    span = _tracer.start_as_current_span(f"stage.{name}", attributes=attributes) if _tracer else nullcontext()
+    start = time.perf_counter()
+    try:
+        with span:
+            yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
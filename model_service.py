@@ -0,0 +1,122 @@
+import pickle
+import threading
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+MODEL_PATH = "model/north_crop_yield_model.pkl"
+ENCODERS_PATH = "model/encoders.pkl"
+
+# Class index -> crop name, as fitted by encoders['best_crop'] (alphabetical)
+CROP_LABELS = (
+    "Cassava", "Cotton", "Guna melon", "Maize", "Okra",
+    "Rice", "Soybeans", "Sweet potato", "Wheat", "Yam",
+)
+
+# Numeric model inputs, in training order after (state, year)
+NUMERIC_FEATURES = (
+    "rainfall_total_mm",
+    "avg_temp_c",
+    "ndvi_mean",
+    "soil_ph",
+    "soil_org_carbon_pct",
+    "fertilizer_rate_kg_per_ha",
+    "pesticide_rate_l_per_ha",
+    "farm_size_ha",
+    "irrigated_area_ha",
+)
+
+
+class UnknownStateError(ValueError):
+    """Raised when a row's state was not seen by the state encoder."""
+
+
+class CropModelService:
+    """
+    Crop model + encoders loaded once per process.
+
+    Rows are encoded straight into one float64 matrix, and class indices are
+    decoded through a precomputed label array, so a batch of thousands of
+    farms is a single predict/predict_proba call.
+    """
+
+    def __init__(self, model_path: str = MODEL_PATH, encoders_path: str = ENCODERS_PATH):
+        self.model_path = model_path
+        self.encoders_path = encoders_path
+        self._lock = threading.Lock()
+        self.model = None
+        self.state_codes = None
+        self.labels = None
+
+    def load(self):
+        with self._lock:
+            if self.model is not None:
+                return self
+            with open(self.model_path, "rb") as f:
+                model = pickle.load(f)
+            encoders = joblib.load(self.encoders_path)
+
+            self.state_codes = {
+                state: code for code, state in enumerate(encoders["state"].classes_)
+            }
+            self.labels = np.array(CROP_LABELS, dtype=object)
+            self.model = model
+        return self
+
+    @property
+    def loaded(self) -> bool:
+        return self.model is not None
+
+    def encode(self, rows) -> np.ndarray:
+        """Rows with ModelFeatures attributes -> (n, 11) feature matrix."""
+        return self.encode_columns(
+            [row.state for row in rows],
+            {name: [getattr(row, name) for row in rows] for name in NUMERIC_FEATURES},
+        )
+
+    def encode_columns(self, states, columns: dict) -> np.ndarray:
+        """Column-wise inputs (a state per row, {feature: array}) -> (n, 11) feature matrix."""
+        self.load()
+        unknown = sorted({state for state in set(states) if state not in self.state_codes})
+        if unknown:
+            raise UnknownStateError(f"Unknown state(s): {', '.join(unknown)}")
+
+        features = np.empty((len(states), 2 + len(NUMERIC_FEATURES)), dtype=np.float64)
+        features[:, 0] = [self.state_codes[state] for state in states]
+        features[:, 1] = datetime.now().year
+        for i, name in enumerate(NUMERIC_FEATURES):
+            features[:, 2 + i] = columns[name]
+        return features
+
+    def predict(self, rows) -> list:
+        """Best crop name per row."""
+        features = self.encode(rows)
+        return self.labels[np.asarray(self.model.predict(features), dtype=np.int64)].tolist()
+
+    def predict_proba(self, features: np.ndarray):
+        """(probabilities (n, classes), crop name per column) for an encoded matrix."""
+        self.load()
+        proba = np.asarray(self.model.predict_proba(features))
+        class_labels = self.labels[np.asarray(getattr(self.model, "classes_", np.arange(proba.shape[1])), dtype=np.int64)]
+        return proba, class_labels
+
+    def predict_top_k(self, rows, k: int = 3) -> list:
+        """Top-k crops with probabilities per row, from one predict_proba call."""
+        proba, class_labels = self.predict_proba(self.encode(rows))
+
+        k = max(1, min(k, proba.shape[1]))
+        top = np.argpartition(-proba, k - 1, axis=1)[:, :k]
+        top_proba = np.take_along_axis(proba, top, axis=1)
+        order = np.argsort(-top_proba, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_proba = np.take_along_axis(top_proba, order, axis=1)
+
+        names = class_labels[top]
+        return [
+            [{"crop": name, "probability": round(float(p), 4)} for name, p in zip(row_names, row_proba)]
+            for row_names, row_proba in zip(names, top_proba)
+        ]
+
+
+crop_model = CropModelService()
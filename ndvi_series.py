@@ -0,0 +1,211 @@
+"""
+Per-period NDVI time series for a polygon (monthly or 10-day "dekads").
+
+All periods in a date range come from one server-side evaluation: each clear
+Sentinel-2 scene over the farm is reduced to its mean NDVI and tagged with
+its period index, and a grouped reducer averages the scenes per period.
+
+Computed periods are stored per polygon in SQLite. A period is final once its
+end is SETTLE_DAYS in the past (late scenes have been ingested by then), so a
+refresh only sends the periods that are missing or were still open when last
+computed, typically just the current month.
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import ee
+from dotenv import load_dotenv
+
+from feature_cache import polygon_cache_key
+from gee_tools import get_info, to_ee_polygon
+from metrics import stage
+
+load_dotenv()
+
+NDVI_SERIES_PATH = os.getenv("NDVI_SERIES_PATH", "cache/ndvi_series.sqlite3")
+STEPS = ("month", "dekad")
+SETTLE_DAYS = 5
+SERIES_COLLECTION = "COPERNICUS/S2_SR_HARMONIZED"
+SERIES_MAX_CLOUD = 60  # scene-level filter; clouds over the farm are masked per pixel
+SERIES_SCALE = 20
+# Sentinel-2 scene classification: cloud shadow, medium/high cloud, cirrus, snow
+CLOUDY_SCL_CLASSES = (3, 8, 9, 10, 11)
+
+
+# --- Periods ---
+def _next_month(day: date) -> date:
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def periods(start: date, end: date, step: str) -> list:
+    """[(period_start, period_end), ...] covering start..end; end is exclusive."""
+    if step not in STEPS:
+        raise ValueError(f"Unknown step '{step}' (expected one of {', '.join(STEPS)})")
+    result = []
+    if step == "month":
+        current = date(start.year, start.month, 1)
+        while current <= end:
+            result.append((current, _next_month(current)))
+            current = _next_month(current)
+        return result
+
+    # Dekads start on the 1st, 11th and 21st; the third runs to month end
+    current = date(start.year, start.month, 1 if start.day < 11 else 11 if start.day < 21 else 21)
+    while current <= end:
+        following = current.replace(day=current.day + 10) if current.day < 21 else _next_month(current)
+        result.append((current, following))
+        current = following
+    return result
+
+
+def _millis(day: date) -> int:
+    return int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+# --- Earth Engine ---
+def _series_reduction(ee_polygon, spans: list):
+    """One grouped reduction: mean NDVI and clear-scene count per period index."""
+    starts = ee.List([_millis(s) for s, _ in spans])
+
+    def per_scene(image):
+        clear = image.select("SCL").remap(list(CLOUDY_SCL_CLASSES), [0] * len(CLOUDY_SCL_CLASSES), 1)
+        ndvi = image.updateMask(clear).normalizedDifference(["B8", "B4"]).rename("NDVI")
+        mean = ndvi.reduceRegion(ee.Reducer.mean(), ee_polygon, SERIES_SCALE, bestEffort=True).get("NDVI")
+        period = starts.filter(ee.Filter.lte("item", image.date().millis())).size().subtract(1)
+        return ee.Feature(None, {"NDVI": mean, "period": period})
+
+    scenes = (
+        ee.ImageCollection(SERIES_COLLECTION)
+        .filterBounds(ee_polygon)
+        .filterDate(spans[0][0].isoformat(), spans[-1][1].isoformat())
+        .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", SERIES_MAX_CLOUD))
+        .map(per_scene)
+        .filter(ee.Filter.notNull(["NDVI"]))
+    )
+    return scenes.reduceColumns(
+        ee.Reducer.mean().combine(ee.Reducer.count(), sharedInputs=True).group(groupField=1, groupName="period"),
+        ["NDVI", "period"],
+    )
+
+
+def compute_periods(polygon_coords: list, spans: list) -> dict:
+    """{period_start: (ndvi or None, clear scene count)} for every span, in one getInfo()."""
+    with stage("ndvi_series"):
+        evaluated = get_info(_series_reduction(to_ee_polygon(polygon_coords), spans), "ndvi_series")
+    groups = {int(g["period"]): g for g in evaluated.get("groups", [])}
+    return {
+        start: (round(groups[i]["mean"], 3), int(groups[i]["count"])) if i in groups else (None, 0)
+        for i, (start, _) in enumerate(spans)
+    }
+
+
+# --- Storage ---
+class NdviSeriesStore:
+    def __init__(self, path: str = NDVI_SERIES_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        self.stats = {"stored_periods": 0, "computed_periods": 0, "queries": 0}
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS ndvi_series ("
+                " key TEXT NOT NULL, step TEXT NOT NULL, period_start TEXT NOT NULL,"
+                " ndvi REAL, scenes INTEGER NOT NULL, final INTEGER NOT NULL, computed REAL NOT NULL,"
+                " PRIMARY KEY (key, step, period_start))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def load(self, key: str, step: str, start: date, end: date) -> dict:
+        """{period_start: (ndvi, scenes, final)} stored for start..end."""
+        with self._lock:
+            try:
+                rows = self._connect().execute(
+                    "SELECT period_start, ndvi, scenes, final FROM ndvi_series"
+                    " WHERE key = ? AND step = ? AND period_start BETWEEN ? AND ?",
+                    (key, step, start.isoformat(), end.isoformat()),
+                ).fetchall()
+            except sqlite3.Error as e:
+                print(f"NDVI series read failed: {e}")
+                return {}
+        return {date.fromisoformat(s): (ndvi, scenes, bool(final)) for s, ndvi, scenes, final in rows}
+
+    def save(self, key: str, step: str, values: dict, finals: set):
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO ndvi_series (key, step, period_start, ndvi, scenes, final, computed)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(key, step, s.isoformat(), ndvi, scenes, int(s in finals), now)
+                     for s, (ndvi, scenes) in values.items()],
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"NDVI series write failed: {e}")
+
+    def series(self, polygon_coords: list, step: str = "month", start: date = None, end: date = None) -> dict:
+        """
+        NDVI per period from `start` (default: 12 months ago) to `end`
+        (default: today), computing only periods that aren't stored as final.
+        """
+        today = datetime.now(timezone.utc).date()
+        end = min(end or today, today)
+        start = start or date(end.year - 1, end.month, 1)
+        spans = periods(start, end, step)
+        if not spans:
+            return {"step": step, "series": [], "computed_periods": 0, "stored_periods": 0}
+
+        key = polygon_cache_key(polygon_coords)
+        stored = self.load(key, step, spans[0][0], spans[-1][0])
+        todo = [(s, e) for s, e in spans if s not in stored or not stored[s][2]]
+
+        computed = {}
+        if todo:
+            # Stored ranges only grow at either end, so one evaluation from the first to the
+            # last period needing work covers them (usually just the current period)
+            first = next(i for i, span in enumerate(spans) if span[0] == todo[0][0])
+            last = next(i for i, span in enumerate(spans) if span[0] == todo[-1][0])
+            computed = compute_periods(polygon_coords, spans[first:last + 1])
+            finals = {s for s, e in spans[first:last + 1] if e + timedelta(days=SETTLE_DAYS) <= today}
+            self.save(key, step, computed, finals)
+
+        with self._lock:
+            self.stats["queries"] += 1
+            self.stats["computed_periods"] += len(computed)
+            self.stats["stored_periods"] += len(spans) - len(computed)
+
+        series = []
+        for s, e in spans:
+            ndvi, scenes = computed[s] if s in computed else stored[s][:2]
+            series.append({
+                "start": s.isoformat(),
+                "end": e.isoformat(),
+                "ndvi": ndvi,
+                "scenes": scenes,
+                "final": e + timedelta(days=SETTLE_DAYS) <= today,
+            })
+        return {
+            "step": step,
+            "series": series,
+            "computed_periods": len(computed),
+            "stored_periods": len(spans) - len(computed),
+        }
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
+
+
+ndvi_series_store = NdviSeriesStore()
@@ -0,0 +1,418 @@
+"""
+Planting windows from decades of daily rainfall.
+
+The daily PERSIANN-CDR series (1983 to last year) for a 0.25 degree cell is
+fetched from Earth Engine once and stored as a compact uint16 array
+(years x 366 days, tenths of a mm) under RAINFALL_SERIES_DIR, so every farm in
+the cell reuses it. All season statistics are then plain numpy over
+(cells, years, days) arrays:
+
+- onset: first day from ONSET_EARLIEST with >= ONSET_RAIN_MM over 3 days and
+  no dry spell longer than 7 days in the following 30 (no false start);
+- cessation: first day from CESSATION_EARLIEST when a 100 mm soil water
+  bucket losing 5 mm/day runs dry; season length is cessation - onset;
+- dry-spell risk: a dry spell of DAMAGING_DRY_SPELL_DAYS or more within
+  30 days of planting;
+- success for planting on day d in a given year: the rains had started by d,
+  no damaging dry spell followed, and the season left enough rain-fed days
+  for the crop.
+
+The planting window is the run of days around the best day whose success
+rate across years is within WINDOW_TOLERANCE of the best; the best day's
+success rate is the window's confidence.
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+import ee
+import numpy as np
+from dotenv import load_dotenv
+
+from gee_tools import get_info
+
+load_dotenv()
+
+RAINFALL_SERIES_DIR = os.getenv("RAINFALL_SERIES_DIR", "cache/rainfall")
+DAILY_COLLECTION = "NOAA/PERSIANN-CDR"
+CELL_RES = 0.25  # PERSIANN-CDR pixel size (degrees)
+FIRST_YEAR = 1983
+FETCH_CHUNK_YEARS = 10  # one getRegion() per decade keeps each response small
+MAX_CACHED_CELLS = 1024  # ~30 KB each
+# Cells a batch request may send to Earth Engine (the rest must already be stored)
+MAX_UNCACHED_CELLS = int(os.getenv("PLANTING_WINDOW_MAX_UNCACHED_CELLS", "25"))
+NODATA = 65535
+DAYS = 366
+
+# Season rules (day-of-year indices, 0 = Jan 1)
+ONSET_EARLIEST = 90        # Apr 1
+ONSET_LATEST = 243         # Sep 1
+ONSET_RAIN_MM = 20.0
+FALSE_START_DRY_DAYS = 8   # "dry spell longer than 7 days"
+FOLLOW_UP_DAYS = 30
+DRY_DAY_MM = 1.0
+CESSATION_EARLIEST = 243   # Sep 1
+SOIL_CAPACITY_MM = 100.0
+EVAPOTRANSPIRATION_MM = 5.0
+DAMAGING_DRY_SPELL_DAYS = 10
+MIN_VALID_FRACTION = 0.9   # of Apr-Oct days, for a year to count
+WINDOW_TOLERANCE = 0.1
+
+# Rain-fed days each crop needs after planting. Cassava and yam only need the
+# rains for establishment and early bulking; wheat is an irrigated dry-season
+# crop in the north, so it has no rain-fed window.
+CROP_RAINFED_DAYS = {
+    "Cassava": 120,
+    "Cotton": 150,
+    "Guna melon": 90,
+    "Maize": 100,
+    "Okra": 60,
+    "Rice": 120,
+    "Soybeans": 100,
+    "Sweet potato": 120,
+    "Wheat": None,
+    "Yam": 150,
+}
+DEFAULT_RAINFED_DAYS = 90
+
+
+class UnknownCropError(ValueError):
+    """Raised for a crop without a known rain-fed season length."""
+
+
+class TooManyUncachedCellsError(RuntimeError):
+    """Raised when a request needs more new rainfall series than MAX_UNCACHED_CELLS."""
+
+
+def cell_of(lat: float, lon: float) -> tuple:
+    return int((lat + 90) // CELL_RES), int((lon + 180) // CELL_RES)
+
+
+def cell_centre(cell: tuple) -> tuple:
+    row, col = cell
+    return (row + 0.5) * CELL_RES - 90, (col + 0.5) * CELL_RES - 180
+
+
+def last_year() -> int:
+    return datetime.now(timezone.utc).year - 1
+
+
+# --- Fetching ---
+_chunk_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="rainfall")
+_cell_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rainfall-cells")
+
+
+def fetch_daily_rainfall(cell: tuple, first: int = FIRST_YEAR, last: int = None,
+                         priority: str = "interactive") -> np.ndarray:
+    """(years, 366) uint16 tenths of a mm for a cell, NODATA where the record has gaps."""
+    last = last or last_year()
+    lat, lon = cell_centre(cell)
+    point = ee.Geometry.Point([lon, lat])
+    series = np.full((last - first + 1, DAYS), NODATA, dtype=np.uint16)
+
+    def chunk(start):
+        collection = (
+            ee.ImageCollection(DAILY_COLLECTION)
+            .filterDate(f"{start}-01-01", f"{min(start + FETCH_CHUNK_YEARS, last + 1)}-01-01")
+            .select("precipitation")
+        )
+        return get_info(collection.getRegion(point, CELL_RES * 111_320), "daily_rainfall", priority)
+
+    chunks = list(_chunk_executor.map(chunk, range(first, last + 1, FETCH_CHUNK_YEARS)))
+
+    for rows in chunks:
+        header, rows = rows[0], rows[1:]
+        if not rows:
+            continue
+        time_i, precip_i = header.index("time"), header.index("precipitation")
+        times = np.array([row[time_i] for row in rows], dtype="datetime64[ms]")
+        values = np.array([np.nan if row[precip_i] is None else row[precip_i] for row in rows], dtype=np.float64)
+        years = times.astype("datetime64[Y]")
+        doy = (times.astype("datetime64[D]") - years).astype(np.int64)
+        year_i = years.astype(np.int64) + 1970 - first
+        ok = np.isfinite(values) & (values >= 0)
+        series[year_i[ok], doy[ok]] = np.minimum(np.round(values[ok] * 10), NODATA - 1).astype(np.uint16)
+    return series
+
+
+class RainfallSeriesStore:
+    """Per-cell daily rainfall arrays: in-process LRU in front of .npy files, fetched once per cell."""
+
+    def __init__(self, directory: str = RAINFALL_SERIES_DIR, max_cells: int = MAX_CACHED_CELLS):
+        self.directory = directory
+        self.max_cells = max_cells
+        self._arrays = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "fetched": 0}
+
+    def path(self, cell: tuple, first: int, last: int) -> str:
+        # The year range is part of the name, so a new year triggers one refetch
+        return os.path.join(self.directory, f"{cell[0]}_{cell[1]}_{first}-{last}.npy")
+
+    def cached(self, cell: tuple) -> bool:
+        """Whether the cell's series is in memory or on disk (no Earth Engine call needed)."""
+        last = last_year()
+        with self._lock:
+            if (cell, last) in self._arrays:
+                return True
+        return os.path.exists(self.path(cell, FIRST_YEAR, last))
+
+    def get(self, cell: tuple, priority: str = "interactive") -> tuple:
+        """(first year, (years, 366) uint16 array) for a cell."""
+        first, last = FIRST_YEAR, last_year()
+        key = (cell, last)
+        with self._lock:
+            if key in self._arrays:
+                self._arrays.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return first, self._arrays[key]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return first, future.result()
+
+        try:
+            array = self._load_or_fetch(cell, first, last, priority)
+            future.set_result(array)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        with self._lock:
+            self._arrays[key] = array
+            while len(self._arrays) > self.max_cells:
+                self._arrays.popitem(last=False)
+        return first, array
+
+    def _load_or_fetch(self, cell: tuple, first: int, last: int, priority: str) -> np.ndarray:
+        path = self.path(cell, first, last)
+        try:
+            array = np.load(path)
+            with self._lock:
+                self.stats["disk_hits"] += 1
+            return array
+        except FileNotFoundError:
+            pass
+        array = fetch_daily_rainfall(cell, first, last, priority)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp, path)
+        with self._lock:
+            self.stats["fetched"] += 1
+        return array
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, "cached_cells": len(self._arrays)}
+
+
+rainfall_series_store = RainfallSeriesStore()
+
+
+# --- Season statistics (vectorized over cells and years) ---
+def _window_sum(x: np.ndarray, width: int) -> np.ndarray:
+    """out[..., t] = x[..., t:t + width].sum(), truncated at the end of the year."""
+    totals = np.cumsum(x, axis=-1, dtype=np.float32 if x.dtype.kind == "f" else np.int16)
+    out = np.empty_like(totals)
+    n = x.shape[-1]
+    out[..., :n - width + 1] = totals[..., width - 1:]
+    out[..., n - width + 1:] = totals[..., -1:]
+    out[..., 1:] -= totals[..., :-1]
+    return out
+
+
+def _first_day(mask: np.ndarray) -> np.ndarray:
+    """Index of the first True along the last axis, NaN where there is none."""
+    return np.where(mask.any(axis=-1), mask.argmax(axis=-1), np.nan)
+
+
+def season_statistics(rain_mm: np.ndarray, rainfed_days: int) -> dict:
+    """
+    Onset, cessation and per-day planting success for rain_mm of shape
+    (cells, years, 366) in mm (NaN = missing). Returns arrays per cell.
+    """
+    days = np.arange(DAYS)
+    season = (days >= ONSET_EARLIEST) & (days < 304)  # Apr-Oct
+    valid_year = np.isfinite(rain_mm[..., season]).mean(axis=-1) >= MIN_VALID_FRACTION
+    rain = np.nan_to_num(rain_mm.astype(np.float32, copy=False))
+    dry = rain < DRY_DAY_MM
+
+    # Onset: a wet 3-day start with no long dry spell beginning in the next 30 days
+    wet_start = _window_sum(rain, 3) >= ONSET_RAIN_MM
+    long_dry = _window_sum(dry, FALSE_START_DRY_DAYS) >= FALSE_START_DRY_DAYS
+    spells_after = _window_sum(long_dry, FOLLOW_UP_DAYS - FALSE_START_DRY_DAYS + 1)
+    false_start = np.concatenate([spells_after[..., 1:], np.zeros(rain.shape[:-1] + (1,))], axis=-1) > 0
+    in_onset_range = (days >= ONSET_EARLIEST) & (days <= ONSET_LATEST)
+    onset = _first_day(wet_start & ~false_start & in_onset_range)
+
+    # Cessation: soil water balance, stepped day by day for every cell and year at once
+    by_day = np.ascontiguousarray(np.moveaxis(rain, -1, 0))
+    water = np.zeros(rain.shape[:-1], dtype=np.float32)
+    empty = np.empty((DAYS - CESSATION_EARLIEST,) + water.shape, dtype=bool)
+    for day, day_rain in enumerate(by_day):
+        water = np.clip(water + day_rain - EVAPOTRANSPIRATION_MM, 0, SOIL_CAPACITY_MM, out=water)
+        if day >= CESSATION_EARLIEST:
+            empty[day - CESSATION_EARLIEST] = water <= 0
+    cessation = _first_day(np.moveaxis(empty, 0, -1)) + CESSATION_EARLIEST
+
+    onset = np.where(valid_year, onset, np.nan)
+    cessation = np.where(valid_year, cessation, np.nan)
+
+    # Planting on day d succeeds if the rains had started, no damaging dry spell
+    # began within 30 days, and enough of the season was left
+    damaging = _window_sum(dry, DAMAGING_DRY_SPELL_DAYS) >= DAMAGING_DRY_SPELL_DAYS
+    dry_spell_after = _window_sum(damaging, FOLLOW_UP_DAYS - DAMAGING_DRY_SPELL_DAYS + 1) > 0
+    with np.errstate(invalid="ignore"):
+        started = onset[..., None] <= days
+        long_enough = cessation[..., None] - days >= rainfed_days
+    success = started & ~dry_spell_after & long_enough
+
+    years = np.maximum(valid_year.sum(axis=-1), 1)[..., None]
+    weights = valid_year[..., None]
+    return {
+        "valid_years": valid_year.sum(axis=-1),
+        "without_onset": (np.isnan(onset) & valid_year).sum(axis=-1),
+        "onset": onset,
+        "cessation": cessation,
+        "success_rate": (success & weights).sum(axis=-2) / years,
+        "dry_spell_risk": (dry_spell_after & started & weights).sum(axis=-2) / np.maximum((started & weights).sum(axis=-2), 1),
+    }
+
+
+def planting_windows(success_rate: np.ndarray) -> tuple:
+    """(start, best, end) day per cell: the run around the best day within WINDOW_TOLERANCE of it."""
+    days = np.arange(success_rate.shape[-1])
+    best = success_rate.argmax(axis=-1)
+    peak = success_rate.max(axis=-1)
+    close = success_rate >= (peak - WINDOW_TOLERANCE)[..., None]
+    start = np.where(~close & (days < best[..., None]), days, -1).max(axis=-1) + 1
+    end = np.where(~close & (days > best[..., None]), days, DAYS).min(axis=-1) - 1
+    return start, best, end
+
+
+# --- API ---
+def _day_label(day) -> str:
+    return (date(2001, 1, 1) + timedelta(days=int(day))).strftime("%b %d")
+
+
+def _percentiles(values: np.ndarray) -> dict:
+    if not np.isfinite(values).any():
+        return None
+    p20, p50, p80 = np.nanpercentile(values, (20, 50, 80))
+    return {"early": _day_label(p20), "median": _day_label(p50), "late": _day_label(p80)}
+
+
+def confidence_label(rate: float) -> str:
+    return "high" if rate >= 0.8 else "medium" if rate >= 0.6 else "low"
+
+
+def rainfed_days_for(crop: str = None) -> int:
+    if crop is None:
+        return DEFAULT_RAINFED_DAYS
+    if crop not in CROP_RAINFED_DAYS:
+        raise UnknownCropError(f"Unknown crop '{crop}' (expected one of {', '.join(CROP_RAINFED_DAYS)})")
+    return CROP_RAINFED_DAYS[crop]
+
+
+def _summaries(cells: list, crop: str, rainfed_days: int, priority: str) -> list:
+    """Season summary per cell, computed together from the stacked rainfall series."""
+    arrays = list(_cell_executor.map(lambda cell: rainfall_series_store.get(cell, priority)[1], cells))
+    stacked = np.stack(arrays)
+    rain_mm = np.where(stacked == NODATA, np.nan, stacked.astype(np.float32) / 10)
+    stats = season_statistics(rain_mm, rainfed_days)
+    start, best, end = planting_windows(stats["success_rate"])
+    period = f"{FIRST_YEAR}-{FIRST_YEAR + rain_mm.shape[1] - 1}"
+
+    summaries = []
+    for i, cell in enumerate(cells):
+        lat, lon = cell_centre(cell)
+        rate = float(stats["success_rate"][i, best[i]])
+        season = stats["cessation"][i] - stats["onset"][i]
+        window = None
+        if rate > 0:
+            window = {
+                "start": _day_label(start[i]),
+                "best": _day_label(best[i]),
+                "end": _day_label(end[i]),
+                "start_day_of_year": int(start[i]) + 1,
+                "end_day_of_year": int(end[i]) + 1,
+            }
+        summaries.append({
+            "cell": {"lat": lat, "lon": lon, "res_deg": CELL_RES},
+            "years": int(stats["valid_years"][i]),
+            "period": period,
+            "crop": crop,
+            "rainfed_days_needed": rainfed_days,
+            "onset": _percentiles(stats["onset"][i]),
+            "cessation": _percentiles(stats["cessation"][i]),
+            "season_length_days": (
+                {k: round(float(v)) for k, v in zip(("short", "median", "long"), np.nanpercentile(season, (20, 50, 80)))}
+                if np.isfinite(season).any() else None
+            ),
+            "years_without_onset": int(stats["without_onset"][i]),
+            "planting_window": window,
+            "dry_spell_risk": round(float(stats["dry_spell_risk"][i, best[i]]), 3),
+            "confidence": round(rate, 3),
+            "confidence_label": confidence_label(rate),
+        })
+    return summaries
+
+
+_results = OrderedDict()
+_results_lock = threading.Lock()
+
+
+def planting_window_for_points(points, crop: str = None, priority: str = "interactive",
+                               max_uncached: int = None) -> list:
+    """
+    Planting window per [lat, lon] point. Points in the same cell share one
+    result, and results are kept per (cell, crop) until the year rolls over.
+
+    Raises TooManyUncachedCellsError if more than `max_uncached` cells would
+    need their rainfall series fetched from Earth Engine.
+    """
+    rainfed_days = rainfed_days_for(crop)
+    cells = [cell_of(lat, lon) for lat, lon in points]
+    if rainfed_days is None:
+        note = f"{crop} is grown with irrigation in the dry season; there is no rain-fed window."
+        return [{"crop": crop, "planting_window": None, "note": note}] * len(cells)
+
+    year = last_year()
+    found = {}
+    with _results_lock:
+        for cell in dict.fromkeys(cells):
+            key = (cell, crop, year)
+            if key in _results:
+                _results.move_to_end(key)
+                found[cell] = _results[key]
+    missing = [cell for cell in dict.fromkeys(cells) if cell not in found]
+    if max_uncached is not None:
+        uncached = sum(not rainfall_series_store.cached(cell) for cell in missing)
+        if uncached > max_uncached:
+            raise TooManyUncachedCellsError(
+                f"{uncached} cells have no stored rainfall series yet (at most {max_uncached} per request)"
+            )
+    if missing:
+        computed = dict(zip(missing, _summaries(missing, crop, rainfed_days, priority)))
+        found.update(computed)
+        with _results_lock:
+            for cell, summary in computed.items():
+                _results[(cell, crop, year)] = summary
+            while len(_results) > MAX_CACHED_CELLS * 4:
+                _results.popitem(last=False)
+    return [found[cell] for cell in cells]
+
+
+def get_stats() -> dict:
+    with _results_lock:
+        cached_results = len(_results)
+    return {**rainfall_series_store.get_stats(), "cached_results": cached_results}
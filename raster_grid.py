@@ -0,0 +1,288 @@
+"""
+Local raster grid for the static layers over Northern Nigeria.
+
+ERA5 temperature, PERSIANN rainfall and SoilGrids pH/SOC don't change between
+requests, so they are exported once (`python raster_grid.py build`) into
+int16 .npy files that are memory-mapped at runtime. Every uvicorn worker maps
+the same files, so the pages are shared through the OS page cache.
+
+Usage:
+    python raster_grid.py build [--layers rainfall_mm temp_c] [--out data/grid]
+    python raster_grid.py info
+"""
+import argparse
+import json
+import math
+import os
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Northern states bounding box (Kebbi/Kwara in the west to Borno in the east,
+# Kogi/Benue in the south to Sokoto/Yobe in the north).
+NORTH_BOUNDS = {"west": 2.6, "south": 6.4, "east": 14.7, "north": 13.95}
+
+NODATA = -32768
+
+# Stored values are int16; physical value = stored * scale.
+# Resolutions roughly match each dataset's native pixel size.
+LAYERS = {
+    "rainfall_mm": {"res": 0.05, "scale": 1.0},     # PERSIANN-CDR, ~5 km, annual mm
+    "temp_c": {"res": 0.25, "scale": 0.1},          # ERA5 monthly, ~30 km, deg C
+    "soil_ph": {"res": 0.0025, "scale": 0.1},       # SoilGrids, 250 m, pH
+    "soil_soc_pct": {"res": 0.0025, "scale": 0.1},  # SoilGrids, 250 m, same units as gee_tools
+}
+
+# Above this many candidate cells the reader switches from exact cell/polygon
+# clipping to cell-centre sampling, which is vectorized.
+MAX_CLIPPED_CELLS = 4096
+
+TILE_SIZE = 1024
+
+
+# --- Polygon helpers (planar lon/lat) ---
+def _ring_area(ring: list) -> float:
+    n = len(ring)
+    if n < 3:
+        return 0.0
+    return abs(sum(ring[i][0] * ring[(i + 1) % n][1] - ring[(i + 1) % n][0] * ring[i][1] for i in range(n))) / 2
+
+
+def _clip_to_box(ring: list, west: float, south: float, east: float, north: float) -> list:
+    """Sutherland-Hodgman clip of a lon/lat ring against an axis-aligned box."""
+    def clip(points, inside, intersect):
+        out = []
+        for i, current in enumerate(points):
+            previous = points[i - 1]
+            if inside(current):
+                if not inside(previous):
+                    out.append(intersect(previous, current))
+                out.append(current)
+            elif inside(previous):
+                out.append(intersect(previous, current))
+        return out
+
+    def at_x(x):
+        return lambda p, q: (x, p[1] + (q[1] - p[1]) * (x - p[0]) / (q[0] - p[0]))
+
+    def at_y(y):
+        return lambda p, q: (p[0] + (q[0] - p[0]) * (y - p[1]) / (q[1] - p[1]), y)
+
+    for inside, intersect in (
+        (lambda p: p[0] >= west, at_x(west)),
+        (lambda p: p[0] <= east, at_x(east)),
+        (lambda p: p[1] >= south, at_y(south)),
+        (lambda p: p[1] <= north, at_y(north)),
+    ):
+        ring = clip(ring, inside, intersect)
+        if not ring:
+            break
+    return ring
+
+
+def points_in_ring(xs, ys, ring: list):
+    """Vectorized even-odd point-in-polygon test."""
+    inside = np.zeros(xs.shape, dtype=bool)
+    n = len(ring)
+    for i in range(n):
+        x1, y1 = ring[i]
+        x2, y2 = ring[(i + 1) % n]
+        if y1 == y2:
+            continue
+        crosses = (y1 > ys) != (y2 > ys)
+        x_cross = x1 + (ys - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= crosses & (xs < x_cross)
+    return inside
+
+
+# --- Reader ---
+class RasterGrid:
+    """Memory-mapped reader doing area-weighted polygon means over the exported layers."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._meta = None
+        self._arrays = {}
+
+    @property
+    def meta(self) -> dict:
+        if self._meta is None:
+            path = os.path.join(self.directory, "grid.json")
+            try:
+                with open(path) as f:
+                    self._meta = json.load(f)
+            except FileNotFoundError:
+                self._meta = {"layers": {}}
+        return self._meta
+
+    def available(self, *layers) -> bool:
+        return all(name in self.meta["layers"] for name in layers)
+
+    def _array(self, name: str):
+        if name not in self._arrays:
+            path = os.path.join(self.directory, self.meta["layers"][name]["file"])
+            self._arrays[name] = np.load(path, mmap_mode="r")
+        return self._arrays[name]
+
+    def polygon_mean(self, polygon_coords: list, name: str):
+        """
+        Area-weighted mean of a layer over a [[lat, lon], ...] polygon.
+
+        Returns None when the layer is missing, the polygon is not fully inside
+        the grid, or every covered cell is nodata — callers then go to Earth Engine.
+        """
+        layer = self.meta["layers"].get(name)
+        if layer is None:
+            return None
+
+        ring = [(lon, lat) for lat, lon in polygon_coords]
+        lons = [p[0] for p in ring]
+        lats = [p[1] for p in ring]
+        west, north, res = layer["west"], layer["north"], layer["res"]
+        rows, cols = layer["rows"], layer["cols"]
+        if (min(lons) < west or max(lons) > west + cols * res
+                or max(lats) > north or min(lats) < north - rows * res):
+            return None
+
+        c0 = int((min(lons) - west) // res)
+        c1 = min(int((max(lons) - west) // res), cols - 1)
+        r0 = int((north - max(lats)) // res)
+        r1 = min(int((north - min(lats)) // res), rows - 1)
+        window = np.asarray(self._array(name)[r0:r1 + 1, c0:c1 + 1])
+
+        cell_norths = north - (r0 + np.arange(window.shape[0])) * res
+        cell_wests = west + (c0 + np.arange(window.shape[1])) * res
+        # Cell area shrinks with latitude; rows are weighted by cos(lat)
+        lat_weights = np.cos(np.radians(cell_norths - res / 2))[:, None]
+
+        if window.size <= MAX_CLIPPED_CELLS:
+            coverage = np.zeros(window.shape)
+            for i, cell_north in enumerate(cell_norths):
+                for j, cell_west in enumerate(cell_wests):
+                    clipped = _clip_to_box(ring, cell_west, cell_north - res, cell_west + res, cell_north)
+                    coverage[i, j] = _ring_area(clipped)
+        else:
+            xs, ys = np.meshgrid(cell_wests + res / 2, cell_norths - res / 2)
+            coverage = points_in_ring(xs, ys, ring).astype(float)
+
+        weights = coverage * lat_weights
+        valid = (window != NODATA) & (weights > 0)
+        total = weights[valid].sum()
+        if total <= 0:
+            return None
+        return float((window[valid] * weights[valid]).sum() / total * layer["scale"])
+
+
+raster_grid = RasterGrid(os.getenv("RASTER_GRID_DIR", "data/grid"))
+
+
+def grid_climatology(polygon_coords: list):
+    """Climatology from the local grid in gee_tools' result format, or None."""
+    if not raster_grid.available("rainfall_mm", "temp_c"):
+        return None
+    rainfall = raster_grid.polygon_mean(polygon_coords, "rainfall_mm")
+    temp = raster_grid.polygon_mean(polygon_coords, "temp_c")
+    if rainfall is None or temp is None:
+        return None
+    return {"avg_temp_c": round(temp, 1), "rainfall_total_mm": round(rainfall, 0), "source": "Local grid"}
+
+
+def grid_soil(polygon_coords: list):
+    """Soil pH/SOC from the local grid in gee_tools' result format, or None."""
+    if not raster_grid.available("soil_ph", "soil_soc_pct"):
+        return None
+    ph = raster_grid.polygon_mean(polygon_coords, "soil_ph")
+    soc = raster_grid.polygon_mean(polygon_coords, "soil_soc_pct")
+    if ph is None or soc is None:
+        return None
+    return {"soil_pH": round(ph, 2), "soil_org_carbon_pct": round(soc, 2), "source": "Local grid"}
+
+
+# --- Offline build ---
+def _layer_images() -> dict:
+    """Earth Engine images for each layer, already in stored (unscaled int) units."""
+    import ee
+    from gee_tools import climatology_images, soil_images
+
+    total_precip, temp_mean = climatology_images()
+    soil_image, soc_image = soil_images()
+    images = {
+        "rainfall_mm": total_precip.divide(41),
+        "temp_c": temp_mean.subtract(273.15).multiply(10),
+        "soil_ph": soil_image,
+        "soil_soc_pct": soc_image,
+    }
+    return {
+        name: ee.Image(image).rename(name).round().unmask(NODATA).toInt16()
+        for name, image in images.items()
+    }
+
+
+def build(out_dir: str, layers: list):
+    import ee
+    from auth import initialize_ee
+    from ee_scheduler import ee_scheduler
+
+    initialize_ee()
+    os.makedirs(out_dir, exist_ok=True)
+    images = _layer_images()
+
+    meta_path = os.path.join(out_dir, "grid.json")
+    meta = {"bounds": NORTH_BOUNDS, "nodata": NODATA, "layers": {}}
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta["layers"] = json.load(f).get("layers", {})
+
+    for name in layers:
+        res = LAYERS[name]["res"]
+        west, north = NORTH_BOUNDS["west"], NORTH_BOUNDS["north"]
+        cols = math.ceil((NORTH_BOUNDS["east"] - west) / res)
+        rows = math.ceil((north - NORTH_BOUNDS["south"]) / res)
+        file_name = f"{name}.npy"
+        partial = os.path.join(out_dir, file_name + ".partial")
+        array = np.lib.format.open_memmap(partial, mode="w+", dtype=np.int16, shape=(rows, cols))
+
+        for r in range(0, rows, TILE_SIZE):
+            for c in range(0, cols, TILE_SIZE):
+                height, width = min(TILE_SIZE, rows - r), min(TILE_SIZE, cols - c)
+                request = {
+                    "expression": images[name],
+                    "fileFormat": "NUMPY_NDARRAY",
+                    "grid": {
+                        "dimensions": {"width": width, "height": height},
+                        "affineTransform": {
+                            "scaleX": res, "shearX": 0, "translateX": west + c * res,
+                            "shearY": 0, "scaleY": -res, "translateY": north - r * res,
+                        },
+                        "crsCode": "EPSG:4326",
+                    },
+                }
+                pixels = ee_scheduler.run(lambda: ee.data.computePixels(request), "grid_export", priority="batch")
+                array[r:r + height, c:c + width] = pixels[name]
+            print(f"{name}: rows {r}-{min(r + TILE_SIZE, rows)} of {rows}")
+
+        array.flush()
+        del array
+        os.replace(partial, os.path.join(out_dir, file_name))
+        meta["layers"][name] = {
+            "file": file_name, "west": west, "north": north, "res": res,
+            "rows": rows, "cols": cols, "scale": LAYERS[name]["scale"],
+        }
+        with open(meta_path, "w") as f:
+            json.dump(meta, f, indent=2)
+        print(f"✅ {name}: {rows}x{cols} written to {file_name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or inspect the local raster grid.")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--layers", nargs="+", choices=list(LAYERS), default=list(LAYERS))
+    parser.add_argument("--out", default=raster_grid.directory)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build(args.out, args.layers)
+    else:
+        print(json.dumps(RasterGrid(args.out).meta, indent=2))
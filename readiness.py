@@ -0,0 +1,161 @@
+"""
+Startup bookkeeping behind /healthz and /readyz.
+
+Expensive resources (Earth Engine session, crop model, state boundaries,
+retrieval index, ...) are registered here instead of being created at import
+time. The app's lifespan handler preloads them in parallel in the background,
+and code that needs one calls `readiness.ensure(name)`, which initializes it
+on the spot if preloading hasn't reached it yet or waits for the preload in
+flight. Each subsystem's status, load time and the process memory after it
+loaded are kept for /readyz.
+"""
+import os
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def process_age_s():
+    """Seconds since this process started (interpreter start + imports), or None if unknown."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 3)
+
+
+def rss_bytes():
+    """Current resident set size of this process, or None if unknown."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_bytes() -> int:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Subsystem:
+    def __init__(self, name: str, init, required: bool):
+        self.name = name
+        self.init = init
+        self.required = required
+        self.status = "pending"  # pending -> loading -> ready | unavailable | failed
+        self.error = None
+        self.seconds = None
+        self.rss_after = None
+        self.done = threading.Event()
+
+    def to_dict(self) -> dict:
+        return {
+            "status": self.status,
+            "required": self.required,
+            "seconds": round(self.seconds, 3) if self.seconds is not None else None,
+            "rss_after_mb": round(self.rss_after / 2**20, 1) if self.rss_after else None,
+            "error": self.error,
+        }
+
+
+class Readiness:
+    """
+    `init()` callables return False when the resource simply isn't configured
+    or bundled on this server ("unavailable"), and raise when loading fails.
+    Only required subsystems gate /readyz.
+    """
+
+    def __init__(self):
+        self._subsystems = {}
+        self._lock = threading.Lock()
+        self.started = None
+        self.finished = None
+        self.boot_s = None
+
+    def register(self, name: str, init, required: bool = False):
+        self._subsystems[name] = Subsystem(name, init, required)
+
+    def _run(self, subsystem: Subsystem):
+        start = time.monotonic()
+        try:
+            status = "unavailable" if subsystem.init() is False else "ready"
+        except Exception as e:
+            print(f"Startup: {subsystem.name} failed: {e}")
+            status, subsystem.error = "failed", str(e)
+        subsystem.seconds = time.monotonic() - start
+        subsystem.rss_after = rss_bytes()
+        subsystem.status = status
+        subsystem.done.set()
+
+    def ensure(self, name: str, timeout: float = None) -> bool:
+        """Initialize `name` now (or wait for the preload in flight); True if it's ready."""
+        subsystem = self._subsystems[name]
+        with self._lock:
+            claimed = subsystem.status == "pending"
+            if claimed:
+                subsystem.status = "loading"
+        if claimed:
+            self._run(subsystem)
+        else:
+            subsystem.done.wait(timeout)
+        return subsystem.status == "ready"
+
+    def preload(self, max_workers: int = 8):
+        """Initialize every registered subsystem in parallel, in the background."""
+        self.started = time.monotonic()
+        self.boot_s = process_age_s()
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="startup")
+        futures = [executor.submit(self.ensure, name) for name in self._subsystems]
+
+        def _finish():
+            for future in futures:
+                future.exception()
+            self.finished = time.monotonic()
+            executor.shutdown(wait=False)
+
+        threading.Thread(target=_finish, name="startup-wait", daemon=True).start()
+
+    @property
+    def ready(self) -> bool:
+        return all(s.status == "ready" for s in self._subsystems.values() if s.required)
+
+    def status(self) -> str:
+        required = [s.status for s in self._subsystems.values() if s.required]
+        if all(status == "ready" for status in required):
+            return "ready"
+        return "failed" if any(status in ("failed", "unavailable") for status in required) else "starting"
+
+    def snapshot(self) -> dict:
+        rss = rss_bytes()
+        return {
+            "status": self.status(),
+            "subsystems": {name: s.to_dict() for name, s in self._subsystems.items()},
+            # Process start -> app imported and preload started
+            "boot_s": self.boot_s,
+            "preload_s": round(self.finished - self.started, 3) if self.finished else None,
+            "rss_mb": round(rss / 2**20, 1) if rss else None,
+            "peak_rss_mb": round(peak_rss_bytes() / 2**20, 1),
+        }
+
+    def metrics(self) -> dict:
+        """Numbers for the agro_startup gauge."""
+        snapshot = self.snapshot()
+        values = {
+            "boot_seconds": snapshot["boot_s"],
+            "preload_seconds": snapshot["preload_s"],
+            "rss_bytes": rss_bytes(),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "ready": int(self.ready),
+        }
+        values.update({f"{name}_seconds": s.seconds for name, s in self._subsystems.items()})
+        return values
+
+
+readiness = Readiness()
@@ -0,0 +1,94 @@
+"""
+Area-adaptive reduction parameters for Earth Engine.
+
+A fixed scale with bestEffort=True silently down-samples big cooperative plots
+(or times out), and returns nothing for a plot smaller than one pixel. The
+plan instead picks, per dataset and polygon area:
+
+- tiles: a polygon covering more than TARGET_PIXELS native pixels is split
+  into a grid of tiles (up to MAX_TILES_PER_SIDE^2) reduced in parallel and
+  recombined weighted by pixel count;
+- scale: the native resolution, doubled only if a tile still exceeds
+  TARGET_PIXELS (pyramid levels, so Earth Engine reads precomputed overviews);
+- tileScale: raised as the per-tile pixel count grows so memory stays bounded;
+- point sampling for polygons smaller than one native pixel.
+
+`scale_m` is reported back to clients as the effective resolution of values
+that came from Earth Engine (see gee_tools.reduction_summary).
+"""
+import math
+import os
+
+from dotenv import load_dotenv
+
+from geometry import bounds
+
+load_dotenv()
+
+# Native resolution (m) of the image each reduction reads
+NATIVE_RESOLUTION_M = {
+    "ndvi": 20,             # Sentinel-2 B4/B8 are 10 m; NDVI has always been reduced at 20 m
+    "soil": 250,            # SoilGrids
+    "rainfall": 27_830,     # PERSIANN-CDR, 0.25 deg
+    "temperature": 27_830,  # ERA5 monthly, 0.25 deg
+}
+
+TARGET_PIXELS = int(float(os.getenv("REDUCTION_TARGET_PIXELS", "1e6")))
+MAX_TILES_PER_SIDE = int(os.getenv("REDUCTION_MAX_TILES_PER_SIDE", "6"))
+# Pixels per tileScale step: 1 up to this many pixels, then 2, 4, ... 16
+TILE_SCALE_PIXELS = 250_000
+
+
+class ReductionPlan:
+    def __init__(self, scale_m: float, tile_scale: int, tiles_per_side: int, point: bool):
+        self.scale_m = scale_m
+        self.tile_scale = tile_scale
+        self.tiles_per_side = tiles_per_side
+        self.point = point
+
+    @property
+    def tiled(self) -> bool:
+        return self.tiles_per_side > 1
+
+    def to_dict(self) -> dict:
+        return {
+            "scale_m": self.scale_m,
+            "tiles": self.tiles_per_side ** 2,
+            "mode": "point" if self.point else "tiled" if self.tiled else "region",
+        }
+
+
+def plan_reduction(area_m2: float, native_m: float) -> ReductionPlan:
+    if area_m2 < native_m ** 2:
+        # Smaller than one pixel: no pixel centre may fall inside, so sample the centroid
+        return ReductionPlan(native_m, 1, 1, point=True)
+
+    native_pixels = area_m2 / native_m ** 2
+    tiles_per_side = min(MAX_TILES_PER_SIDE, max(1, math.ceil(math.sqrt(native_pixels / TARGET_PIXELS))))
+    tile_area = area_m2 / tiles_per_side ** 2
+    scale = native_m
+    while tile_area / scale ** 2 > TARGET_PIXELS:
+        scale *= 2
+    pixels = tile_area / scale ** 2
+    tile_scale = 1 if pixels <= TILE_SCALE_PIXELS else min(16, 2 ** math.ceil(math.log2(pixels / TILE_SCALE_PIXELS)))
+    return ReductionPlan(scale, tile_scale, tiles_per_side, point=False)
+
+
+def reduction_plans(area_m2: float) -> dict:
+    return {dataset: plan_reduction(area_m2, native) for dataset, native in NATIVE_RESOLUTION_M.items()}
+
+
+def effective_resolution(area_m2: float) -> dict:
+    """{dataset: metres per pixel actually reduced} for a polygon of this area."""
+    return {dataset: plan.scale_m for dataset, plan in reduction_plans(area_m2).items()}
+
+
+def tile_bounds(polygon_coords: list, tiles_per_side: int) -> list:
+    """Split the polygon's [lat, lon] bounds into a grid: [(west, south, east, north), ...]."""
+    west, south, east, north = bounds(polygon_coords)
+    dlat = (north - south) / tiles_per_side
+    dlon = (east - west) / tiles_per_side
+    return [
+        (west + j * dlon, south + i * dlat, west + (j + 1) * dlon, south + (i + 1) * dlat)
+        for i in range(tiles_per_side) for j in range(tiles_per_side)
+    ]
@@ -0,0 +1,499 @@
+"""
+Regional crop-suitability map for the northern states.
+
+A whole-state view would otherwise take thousands of /calculate + /predict
+calls, so it is precomputed offline instead:
+
+1. `sweep` lays a regular grid over NORTH_BOUNDS, keeps the cells whose
+   centre falls in a northern state, and computes the ModelFeatures inputs
+   per cell with one reduceRegions() call per batch of cells. Each finished
+   batch is written as its own Parquet part file, so an interrupted sweep
+   resumes from the batches it has not written yet.
+2. `score` reads the parts back as columns and runs the crop model over them
+   in large vectorized batches (fixed management inputs, see DEFAULT_MANAGEMENT),
+   writing scores.parquet plus uint8 rasters that are memory-mapped at runtime.
+3. The API serves those rasters as Web Mercator PNG tiles
+   (/suitability/tiles/{layer}/{z}/{x}/{y}.png) for the Leaflet map.
+
+Usage:
+    python regional.py sweep [--res 0.05] [--batch 256] [--workers 4] [--restart]
+    python regional.py score [--fertilizer 50] [--pesticide 2] [--farm-size 1.5] [--irrigated 0.5]
+    python regional.py info
+
+The sweep/score commands need pyarrow; serving tiles only needs numpy.
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+from dotenv import load_dotenv
+
+from raster_grid import NORTH_BOUNDS
+
+load_dotenv()
+
+REGIONAL_DIR = os.getenv("REGIONAL_DIR", "data/regional")
+NORTHERN_STATES = (
+    "Adamawa", "Bauchi", "Benue", "Borno", "FCT", "Gombe", "Jigawa", "Kaduna", "Kano", "Katsina",
+    "Kebbi", "Kogi", "Kwara", "Nasarawa", "Niger", "Plateau", "Sokoto", "Taraba", "Yobe", "Zamfara",
+)
+
+DEFAULT_RES = 0.05        # degrees per cell (~5.5 km)
+DEFAULT_BATCH_CELLS = 256
+SWEEP_SCALE_M = 250       # reduction scale: SoilGrids native, coarser layers are resampled
+SWEEP_TILE_SCALE = 4
+SCORE_BATCH_ROWS = 50_000
+ENVIRONMENT_FEATURES = ("rainfall_total_mm", "avg_temp_c", "ndvi_mean", "soil_ph", "soil_org_carbon_pct")
+
+# Management inputs assumed for every cell (the Dashboard's defaults)
+DEFAULT_MANAGEMENT = {
+    "fertilizer_rate_kg_per_ha": 50.0,
+    "pesticide_rate_l_per_ha": 2.0,
+    "farm_size_ha": 1.5,
+    "irrigated_area_ha": 0.5,
+}
+
+# Raster encoding: probability * 250 in uint8, best crop as class index
+NODATA = 255
+PROBABILITY_SCALE = 250
+
+TILE_SIZE = 256
+MAX_TILE_ZOOM = 12
+TILE_CACHE_SIZE = int(os.getenv("SUITABILITY_TILE_CACHE", "1024"))
+TILE_ALPHA = 190
+
+# One colour per crop for the "best" layer, in model_service.CROP_LABELS order
+CROP_COLORS = (
+    (141, 90, 151),   # Cassava
+    (240, 240, 240),  # Cotton
+    (102, 194, 165),  # Guna melon
+    (255, 217, 47),   # Maize
+    (166, 216, 84),   # Okra
+    (31, 120, 180),   # Rice
+    (229, 196, 148),  # Soybeans
+    (231, 138, 195),  # Sweet potato
+    (217, 95, 2),     # Wheat
+    (117, 112, 179),  # Yam
+)
+
+
+def layer_id(crop: str) -> str:
+    return crop.lower().replace(" ", "_")
+
+
+# --- Grid ---
+def grid_shape(res: float) -> tuple:
+    cols = math.ceil((NORTH_BOUNDS["east"] - NORTH_BOUNDS["west"]) / res)
+    rows = math.ceil((NORTH_BOUNDS["north"] - NORTH_BOUNDS["south"]) / res)
+    return rows, cols
+
+
+def grid_cells(res: float, block: int) -> dict:
+    """
+    Cells whose centre lies in a northern state, as column arrays. Cells are
+    ordered block by block (block x block cells) so every sweep batch covers a
+    compact area rather than a thin strip.
+    """
+    from state_resolver import state_resolver
+
+    if not state_resolver.available:
+        raise RuntimeError("State boundaries are required to select cells (python state_resolver.py build).")
+    rows, cols = grid_shape(res)
+    r, c = np.meshgrid(np.arange(rows), np.arange(cols), indexing="ij")
+    r, c = r.ravel(), c.ravel()
+    order = np.lexsort((c, r, c // block, r // block))
+    r, c = r[order], c[order]
+    lats = NORTH_BOUNDS["north"] - (r + 0.5) * res
+    lons = NORTH_BOUNDS["west"] + (c + 0.5) * res
+    states = np.asarray(state_resolver.resolve_many(np.column_stack((lats, lons))), dtype=object)
+    keep = np.isin(states, NORTHERN_STATES)
+    return {"row": r[keep], "col": c[keep], "lat": lats[keep], "lon": lons[keep], "state": states[keep]}
+
+
+# --- Sweep ---
+def _sweep_image(bounds):
+    """All model inputs as bands, in the units ModelFeatures uses (same conversions as gee_tools' parsers)."""
+    import ee
+    from gee_tools import _ndvi_image, climatology_images, soil_images
+
+    total_precip, temp_mean = climatology_images()
+    soil_image, soc_image = soil_images()
+    return ee.Image.cat([
+        total_precip.divide(41).rename("rainfall_total_mm"),
+        temp_mean.subtract(273.15).rename("avg_temp_c"),
+        _ndvi_image(ee.Geometry.Rectangle(list(bounds))).rename("ndvi_mean"),
+        soil_image.divide(10).rename("soil_ph"),
+        soc_image.divide(10).rename("soil_org_carbon_pct"),
+    ])
+
+
+def reduce_cells(cells: dict, res: float) -> dict:
+    """{feature: float array} for a batch of cells, from one reduceRegions() round trip."""
+    import ee
+    from gee_tools import get_info
+
+    half = res / 2
+    features = [
+        ee.Feature(ee.Geometry.Rectangle([lon - half, lat - half, lon + half, lat + half]), {"i": i})
+        for i, (lat, lon) in enumerate(zip(cells["lat"].tolist(), cells["lon"].tolist()))
+    ]
+    bounds = (cells["lon"].min() - half, cells["lat"].min() - half, cells["lon"].max() + half, cells["lat"].max() + half)
+    reduced = _sweep_image(bounds).reduceRegions(
+        collection=ee.FeatureCollection(features),
+        reducer=ee.Reducer.mean(),
+        scale=SWEEP_SCALE_M,
+        tileScale=SWEEP_TILE_SCALE,
+    )
+    evaluated = get_info(reduced, "regional", priority="batch")
+
+    values = {name: np.full(len(features), np.nan) for name in ENVIRONMENT_FEATURES}
+    for feature in evaluated["features"]:
+        properties = feature["properties"]
+        for name in ENVIRONMENT_FEATURES:
+            if properties.get(name) is not None:
+                values[name][properties["i"]] = properties[name]
+    return values
+
+
+def _manifest_path(out_dir: str) -> str:
+    return os.path.join(out_dir, "sweep.json")
+
+
+def _part_path(out_dir: str, batch: int) -> str:
+    return os.path.join(out_dir, "features", f"part-{batch:05d}.parquet")
+
+
+def _write_part(out_dir: str, batch: int, cells: dict, values: dict):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.table({
+        "row": pa.array(cells["row"], pa.int32()),
+        "col": pa.array(cells["col"], pa.int32()),
+        "lat": cells["lat"],
+        "lon": cells["lon"],
+        "state": pa.array(cells["state"].tolist(), pa.string()).dictionary_encode(),
+        **{name: pa.array(values[name], pa.float32()) for name in ENVIRONMENT_FEATURES},
+    })
+    path = _part_path(out_dir, batch)
+    # Write-then-rename: a part file exists only once its batch is complete. The
+    # leading dot keeps leftovers of a killed run out of pq.read_table()
+    tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+
+def sweep(out_dir: str, res: float, batch_cells: int, workers: int, restart: bool):
+    from auth import initialize_ee
+
+    settings = {"res": res, "bounds": NORTH_BOUNDS, "batch_cells": batch_cells, "scale_m": SWEEP_SCALE_M}
+    os.makedirs(os.path.join(out_dir, "features"), exist_ok=True)
+    if os.path.exists(_manifest_path(out_dir)):
+        with open(_manifest_path(out_dir)) as f:
+            previous = json.load(f)
+        if restart:
+            for path in glob.glob(os.path.join(out_dir, "features", "part-*.parquet")):
+                os.remove(path)
+        elif {k: previous.get(k) for k in settings} != settings:
+            raise SystemExit(f"{out_dir} holds a sweep with different settings ({previous}); pass --restart.")
+
+    cells = grid_cells(res, block=max(1, int(math.sqrt(batch_cells))))
+    batches = math.ceil(len(cells["row"]) / batch_cells)
+    with open(_manifest_path(out_dir), "w") as f:
+        json.dump({**settings, "cells": int(len(cells["row"])), "batches": batches, "started": time.time()}, f, indent=2)
+
+    todo = [b for b in range(batches) if not os.path.exists(_part_path(out_dir, b))]
+    print(f"{len(cells['row'])} cells in {batches} batches; {batches - len(todo)} already done.")
+    if not todo:
+        return
+
+    initialize_ee()
+
+    def run(batch):
+        chunk = {name: column[batch * batch_cells:(batch + 1) * batch_cells] for name, column in cells.items()}
+        _write_part(out_dir, batch, chunk, reduce_cells(chunk, res))
+
+    failed, started = [], time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="regional") as executor:
+        futures = {executor.submit(run, batch): batch for batch in todo}
+        for done, future in enumerate(as_completed(futures), 1):
+            batch = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failed.append(batch)
+                print(f"⚠️ Batch {batch} failed: {e}")
+            if done % 10 == 0 or done == len(todo):
+                rate = done / (time.monotonic() - started)
+                print(f"{done}/{len(todo)} batches ({rate * 60:.1f}/min)")
+
+    if failed:
+        print(f"{len(failed)} batches failed; run the sweep again to retry them.")
+    else:
+        print(f"✅ Sweep complete: {out_dir}/features")
+
+
+# --- Scoring ---
+def score(out_dir: str, management: dict, batch_rows: int = SCORE_BATCH_ROWS):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from model_service import crop_model
+
+    with open(_manifest_path(out_dir)) as f:
+        manifest = json.load(f)
+    table = pq.read_table(os.path.join(out_dir, "features"))
+    if table.num_rows < manifest["cells"]:
+        print(f"⚠️ Sweep is incomplete ({table.num_rows}/{manifest['cells']} cells); scoring what is there.")
+
+    crop_model.load()
+    states = np.asarray(table.column("state").to_pylist(), dtype=object)
+    columns = {name: table.column(name).to_numpy(zero_copy_only=False).astype(np.float64) for name in ENVIRONMENT_FEATURES}
+    complete = np.isin(states, list(crop_model.state_codes))
+    for values in columns.values():
+        complete &= np.isfinite(values)
+    rows_ok = np.flatnonzero(complete)
+    print(f"Scoring {len(rows_ok)} of {table.num_rows} cells ({table.num_rows - len(rows_ok)} lack data).")
+
+    labels = list(crop_model.labels)
+    proba = np.zeros((len(rows_ok), len(labels)), dtype=np.float32)
+    for start in range(0, len(rows_ok), batch_rows):
+        idx = rows_ok[start:start + batch_rows]
+        features = crop_model.encode_columns(
+            states[idx].tolist(),
+            {**{name: values[idx] for name, values in columns.items()},
+             **{name: np.full(len(idx), value) for name, value in management.items()}},
+        )
+        batch_proba, class_labels = crop_model.predict_proba(features)
+        # Model columns -> CROP_LABELS order
+        proba[start:start + len(idx), [labels.index(name) for name in class_labels]] = batch_proba
+
+    best = proba.argmax(axis=1)
+    pq.write_table(pa.table({
+        "row": table.column("row").take(pa.array(rows_ok)),
+        "col": table.column("col").take(pa.array(rows_ok)),
+        "state": states[rows_ok].tolist(),
+        "best_crop": [labels[i] for i in best],
+        "best_probability": proba[np.arange(len(best)), best],
+        **{layer_id(name): proba[:, i] for i, name in enumerate(labels)},
+    }), os.path.join(out_dir, "scores.parquet"))
+
+    rows, cols = grid_shape(manifest["res"])
+    r = table.column("row").to_numpy()[rows_ok]
+    c = table.column("col").to_numpy()[rows_ok]
+    best_raster = np.full((rows, cols), NODATA, dtype=np.uint8)
+    best_raster[r, c] = best
+    suitability = np.full((len(labels), rows, cols), NODATA, dtype=np.uint8)
+    suitability[:, r, c] = np.round(proba.T * PROBABILITY_SCALE).astype(np.uint8)
+    for name, array in (("best_crop", best_raster), ("suitability", suitability)):
+        path = os.path.join(out_dir, f"{name}.npy")
+        with open(f"{path}.partial", "wb") as f:
+            np.save(f, array)
+        os.replace(f"{path}.partial", path)
+
+    meta = {
+        "west": NORTH_BOUNDS["west"], "north": NORTH_BOUNDS["north"], "res": manifest["res"],
+        "rows": rows, "cols": cols, "crops": labels, "management": management,
+        "cells": int(len(rows_ok)), "built": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    # Written last and atomically: servers reload the rasters when this file changes
+    path = os.path.join(out_dir, "suitability.json")
+    with open(f"{path}.partial", "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(f"{path}.partial", path)
+    print(f"✅ {len(rows_ok)} cells scored; rasters written to {out_dir}")
+
+
+# --- Tiles ---
+def encode_png(rgba: np.ndarray) -> bytes:
+    """Minimal RGBA PNG encoder (no imaging library needed)."""
+    height, width, _ = rgba.shape
+    raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, width * 4)], axis=1)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+def _probability_ramp() -> np.ndarray:
+    """256-entry RGBA lookup: red (unsuitable) -> yellow -> green (suitable); NODATA transparent."""
+    t = np.clip(np.arange(256) / PROBABILITY_SCALE, 0, 1)
+    lut = np.zeros((256, 4), dtype=np.uint8)
+    lut[:, 0] = np.where(t < 0.5, 215, np.round(215 - (t - 0.5) * 2 * 189))
+    lut[:, 1] = np.where(t < 0.5, np.round(48 + t * 2 * 169), np.round(217 - (t - 0.5) * 2 * 67))
+    lut[:, 2] = np.where(t < 0.5, 39, np.round(39 + (t - 0.5) * 2 * 41))
+    lut[:, 3] = TILE_ALPHA
+    lut[NODATA, 3] = 0
+    return lut
+
+
+def _crop_palette() -> np.ndarray:
+    lut = np.zeros((256, 4), dtype=np.uint8)
+    lut[:len(CROP_COLORS), :3] = CROP_COLORS
+    lut[:len(CROP_COLORS), 3] = TILE_ALPHA
+    return lut
+
+
+EMPTY_TILE = encode_png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+
+
+class SuitabilityMap:
+    """Memory-mapped suitability rasters rendered as Web Mercator tiles, with an LRU of encoded tiles."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._meta = None
+        self._meta_mtime = None
+        self._arrays = {}
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+        self._ramp = _probability_ramp()
+        self._palette = _crop_palette()
+        self.stats = {"hits": 0, "rendered": 0, "empty": 0}
+
+    @property
+    def meta(self):
+        """suitability.json, or None until it exists; re-read (with fresh rasters and tiles) when it changes."""
+        path = os.path.join(self.directory, "suitability.json")
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if self._meta is None or mtime != self._meta_mtime:
+                try:
+                    with open(path) as f:
+                        meta = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"Suitability map metadata unreadable: {e}")
+                    return None
+                self._meta, self._meta_mtime = meta, mtime
+                self._arrays = {}
+                self._tiles.clear()
+            return self._meta
+
+    @property
+    def available(self) -> bool:
+        return self.meta is not None
+
+    @property
+    def layers(self) -> dict:
+        """{layer id: display name}: the best-crop layer and one probability layer per crop."""
+        if not self.available:
+            return {}
+        return {"best": "Best crop", **{layer_id(crop): crop for crop in self.meta["crops"]}}
+
+    @property
+    def max_native_zoom(self) -> int:
+        # Zoom at which one cell spans ~8 tile pixels; Leaflet upscales beyond it
+        return min(MAX_TILE_ZOOM, math.ceil(math.log2(360 / (TILE_SIZE * self.meta["res"]))) + 3)
+
+    def describe(self) -> dict:
+        meta = self.meta
+        south = meta["north"] - meta["rows"] * meta["res"]
+        east = meta["west"] + meta["cols"] * meta["res"]
+        return {
+            "layers": [{"id": key, "name": name} for key, name in self.layers.items()],
+            "legend": {crop: "#%02x%02x%02x" % color for crop, color in zip(meta["crops"], CROP_COLORS)},
+            "bounds": [[round(south, 6), meta["west"]], [meta["north"], round(east, 6)]],
+            "resolution_deg": meta["res"],
+            "max_native_zoom": self.max_native_zoom,
+            "management": meta["management"],
+            "cells": meta["cells"],
+            "built": meta["built"],
+        }
+
+    def _array(self, name: str):
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.directory, f"{name}.npy"), mmap_mode="r")
+        return self._arrays[name]
+
+    def tile(self, layer: str, z: int, x: int, y: int) -> bytes:
+        key = (layer, z, x, y)
+        with self._lock:
+            if key in self._tiles:
+                self._tiles.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._tiles[key]
+
+        png = self._render(layer, z, x, y)
+        with self._lock:
+            self._tiles[key] = png
+            while len(self._tiles) > TILE_CACHE_SIZE:
+                self._tiles.popitem(last=False)
+        return png
+
+    def _render(self, layer: str, z: int, x: int, y: int) -> bytes:
+        meta = self.meta
+        n = 2 ** z
+        offsets = (np.arange(TILE_SIZE) + 0.5) / TILE_SIZE
+        lons = (x + offsets) / n * 360 - 180
+        lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + offsets) / n))))
+        cols = np.floor((lons - meta["west"]) / meta["res"]).astype(np.int64)
+        rows = np.floor((meta["north"] - lats) / meta["res"]).astype(np.int64)
+        col_ok = (cols >= 0) & (cols < meta["cols"])
+        row_ok = (rows >= 0) & (rows < meta["rows"])
+        if not col_ok.any() or not row_ok.any():
+            with self._lock:
+                self.stats["empty"] += 1
+            return EMPTY_TILE
+
+        if layer == "best":
+            raster, lut = self._array("best_crop"), self._palette
+        else:
+            band = [layer_id(crop) for crop in meta["crops"]].index(layer)
+            raster, lut = self._array("suitability")[band], self._ramp
+        values = np.asarray(raster[np.clip(rows, 0, meta["rows"] - 1)[:, None], np.clip(cols, 0, meta["cols"] - 1)[None, :]])
+        values[~(row_ok[:, None] & col_ok[None, :])] = NODATA
+        with self._lock:
+            self.stats["rendered"] += 1
+        return encode_png(lut[values])
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, "cached": len(self._tiles)}
+
+
+suitability_map = SuitabilityMap(REGIONAL_DIR)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the regional crop-suitability map.")
+    parser.add_argument("command", choices=["sweep", "score", "info"])
+    parser.add_argument("--out", default=REGIONAL_DIR)
+    parser.add_argument("--res", type=float, default=DEFAULT_RES, help="Cell size (degrees)")
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH_CELLS, help="Cells per reduceRegions() call")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent Earth Engine requests")
+    parser.add_argument("--restart", action="store_true", help="Discard finished batches and sweep from scratch")
+    parser.add_argument("--fertilizer", type=float, default=DEFAULT_MANAGEMENT["fertilizer_rate_kg_per_ha"])
+    parser.add_argument("--pesticide", type=float, default=DEFAULT_MANAGEMENT["pesticide_rate_l_per_ha"])
+    parser.add_argument("--farm-size", type=float, default=DEFAULT_MANAGEMENT["farm_size_ha"])
+    parser.add_argument("--irrigated", type=float, default=DEFAULT_MANAGEMENT["irrigated_area_ha"])
+    args = parser.parse_args()
+
+    if args.command == "sweep":
+        sweep(args.out, args.res, args.batch, args.workers, args.restart)
+    elif args.command == "score":
+        score(args.out, {
+            "fertilizer_rate_kg_per_ha": args.fertilizer,
+            "pesticide_rate_l_per_ha": args.pesticide,
+            "farm_size_ha": args.farm_size,
+            "irrigated_area_ha": args.irrigated,
+        })
+    else:
+        regional = SuitabilityMap(args.out)
+        print(json.dumps(regional.describe(), indent=2) if regional.available else f"No suitability map in {args.out}")
@@ -0,0 +1,250 @@
+"""
+Offline Nigerian state lookup.
+
+State boundaries (level 1, simplified to ~100 m) are read from
+data/nigeria_states.json and indexed on a regular lon/lat grid: cells that no
+boundary crosses map straight to a state, and only boundary cells fall back
+to point-in-polygon tests against their few candidate states. There is no
+online fallback: the server refuses to start without the file.
+
+Build the file (part of every deploy's build step) with:
+    python state_resolver.py build                        # geoBoundaries NGA ADM1, no credentials
+    python state_resolver.py build --geojson nga_adm1.geojson   # an ADM1 file already downloaded
+    python state_resolver.py build --source gaul          # FAO GAUL via Earth Engine
+"""
+import argparse
+import json
+import math
+import os
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+
+from raster_grid import points_in_ring
+
+load_dotenv()
+
+STATES_PATH = os.getenv("STATE_BOUNDARIES_PATH", "data/nigeria_states.json")
+INDEX_RES = 0.1  # degrees per index cell
+UNKNOWN = "Unknown"
+
+# Spellings used by GAUL / Nominatim -> names fitted by encoders['state']
+STATE_ALIASES = {
+    "Federal Capital Territory": "FCT",
+    "Abuja Federal Capital Territory": "FCT",
+    "Abuja": "FCT",
+    "Nassarawa": "Nasarawa",
+}
+
+
+def normalize_state_name(name: str) -> str:
+    name = (name or "").strip()
+    if name.endswith(" State"):
+        name = name[: -len(" State")]
+    return STATE_ALIASES.get(name, name) or UNKNOWN
+
+
+class StateBoundariesMissingError(RuntimeError):
+    """Raised on a lookup when the state boundaries file is missing or empty."""
+
+
+class StateResolver:
+    """Point -> state name using the bundled boundaries and a grid index."""
+
+    def __init__(self, path: str = STATES_PATH, res: float = INDEX_RES):
+        self.path = path
+        self.res = res
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.names = []
+        self.rings = []  # per state: list of [(lon, lat), ...]
+
+    @property
+    def available(self) -> bool:
+        self._load()
+        return bool(self.names)
+
+    def _load(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                with open(self.path) as f:
+                    states = json.load(f)["states"]
+            except FileNotFoundError:
+                print(f"State boundaries not found at {self.path}; offline state lookup disabled.")
+                states = []
+
+            self.names = [normalize_state_name(s["name"]) for s in states]
+            self.rings = [[[tuple(p) for p in ring] for ring in s["rings"]] for s in states]
+            if states:
+                self._build_index()
+            self._loaded = True
+
+    def _build_index(self):
+        all_points = [p for rings in self.rings for ring in rings for p in ring]
+        self.west = min(p[0] for p in all_points)
+        self.south = min(p[1] for p in all_points)
+        self.cols = math.ceil((max(p[0] for p in all_points) - self.west) / self.res) + 1
+        self.rows = math.ceil((max(p[1] for p in all_points) - self.south) / self.res) + 1
+
+        # Candidates per cell and cells touched by any boundary edge
+        candidates = [[set() for _ in range(self.cols)] for _ in range(self.rows)]
+        boundary = np.zeros((self.rows, self.cols), dtype=bool)
+        for state, rings in enumerate(self.rings):
+            for ring in rings:
+                for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+                    c0, c1 = sorted((self._col(x1), self._col(x2)))
+                    r0, r1 = sorted((self._row(y1), self._row(y2)))
+                    boundary[r0:r1 + 1, c0:c1 + 1] = True
+                    for r in range(r0, r1 + 1):
+                        for c in range(c0, c1 + 1):
+                            candidates[r][c].add(state)
+
+        # Interior cells: resolve once via the cell centre
+        self.cell_state = np.full((self.rows, self.cols), -1, dtype=np.int16)
+        xs, ys = np.meshgrid(
+            self.west + (np.arange(self.cols) + 0.5) * self.res,
+            self.south + (np.arange(self.rows) + 0.5) * self.res,
+        )
+        interior = ~boundary
+        for state, rings in enumerate(self.rings):
+            inside = self._in_state(xs[interior], ys[interior], rings)
+            cells = self.cell_state[interior]
+            cells[inside] = state
+            self.cell_state[interior] = cells
+
+        self.boundary = boundary
+        self.candidates = [[tuple(sorted(c)) for c in row] for row in candidates]
+
+    def _col(self, lon):
+        return min(max(int((lon - self.west) // self.res), 0), self.cols - 1)
+
+    def _row(self, lat):
+        return min(max(int((lat - self.south) // self.res), 0), self.rows - 1)
+
+    @staticmethod
+    def _in_state(xs, ys, rings):
+        inside = np.zeros(np.shape(xs), dtype=bool)
+        for ring in rings:
+            inside ^= points_in_ring(xs, ys, ring)
+        return inside
+
+    def resolve(self, lat: float, lon: float) -> str:
+        return self.resolve_many([(lat, lon)])[0]
+
+    def resolve_many(self, points) -> list:
+        """[(lat, lon), ...] -> state names ("Unknown" outside Nigeria)."""
+        self._load()
+        if not self.names:
+            raise StateBoundariesMissingError(
+                f"No state boundaries at {self.path} (python state_resolver.py build)"
+            )
+        coords = np.asarray(points, dtype=np.float64)
+        if len(coords) == 0:
+            return []
+        if coords.ndim != 2 or coords.shape[1] != 2:
+            raise ValueError("Points must be [lat, lon] pairs.")
+        lats, lons = coords[:, 0], coords[:, 1]
+
+        cols = np.floor((lons - self.west) / self.res).astype(np.int64)
+        rows = np.floor((lats - self.south) / self.res).astype(np.int64)
+        in_grid = (cols >= 0) & (cols < self.cols) & (rows >= 0) & (rows < self.rows)
+
+        result = np.full(len(coords), -1, dtype=np.int64)
+        result[in_grid] = self.cell_state[rows[in_grid], cols[in_grid]]
+
+        # Boundary cells: test only the states whose edges touch the cell
+        pending = np.flatnonzero(in_grid & (result < 0))
+        pending = pending[self.boundary[rows[pending], cols[pending]]]
+        by_state = {}
+        for i in pending:
+            for state in self.candidates[rows[i]][cols[i]]:
+                by_state.setdefault(state, []).append(i)
+        for state, indices in by_state.items():
+            indices = np.asarray(indices)
+            indices = indices[result[indices] < 0]
+            if len(indices):
+                inside = self._in_state(lons[indices], lats[indices], self.rings[state])
+                result[indices[inside]] = state
+
+        return [self.names[s] if s >= 0 else UNKNOWN for s in result]
+
+
+state_resolver = StateResolver()
+
+
+# --- Offline build ---
+GEOBOUNDARIES_API = "https://www.geoboundaries.org/api/current/gbOpen/NGA/ADM1/"
+
+
+def _records(features: list, name_key: str) -> list:
+    records = []
+    for feature in features:
+        geometry = feature["geometry"]
+        polygons = geometry["coordinates"] if geometry["type"] == "MultiPolygon" else [geometry["coordinates"]]
+        rings = [
+            [[round(lon, 5), round(lat, 5)] for lon, lat, *_ in ring]
+            for polygon in polygons for ring in polygon
+        ]
+        records.append({"name": normalize_state_name(feature["properties"][name_key]), "rings": rings})
+    return records
+
+
+def gaul_features(max_error_m: float) -> list:
+    import ee
+    from auth import initialize_ee
+
+    initialize_ee()
+    return (
+        ee.FeatureCollection("FAO/GAUL/2015/level1")
+        .filter(ee.Filter.eq("ADM0_NAME", "Nigeria"))
+        .map(lambda f: f.simplify(max_error_m))
+        .getInfo()
+    )["features"]
+
+
+def geoboundaries_features() -> list:
+    """The simplified geoBoundaries (CC BY 4.0) ADM1 layer for Nigeria."""
+    import httpx
+
+    with httpx.Client(timeout=60, follow_redirects=True) as client:
+        meta = client.get(GEOBOUNDARIES_API)
+        meta.raise_for_status()
+        response = client.get(meta.json()["simplifiedGeometryGeoJSON"])
+        response.raise_for_status()
+        return response.json()["features"]
+
+
+def build(out_path: str, source: str = "geoboundaries", geojson: str = None, max_error_m: float = 100):
+    if geojson:
+        with open(geojson) as f:
+            features = json.load(f)["features"]
+        records = _records(features, "shapeName" if "shapeName" in features[0]["properties"] else "ADM1_NAME")
+        source = os.path.basename(geojson)
+    elif source == "gaul":
+        records = _records(gaul_features(max_error_m), "ADM1_NAME")
+        source = "FAO/GAUL/2015/level1"
+    else:
+        records = _records(geoboundaries_features(), "shapeName")
+        source = "geoBoundaries gbOpen NGA ADM1 (CC BY 4.0)"
+
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, "w") as f:
+        json.dump({"source": source, "simplify_m": max_error_m, "states": records}, f, separators=(",", ":"))
+    print(f"✅ {len(records)} states written to {out_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the bundled Nigerian state boundaries.")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--out", default=STATES_PATH)
+    parser.add_argument("--source", choices=["geoboundaries", "gaul"], default="geoboundaries",
+                        help="geoboundaries: open download, no credentials; gaul: Earth Engine")
+    parser.add_argument("--geojson", help="Build from an ADM1 GeoJSON file instead of downloading")
+    parser.add_argument("--max-error", type=float, default=100, help="Simplification tolerance for gaul (m)")
+    args = parser.parse_args()
+    build(args.out, args.source, args.geojson, args.max_error)
@@ -0,0 +1,125 @@
+import time
+
+import pytest
+
+from ai_model.answer_cache import AnswerCache, normalize_question, profile_bucket
+from ai_model.sessions import ChatSession
+
+KANO_MAIZE = {"state": "Kano", "predicted_crop": "Maize", "rainfall_total_mm": 812, "soil_pH": 6.3, "ndvi_mean": 0.41}
+
+
+@pytest.fixture
+def cache():
+    return AnswerCache(max_entries=10, ttl=60, similarity=0.6)
+
+
+def ask(cache, message, info=KANO_MAIZE, session=None):
+    return cache.get(cache.key_for(message, info, session))
+
+
+def store(cache, message, answer, info=KANO_MAIZE):
+    cache.put(cache.key_for(message, info), answer)
+
+
+def test_normalization_ignores_case_punctuation_and_filler():
+    assert normalize_question("When should I plant MAIZE?") == normalize_question("when should i plant maize")
+
+
+def test_normalization_keeps_negations_and_modals():
+    assert normalize_question("Should I not plant maize?") != normalize_question("Should I plant maize?")
+    assert normalize_question("Don't I need lime?") != normalize_question("Do I need lime?")
+    assert normalize_question("Can I plant maize?") != normalize_question("Should I plant maize?")
+
+
+def test_exact_hit(cache):
+    store(cache, "When should I plant maize?", "After the first 25 mm of rain.")
+    assert ask(cache, "when should i plant maize") == "After the first 25 mm of rain."
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_profile_buckets(cache):
+    store(cache, "When should I plant maize?", "A")
+    assert ask(cache, "When should I plant maize?", {**KANO_MAIZE, "rainfall_total_mm": 840, "ndvi_mean": 0.44}) == "A"
+    assert ask(cache, "When should I plant maize?", {**KANO_MAIZE, "state": "Kaduna"}) is None
+    assert ask(cache, "When should I plant maize?", {**KANO_MAIZE, "soil_pH": 5.2}) is None
+    predict_style = {k: v for k, v in KANO_MAIZE.items() if k != "soil_pH"} | {"soil_ph": 6.3}
+    assert profile_bucket(predict_style) == profile_bucket(KANO_MAIZE)
+
+
+def test_planting_window_buckets_by_half_month():
+    def window(best):
+        return {**KANO_MAIZE, "planting_window": {"planting_window": {"best": best}}}
+
+    assert profile_bucket(window("Jun 17")) == profile_bucket(window("Jun 30"))
+    assert profile_bucket(window("Jun 17")) != profile_bucket(window("Jun 03"))
+
+
+@pytest.mark.parametrize("info", [
+    {**KANO_MAIZE, "planting_window": {"planting_window": {"best": "soon"}}},
+    {**KANO_MAIZE, "planting_window": {"planting_window": {"best": 172}}},
+    {**KANO_MAIZE, "planting_window": {"planting_window": ["Jun 17"]}},
+    {**KANO_MAIZE, "planting_window": "June"},
+    {**KANO_MAIZE, "rainfall_total_mm": "lots", "soil_pH": float("inf"), "ndvi_mean": [0.4]},
+])
+def test_malformed_profiles_bucket_as_unknown(cache, info):
+    bucket = profile_bucket(info)
+    assert bucket[:2] == ("kano", "maize")
+    store(cache, "When should I plant maize?", "A", info)
+    assert ask(cache, "When should I plant maize?", info) == "A"
+
+
+def test_near_hit_for_added_filler_words(cache):
+    store(cache, "When should I plant maize in Kano?", "A")
+    assert ask(cache, "When should I plant maize in Kano this year?") == "A"
+    assert cache.get_stats()["near_hits"] == 1
+
+
+def test_negation_is_never_a_near_hit(cache):
+    store(cache, "When should I plant maize in Kano?", "A")
+    assert ask(cache, "When should I not plant maize in Kano?") is None
+    store(cache, "Should I plant maize on this farm?", "B")
+    assert ask(cache, "Should I not plant maize on this farm?") is None
+
+
+def test_reordered_question_is_not_a_near_hit(cache):
+    store(cache, "Can I plant maize after rice this season?", "A")
+    assert ask(cache, "Can I plant rice after maize this season?") is None
+
+
+def test_substituted_word_is_not_a_near_hit(cache):
+    store(cache, "When should I plant maize in Kano?", "A")
+    assert ask(cache, "When should I plant sorghum in Kano?") is None
+
+
+def test_short_questions_need_an_exact_match(cache):
+    store(cache, "Plant maize when?", "A")
+    assert ask(cache, "Plant maize when now?") is None
+
+
+def test_ttl_expiry():
+    cache = AnswerCache(ttl=0.05)
+    store(cache, "When should I plant maize?", "A")
+    time.sleep(0.1)
+    assert ask(cache, "When should I plant maize?") is None
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_lru_eviction():
+    cache = AnswerCache(max_entries=2)
+    store(cache, "first question here", "1")
+    store(cache, "second question here", "2")
+    ask(cache, "first question here")
+    store(cache, "third question here", "3")
+    assert ask(cache, "second question here") is None
+    assert ask(cache, "first question here") == "1"
+    assert cache.get_stats()["evicted"] == 1
+
+
+def test_follow_up_turns_bypass_the_cache(cache):
+    store(cache, "When should I plant maize?", "A")
+    opening = ChatSession("s1")
+    assert ask(cache, "When should I plant maize?", session=opening) == "A"
+    follow_up = ChatSession("s2", [{"role": "user", "text": "hi"}, {"role": "model", "text": "hello"}])
+    assert cache.key_for("When should I plant maize?", KANO_MAIZE, follow_up) is None
+    assert ask(cache, "When should I plant maize?", session=follow_up) is None
+    assert cache.get_stats()["bypassed"] == 2
@@ -0,0 +1,103 @@
+"""Endpoint tests against the benchmark fakes (no Earth Engine, Gemini or network)."""
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+import httpx
+import pytest
+
+WORKDIR = tempfile.mkdtemp(prefix="agro-api-tests-")
+for name, value in {
+    "JOBS_DB_PATH": "jobs.sqlite3",
+    "FEATURE_CACHE_PATH": "features.db",
+    "THUMBNAIL_DIR": "thumbnails",
+    "RAINFALL_SERIES_DIR": "rainfall",
+    "EE_SCHEDULER_PATH": "ee_scheduler.bin",
+    "RASTER_GRID_DIR": "grid",
+}.items():
+    os.environ[name] = os.path.join(WORKDIR, value)
+os.environ["STARTUP_PRELOAD"] = "0"
+
+from benchmarks import fakes  # noqa: E402
+from benchmarks.fakes import FakeEarthEngine, Latency  # noqa: E402
+
+FakeEarthEngine(Latency()).install()
+
+import gee_tools  # noqa: E402
+import main  # noqa: E402
+
+POLYGON = [[12.0, 8.5], [12.0, 8.51], [12.01, 8.51], [12.01, 8.5]]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main.job_manager, "runner", lambda polygon_coords, progress: {"status": "success"})
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test")
+
+
+async def while_job_store_is_locked(client, request):
+    """Start `request` while another worker holds the job store's write lock; time /healthz meanwhile."""
+    main.job_manager.get_stats()  # store created (WAL) before another worker takes the write lock
+    other = sqlite3.connect(main.job_manager.path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    pending = asyncio.create_task(request)
+    await asyncio.sleep(0.2)
+
+    started = time.monotonic()
+    health = await client.get("/healthz")
+    served_in = time.monotonic() - started
+    assert not pending.done()
+
+    other.execute("COMMIT")
+    other.close()
+    assert health.status_code == 200 and served_in < 0.5
+    return await pending
+
+
+def test_job_submit_waiting_on_the_write_lock_does_not_block_the_loop(client):
+    async def scenario():
+        response = await while_job_store_is_locked(client, client.post("/jobs/calculate", json={"polygon": POLYGON}))
+        job = await client.get(f"/jobs/{response.json()['job_id']}")
+        return response.status_code, job.status_code
+
+    assert asyncio.run(scenario()) == (202, 200)
+
+
+def test_analyze_waiting_on_the_write_lock_does_not_block_the_loop(client):
+    async def scenario():
+        response = await while_job_store_is_locked(client, client.post("/analyze", json={"polygon": POLYGON}))
+        return response.status_code
+
+    assert asyncio.run(scenario()) == 200
+
+
+@pytest.mark.parametrize("points", [[12.0, 8.5, 11.5], [[12.0, 8.5, 1.0]], [[12.0], [8.5]], [["a", "b"]]])
+def test_state_lookup_rejects_malformed_points(client, points):
+    async def scenario():
+        return (await client.post("/state/resolve", json={"points": points})).status_code
+
+    assert asyncio.run(scenario()) == 422
+
+
+def test_server_refuses_to_start_without_state_boundaries(monkeypatch):
+    monkeypatch.setattr(main.state_resolver, "path", os.path.join(WORKDIR, "missing-states.json"))
+
+    async def start():
+        async with main.lifespan(main.app):
+            pass
+
+    with pytest.raises(RuntimeError, match="state_resolver.py build"):
+        asyncio.run(start())
+
+
+def test_empty_soil_reduction_falls_back_instead_of_faking_gee_values(monkeypatch):
+    monkeypatch.setitem(fakes.EE_RESULTS, "soil", {"ph": {"phh2o_0-5cm_mean": None}, "soc": {}})
+    isric = {"soil_pH": 6.1, "soil_org_carbon_pct": 0.9, "source": "ISRIC Backup API"}
+    monkeypatch.setitem(gee_tools.BACKUPS, "soil", ("isric", lambda lat, lon: isric))
+
+    features = gee_tools.extract_features(POLYGON, 12.0, 8.5, datasets=["soil"])
+    assert features["soil"] == isric
+    # Fallbacks are never written to the feature cache
+    assert features["fallbacks"] == ["soil"]
@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+from ee_scheduler import MAX_SLOTS, EarthEngineScheduler, _HEADER, _SLOT
+
+FILE_SIZE = _HEADER.size + _SLOT.size * MAX_SLOTS
+
+
+def test_workers_share_slots(tmp_path):
+    path = str(tmp_path / "scheduler.bin")
+    first = EarthEngineScheduler(path, max_concurrent=2)
+    second = EarthEngineScheduler(path, max_concurrent=2)
+    assert first._try_acquire("interactive") is not None
+    assert second._try_acquire("interactive") is not None
+    assert first._try_acquire("interactive") is None
+    assert os.path.getsize(path) == FILE_SIZE
+
+
+def test_different_limit_is_refused_while_slots_are_held(tmp_path):
+    path = str(tmp_path / "scheduler.bin")
+    first = EarthEngineScheduler(path, max_concurrent=4)
+    slot = first._try_acquire("interactive")
+    with pytest.raises(RuntimeError):
+        EarthEngineScheduler(path, max_concurrent=8)._try_acquire("interactive")
+    # The file was left alone, so the worker that has it mapped carries on
+    assert os.path.getsize(path) == FILE_SIZE
+    first._release(slot)
+    assert first.get_stats()["in_flight"] == 0
+
+
+def test_different_limit_is_adopted_when_idle(tmp_path):
+    path = str(tmp_path / "scheduler.bin")
+    EarthEngineScheduler(path, max_concurrent=4).get_stats()
+    EarthEngineScheduler(path, max_concurrent=8).get_stats()
+    with open(path, "rb") as f:
+        assert _HEADER.unpack(f.read(_HEADER.size))[2] == 8
+    assert os.path.getsize(path) == FILE_SIZE
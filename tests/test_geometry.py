@@ -0,0 +1,101 @@
+import math
+import time
+
+import numpy as np
+import pytest
+
+from geometry import (
+    InvalidPolygonError, MAX_VERTICES, _crossings, _project, clean_polygon, geodesic_area_m2, simplify,
+)
+
+# ~100 m x 100 m square near Kano
+SQUARE = [[12.0, 8.5], [12.0, 8.50092], [12.0009, 8.50092], [12.0009, 8.5]]
+
+
+def circle(n, radius_deg=0.01, lat=12.0, lon=8.5):
+    return [[lat + radius_deg * math.sin(t), lon + radius_deg * math.cos(t)]
+            for t in np.linspace(0, 2 * math.pi, n, endpoint=False)]
+
+
+def random_ring(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [[12 + rng.random() * 0.01, 8.5 + rng.random() * 0.01] for _ in range(n)]
+
+
+# --- geodesic_area_m2 ---
+def test_area_of_square():
+    assert geodesic_area_m2(SQUARE) == pytest.approx(100 * 100, rel=0.01)
+
+
+def test_area_ignores_orientation():
+    assert geodesic_area_m2(SQUARE[::-1]) == pytest.approx(geodesic_area_m2(SQUARE))
+
+
+def test_area_of_one_degree_cell_at_equator():
+    cell = [[0, 0], [0, 1], [1, 1], [1, 0]]
+    assert geodesic_area_m2(cell) == pytest.approx(12_364e6, rel=0.005)
+
+
+# --- simplify ---
+def test_simplify_caps_vertices_and_keeps_area():
+    ring = circle(2000)
+    simplified = simplify(ring, max_vertices=100)
+    assert len(simplified) <= 100
+    assert geodesic_area_m2(simplified) == pytest.approx(geodesic_area_m2(ring), rel=0.01)
+
+
+def test_simplify_drops_collinear_points():
+    ring = [[12.0, 8.5], [12.0, 8.5005], [12.0, 8.501], [12.001, 8.501], [12.001, 8.5]]
+    assert [12.0, 8.5005] not in simplify(ring)
+
+
+def test_simplify_never_goes_below_a_triangle():
+    assert len(simplify(circle(50), max_vertices=1)) == 3
+
+
+# --- clean_polygon ---
+def test_clean_polygon_leaves_a_valid_ring_alone():
+    cleaned, report = clean_polygon(SQUARE)
+    assert cleaned == SQUARE
+    assert report == {"input_vertices": 4, "repair": None, "vertices": 4}
+
+
+def test_clean_polygon_drops_repeated_and_closing_vertices():
+    cleaned, _ = clean_polygon([SQUARE[0], SQUARE[0], *SQUARE[1:], SQUARE[0]])
+    assert cleaned == SQUARE
+
+
+def test_clean_polygon_untangles_a_bowtie():
+    bowtie = [SQUARE[0], SQUARE[2], SQUARE[1], SQUARE[3]]
+    cleaned, report = clean_polygon(bowtie)
+    assert report["repair"] == "untangled"
+    assert not _crossings(_project(cleaned))
+    assert geodesic_area_m2(cleaned) == pytest.approx(geodesic_area_m2(SQUARE), rel=0.01)
+
+
+@pytest.mark.parametrize("n", [200, 256, 2000])
+def test_clean_polygon_is_bounded_on_tangled_rings(n):
+    started = time.perf_counter()
+    cleaned, report = clean_polygon(random_ring(n))
+    assert time.perf_counter() - started < 3
+    assert report["repair"] in ("untangled", "convex_hull")
+    assert len(cleaned) <= MAX_VERTICES
+    assert not _crossings(_project(cleaned))
+
+
+@pytest.mark.parametrize("polygon", [
+    [[12.0, 8.5], [12.0, 8.6]],                      # too few vertices
+    [[12.0, 8.5], [12.0, 8.6], [12.0, 8.7]],         # no area
+    [[12.0, 8.5], [12.0, "x"], [12.1, 8.6]],         # not numbers
+    [[12.0, 8.5], [12.0, float("nan")], [12.1, 8.6]],
+    [[95.0, 8.5], [12.0, 8.6], [12.1, 8.6]],         # out of range
+    [[12.0, 8.5, 1.0], [12.0, 8.6], [12.1, 8.6]],    # not pairs
+])
+def test_clean_polygon_rejects_unusable_input(polygon):
+    with pytest.raises(InvalidPolygonError):
+        clean_polygon(polygon)
+
+
+def test_clean_polygon_rejects_oversized_input():
+    with pytest.raises(InvalidPolygonError):
+        clean_polygon(circle(20_001))
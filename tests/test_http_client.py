@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from http_client import CircuitBreaker, CircuitOpenError, HttpClient
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Local stand-in for a provider: /fail -> 500, /slow -> 200 after 2 s, anything else -> 200."""
+
+    def do_GET(self):
+        if self.path.startswith("/fail"):
+            self.send_response(500)
+            self.end_headers()
+            return
+        if self.path.startswith("/slow"):
+            time.sleep(2)
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+@pytest.fixture
+def client(server):
+    client = HttpClient(timeout=5)
+    client._breakers[server.split("//")[1]] = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+    yield client
+    client.close()
+
+
+def open_breaker(client, server):
+    for _ in range(2):
+        with pytest.raises(Exception):
+            client.get_json_sync(f"{server}/fail")
+    assert client.breaker(server.split("//")[1]).state == "open"
+    with pytest.raises(CircuitOpenError):
+        client.get_json_sync(f"{server}/ok")
+
+
+def test_breaker_opens_and_closes_after_a_successful_trial(client, server):
+    open_breaker(client, server)
+    time.sleep(0.25)
+    assert client.get_json_sync(f"{server}/ok") == {"ok": True}
+    assert client.breaker(server.split("//")[1]).state == "closed"
+
+
+def test_cancelled_trial_releases_the_half_open_slot(client, server):
+    open_breaker(client, server)
+    time.sleep(0.25)
+    breaker = client.breaker(server.split("//")[1])
+
+    async def cancelled_trial():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.get_json(f"{server}/slow"), timeout=0.2)
+
+    asyncio.run(cancelled_trial())
+    deadline = time.monotonic() + 2
+    while breaker.trial_in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not breaker.trial_in_flight
+
+    # The next call is let through as a new trial and closes the breaker
+    assert client.get_json_sync(f"{server}/ok") == {"ok": True}
+    assert breaker.state == "closed"
+
+
+def test_only_the_trial_call_releases_the_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    earlier = breaker.allow()  # admitted while closed, still outstanding
+    breaker.record_failure(breaker.allow())
+    assert breaker.allow() is None
+    time.sleep(0.06)
+
+    trial = breaker.allow()
+    assert trial is not None and breaker.allow() is None
+    # Cancelling or failing another call must not let a second probe through
+    breaker.record_cancelled(earlier)
+    assert breaker.allow() is None
+    breaker.record_failure(earlier)
+    assert breaker.trial_in_flight
+
+    breaker.record_cancelled(trial)
+    time.sleep(0.06)
+    assert breaker.allow() is not None
@@ -0,0 +1,86 @@
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from jobs import JobManager, QueueFullError
+
+POLYGON = [[12.0, 8.5], [12.0, 8.51], [12.01, 8.51], [12.01, 8.5]]
+
+
+def slow_runner(release: threading.Event):
+    def run(polygon_coords, progress):
+        progress("earth_engine", 0.5)
+        release.wait(5)
+        return {"vertices": len(polygon_coords)}
+    return run
+
+
+def wait_done(manager, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job.done:
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+
+def test_jobs_are_shared_between_workers(path):
+    release = threading.Event()
+    worker_a = JobManager(slow_runner(release), path=path)
+    worker_b = JobManager(slow_runner(release), path=path)
+
+    job = worker_a.submit(POLYGON)
+    # Another worker coalesces onto the same job and can poll it
+    assert worker_b.submit(POLYGON[::-1]).id == job.id
+    assert worker_b.get(job.id).status in ("queued", "running")
+
+    release.set()
+    finished = wait_done(worker_b, job.id)
+    assert finished.status == "succeeded"
+    assert finished.result == {"vertices": 4}
+    assert worker_b.stats["coalesced"] == 1
+    assert worker_a.get_stats()["pending"] == 0
+
+
+def test_failed_jobs_can_be_retried(path):
+    def failing(polygon_coords, progress):
+        raise RuntimeError("Earth Engine down")
+
+    manager = JobManager(failing, path=path)
+    job = manager.submit(POLYGON)
+    assert wait_done(manager, job.id).error == "Earth Engine down"
+    assert manager.submit(POLYGON).id != job.id
+
+
+def test_pending_limit_is_shared(path):
+    release = threading.Event()
+    worker_a = JobManager(slow_runner(release), max_pending=1, path=path)
+    worker_b = JobManager(slow_runner(release), max_pending=1, path=path)
+    worker_a.submit(POLYGON)
+    with pytest.raises(QueueFullError):
+        worker_b.submit([[p[0] + 1, p[1]] for p in POLYGON])
+    release.set()
+
+
+def test_jobs_of_a_dead_worker_are_failed(path):
+    manager = JobManager(lambda polygon_coords, progress: {}, path=path)
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    manager._connect().execute(
+        "INSERT INTO calculate_jobs (id, key, status, stage, progress, created, pid)"
+        " VALUES ('orphan', 'k', 'running', 'running', 0.5, ?, ?)",
+        (time.time(), dead.pid),
+    )
+    manager.submit(POLYGON)
+    orphan = manager.get("orphan")
+    assert orphan.status == "failed"
+    assert orphan.done
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+import planting_window
+from planting_window import (
+    DAYS, TooManyUncachedCellsError, cell_of, planting_window_for_points,
+    rainfall_series_store,
+)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(rainfall_series_store, "directory", str(tmp_path))
+    monkeypatch.setattr(rainfall_series_store, "_arrays", type(rainfall_series_store._arrays)())
+    monkeypatch.setattr(planting_window, "_results", type(planting_window._results)())
+    fetched = []
+
+    def fake_fetch(cell, first, last, priority):
+        fetched.append((cell, priority))
+        # 8 mm every day from May: an early, reliable season
+        series = np.zeros((last - first + 1, DAYS), dtype=np.uint16)
+        series[:, 120:280] = 80
+        return series
+
+    monkeypatch.setattr(planting_window, "fetch_daily_rainfall", fake_fetch)
+    return fetched
+
+
+def test_uncached_cells_are_capped_before_any_fetch(store):
+    points = [[10.0 + i, 8.0] for i in range(3)]
+    with pytest.raises(TooManyUncachedCellsError):
+        planting_window_for_points(points, "Maize", priority="batch", max_uncached=2)
+    assert store == []
+
+
+def test_stored_cells_do_not_count_towards_the_cap(store):
+    points = [[10.0 + i, 8.0] for i in range(3)]
+    planting_window_for_points(points[:2], "Maize", priority="batch", max_uncached=2)
+    assert [priority for _, priority in store] == ["batch", "batch"]
+    planting_window._results.clear()
+    rainfall_series_store._arrays.clear()
+
+    results = planting_window_for_points(points, "Maize", priority="batch", max_uncached=1)
+    assert len(store) == 3 and store[-1][0] == cell_of(*points[2])
+    assert all(result["planting_window"] for result in results)
+    assert rainfall_series_store.cached(cell_of(*points[0]))
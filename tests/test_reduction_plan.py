@@ -0,0 +1,25 @@
+from gee_tools import GRID_RESOLUTION_M, reduction_summary
+from reduction_plan import NATIVE_RESOLUTION_M, plan_reduction
+
+# ~1 ha farm near Kano
+FARM = [[12.0, 8.5], [12.0, 8.5009], [12.0009, 8.5009], [12.0009, 8.5]]
+
+
+def test_ndvi_is_never_reduced_finer_than_20_m():
+    assert NATIVE_RESOLUTION_M["ndvi"] == 20
+    assert plan_reduction(10_000, NATIVE_RESOLUTION_M["ndvi"]).scale_m == 20
+
+
+def test_resolution_is_reported_per_value_source():
+    summary = reduction_summary(FARM, {"soil": "Local grid", "climatology": "GEE", "ndvi": "GEE"})
+    assert summary == {
+        "ndvi": 20,
+        "soil": GRID_RESOLUTION_M["soil"],
+        "rainfall": NATIVE_RESOLUTION_M["rainfall"],
+        "temperature": NATIVE_RESOLUTION_M["temperature"],
+    }
+
+
+def test_backups_and_defaults_have_no_resolution():
+    summary = reduction_summary(FARM, {"soil": "ISRIC Backup API", "climatology": None, "ndvi": "default"})
+    assert summary == {"ndvi": None, "soil": None, "rainfall": None, "temperature": None}
@@ -0,0 +1,47 @@
+import json
+import os
+
+import numpy as np
+
+from regional import NODATA, SuitabilityMap
+
+
+def write_map(directory, built):
+    np.save(os.path.join(directory, "best_crop.npy"), np.full((2, 2), NODATA, dtype=np.uint8))
+    np.save(os.path.join(directory, "suitability.npy"), np.full((1, 2, 2), NODATA, dtype=np.uint8))
+    meta = {
+        "west": 8.0, "north": 12.0, "res": 0.5, "rows": 2, "cols": 2, "crops": ["Maize"],
+        "management": {}, "cells": 0, "built": built,
+    }
+    with open(os.path.join(directory, "suitability.json"), "w") as f:
+        json.dump(meta, f)
+    # Distinct mtimes even on filesystems with coarse timestamps
+    stamp = {"2026-01-01T00:00:00Z": 1_700_000_000, "2026-02-01T00:00:00Z": 1_700_000_100}[built]
+    os.utime(os.path.join(directory, "suitability.json"), (stamp, stamp))
+
+
+def test_map_appears_once_scored_without_a_restart(tmp_path):
+    suitability = SuitabilityMap(str(tmp_path))
+    assert not suitability.available
+    write_map(str(tmp_path), "2026-01-01T00:00:00Z")
+    assert suitability.available
+    assert suitability.layers == {"best": "Best crop", "maize": "Maize"}
+
+
+def test_rescoring_reloads_metadata_and_drops_cached_tiles(tmp_path):
+    write_map(str(tmp_path), "2026-01-01T00:00:00Z")
+    suitability = SuitabilityMap(str(tmp_path))
+    suitability.tile("best", 6, 33, 30)
+    assert suitability.get_stats()["cached"] == 1
+
+    write_map(str(tmp_path), "2026-02-01T00:00:00Z")
+    assert suitability.describe()["built"] == "2026-02-01T00:00:00Z"
+    assert suitability.get_stats()["cached"] == 0
+
+
+def test_removed_map_is_unavailable(tmp_path):
+    write_map(str(tmp_path), "2026-01-01T00:00:00Z")
+    suitability = SuitabilityMap(str(tmp_path))
+    assert suitability.available
+    os.remove(os.path.join(tmp_path, "suitability.json"))
+    assert not suitability.available
@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from state_resolver import StateBoundariesMissingError, StateResolver
+
+# Two side-by-side squares: Kano west of lon 9, Jigawa east of it
+STATES = {
+    "states": [
+        {"name": "Kano State", "rings": [[[8.0, 11.0], [9.0, 11.0], [9.0, 12.5], [8.0, 12.5]]]},
+        {"name": "Jigawa", "rings": [[[9.0, 11.0], [10.5, 11.0], [10.5, 12.5], [9.0, 12.5]]]},
+    ]
+}
+
+
+@pytest.fixture
+def resolver(tmp_path):
+    path = tmp_path / "states.json"
+    path.write_text(json.dumps(STATES))
+    return StateResolver(str(path))
+
+
+def test_points_resolve_to_states(resolver):
+    assert resolver.resolve_many([(12.0, 8.5), (11.5, 9.95), (12.0, 3.0)]) == ["Kano", "Jigawa", "Unknown"]
+    assert resolver.resolve_many([]) == []
+
+
+@pytest.mark.parametrize("points", [[12.0, 8.5, 11.5], [12.0, 8.5, 11.5, 9.95], [[12.0, 8.5, 1.0]]])
+def test_malformed_points_are_rejected(resolver, points):
+    with pytest.raises(ValueError):
+        resolver.resolve_many(points)
+
+
+def test_missing_boundaries_raise_instead_of_answering_unknown(tmp_path):
+    resolver = StateResolver(str(tmp_path / "missing.json"))
+    assert not resolver.available
+    with pytest.raises(StateBoundariesMissingError):
+        resolver.resolve(12.0, 8.5)
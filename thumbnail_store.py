@@ -0,0 +1,169 @@
+"""
+Content-addressed store for rendered satellite thumbnails.
+
+A thumbnail is fully determined by its inputs (region bounds, composite date
+window, visualization params, size), so it's stored on local disk under the
+SHA-256 of those inputs and served from our own /imagery/{key}.png instead of
+a getThumbURL link that expires after a few hours. The same key always means
+the same image, which makes the files safe to cache as immutable.
+
+Concurrent requests for a key that is being rendered wait for that render
+instead of starting their own. When the store grows past `max_bytes` the
+least recently used files (by mtime, bumped on every hit) are evicted.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import Future
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+THUMBNAIL_DIR = os.getenv("THUMBNAIL_DIR", "cache/thumbnails")
+THUMBNAIL_MAX_BYTES = int(float(os.getenv("THUMBNAIL_MAX_MB", "512")) * 2**20)
+URL_PREFIX = "/imagery/"
+KEY_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# Bounds are quantized like polygon cache keys (~1 m)
+BOUNDS_DECIMALS = 5
+
+
+def thumbnail_key(bounds, params: dict) -> str:
+    """SHA-256 of (bounds, rendering params); bounds are (min_lon, min_lat, max_lon, max_lat)."""
+    canonical = {"bounds": [round(v, BOUNDS_DECIMALS) for v in bounds], **params}
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def key_from_url(url: str):
+    """The store key in an /imagery/{key}.png URL, or None for any other URL."""
+    if not isinstance(url, str) or not url.startswith(URL_PREFIX) or not url.endswith(".png"):
+        return None
+    key = url[len(URL_PREFIX):-len(".png")]
+    return key if KEY_PATTERN.match(key) else None
+
+
+class ThumbnailStore:
+    def __init__(self, directory: str = THUMBNAIL_DIR, max_bytes: int = THUMBNAIL_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._inflight = {}  # key -> Future[path]
+        self._lock = threading.Lock()
+        self._size = None
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "generated": 0, "errors": 0, "evicted": 0}
+
+    @staticmethod
+    def url(key: str) -> str:
+        return f"{URL_PREFIX}{key}.png"
+
+    def path(self, key: str) -> str:
+        # Two-level fan-out keeps directories small
+        return os.path.join(self.directory, key[:2], f"{key}.png")
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def open(self, key: str):
+        """Path of a stored thumbnail (marking it recently used), or None."""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def get_or_create(self, key: str, render) -> str:
+        """
+        Path of the thumbnail for `key`, calling `render()` -> PNG bytes if it
+        isn't stored yet. Raises whatever `render()` raised.
+        """
+        path = self.open(key)
+        if path is not None:
+            with self._lock:
+                self.stats["hits"] += 1
+            return path
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        if not owner:
+            return future.result()
+
+        try:
+            path = self._write(key, render())
+            future.set_result(path)
+            with self._lock:
+                self.stats["generated"] += 1
+        except Exception as e:
+            future.set_exception(e)
+            with self._lock:
+                self.stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return path
+
+    def _write(self, key: str, data: bytes) -> str:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Atomic rename, so other workers never serve a half-written file
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            # First write scans the directory (which already includes this file)
+            self._size = self._disk_usage() if self._size is None else self._size + len(data)
+            over = self._size > self.max_bytes
+        if over:
+            self._evict()
+        return path
+
+    def _files(self) -> list:
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".png"):
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+        return files
+
+    def _disk_usage(self) -> int:
+        return sum(size for _, size, _ in self._files())
+
+    def _evict(self):
+        """Drop least recently used files until the store is back under 90% of max_bytes."""
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._size = total
+            self.stats["evicted"] += evicted
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, "bytes": self._size, "max_bytes": self.max_bytes, "rendering": len(self._inflight)}
+
+
+thumbnail_store = ThumbnailStore()